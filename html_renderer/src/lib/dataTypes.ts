@@ -8,7 +8,7 @@ export interface SessionData {
         start_call_stack: string[],
         target_description: string;
         cpu_time: number;
-        sys_path: string;
+        sys_path: string[];
         sys_prefixes: string[];
     };
     frame_tree: FrameData|null;
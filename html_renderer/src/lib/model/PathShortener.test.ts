@@ -0,0 +1,41 @@
+import { SysPathIndex, getRelPath } from "./PathShortener";
+import { describe, it, expect } from "vitest";
+
+const sysPath = [
+  "/home/user/project",
+  "/usr/lib/python3.12",
+  "/home/user/.venv/lib/python3.12/site-packages",
+  "/home/user/.venv/lib/python3.12/site-packages/setuptools/_vendor",
+  "C:\\Python312\\Lib",
+];
+
+function shortenWithEveryEntry(path: string): string {
+  let result = path;
+  for (const entry of sysPath) {
+    const candidate = getRelPath(path, entry);
+    if (candidate.split(/[/\\]/).length < result.split(/[/\\]/).length) {
+      result = candidate;
+    }
+  }
+  return result;
+}
+
+describe("SysPathIndex", () => {
+  const index = new SysPathIndex(sysPath);
+  const cases: [string, string][] = [
+    ["/home/user/project/app/views.py", "app/views.py"],
+    ["/home/user/.venv/lib/python3.12/site-packages/django/urls.py", "django/urls.py"],
+    ["/home/user/.venv/lib/python3.12/site-packages/setuptools/_vendor/packaging/tags.py", "packaging/tags.py"],
+    ["/usr/lib/python3.13/os.py", "../python3.13/os.py"],
+    ["C:\\Python312\\Lib\\json\\decoder.py", "json/decoder.py"],
+    ["D:\\code\\x.py", "D:\\code\\x.py"],
+    ["<built-in>", "<built-in>"],
+  ];
+
+  for (const [path, expected] of cases) {
+    it(`should shorten ${path}`, () => {
+      expect(index.shorten(path)).toBe(expected);
+      expect(shortenWithEveryEntry(path)).toBe(expected);
+    });
+  }
+});
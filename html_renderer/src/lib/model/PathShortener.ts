@@ -0,0 +1,139 @@
+// A port of pyinstrument/path_shortening.py. Paths are shown relative to
+// the sys.path entry that gives the fewest path components. Rather than
+// trying every entry for every path, the entries are indexed once in a trie
+// of their path components, so each path is resolved in one walk down it.
+
+class TrieNode {
+    children = new Map<string, TrieNode>()
+    // the entry with the fewest components in this subtree, earliest first
+    // if there's a tie
+    bestLength: number
+    bestIndex: number
+
+    constructor(length: number, index: number) {
+        this.bestLength = length
+        this.bestIndex = index
+    }
+
+    addEntry(length: number, index: number) {
+        if (length < this.bestLength) {
+            this.bestLength = length
+            this.bestIndex = index
+        }
+    }
+}
+
+export class SysPathIndex {
+    sysPath: string[]
+    // one trie for each drive, which is always '' except on Windows
+    _roots = new Map<string, TrieNode>()
+
+    constructor(sysPath: string[]) {
+        this.sysPath = sysPath
+
+        sysPath.forEach((entry, index) => {
+            const parts = pathSplit(entry)
+            const drive = getPathDrive(entry) ?? ""
+            let node = this._roots.get(drive)
+            if (!node) {
+                node = new TrieNode(parts.length, index)
+                this._roots.set(drive, node)
+            }
+            node.addEntry(parts.length, index)
+
+            for (const part of parts) {
+                let child = node.children.get(part)
+                if (!child) {
+                    child = new TrieNode(parts.length, index)
+                    node.children.set(part, child)
+                }
+                child.addEntry(parts.length, index)
+                node = child
+            }
+        })
+    }
+
+    /**
+     * Returns the entries to try relative paths from - just the one that
+     * gives the shortest path, or none if no entry is on the same drive.
+     *
+     * The relative path from entry E to a path P has `E.length - c` '..'
+     * parts followed by `P.length - c` parts of P, where c is the length of
+     * their common prefix. Walking P's parts down the trie, every node is a
+     * possible common prefix, and the best entry below it is the one with
+     * the fewest parts. If P is itself an entry, or contains one, the
+     * relative path might be empty, which the trie doesn't account for, so
+     * then every entry is returned, to be tried in turn.
+     */
+    bestEntries(path: string): string[] {
+        const parts = pathSplit(path)
+        let node = this._roots.get(getPathDrive(path) ?? "")
+        let best: [number, number] | null = null
+
+        for (let depth = 0; depth < parts.length; depth++) {
+            if (!node) {
+                break
+            }
+            const candidate: [number, number] = [node.bestLength - 2 * depth, node.bestIndex]
+            if (best === null || candidate[0] < best[0] || (candidate[0] == best[0] && candidate[1] < best[1])) {
+                best = candidate
+            }
+            node = node.children.get(parts[depth])
+        }
+
+        if (node) {
+            return this.sysPath
+        }
+
+        return best === null ? [] : [this.sysPath[best[1]]]
+    }
+
+    shorten(path: string): string {
+        let result = path
+
+        if (pathSplit(path).length > 1) {
+            for (const sysPathEntry of this.bestEntries(path)) {
+                const candidate = getRelPath(path, sysPathEntry)
+                if (pathSplit(candidate).length < pathSplit(result).length) {
+                    result = candidate
+                }
+            }
+        }
+
+        return result
+    }
+}
+
+function pathSplit(path: string): string[] {
+    return path.split(/[/\\]/)
+}
+
+function getPathDrive(path: string): string | null {
+    const parts = pathSplit(path)
+    if (parts.length > 0 && parts[0].endsWith(":")) {
+        return parts[0]
+    } else {
+        return null
+    }
+}
+
+export function getRelPath(path: string, start: string): string {
+    // returns the relative path from start to path
+    // e.g. getRelPath("/a/b/c", "/a") -> "b/c"
+    // e.g. getRelPath("/a/b/c", "/a/d/e") -> "../../b/c"
+
+    if (getPathDrive(path) != getPathDrive(start)) {
+        // different drives, can't make a relative path
+        return path
+    }
+
+    const parts = pathSplit(path)
+    const startParts = pathSplit(start)
+    let i = 0
+    while (i < parts.length && i < startParts.length && parts[i] == startParts[i]) {
+        i++
+    }
+    const relParts = startParts.slice(i).map(_ => "..")
+
+    return relParts.concat(parts.slice(i)).join("/")
+}
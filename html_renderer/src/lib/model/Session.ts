@@ -1,5 +1,6 @@
 import type { SessionData } from "../dataTypes";
 import Frame from "./Frame";
+import { SysPathIndex } from "./PathShortener";
 
 export default class Session {
     startTime: number;
@@ -11,7 +12,7 @@ export default class Session {
     target_description: string;
     cpuTime: number;
     rootFrame: Frame|null;
-    sysPath: string;
+    sysPath: string[];
     sysPrefixes: string[];
 
     constructor(data: SessionData) {
@@ -29,58 +30,18 @@ export default class Session {
     }
 
     _shortenPathCache: {[path: string]: string} = {}
+    _sysPathIndex: SysPathIndex|null = null
     shortenPath(path: string): string {
         if (this._shortenPathCache[path]) {
             return this._shortenPathCache[path]
         }
 
-        let result = path
-        const pathParts = pathSplit(path)
-
-        if (pathParts.length > 1) {
-            for (const sysPathEntry of this.sysPath) {
-                const candidate = getRelPath(path, sysPathEntry)
-                if (pathSplit(candidate).length < pathSplit(result).length) {
-                    result = candidate
-                }
-            }
+        if (!this._sysPathIndex) {
+            this._sysPathIndex = new SysPathIndex(this.sysPath)
         }
 
+        const result = this._sysPathIndex.shorten(path)
         this._shortenPathCache[path] = result
         return result
     }
 }
-
-function pathSplit(path: string): string[] {
-    return path.split(/[/\\]/)
-}
-
-function getPathDrive(path: string): string | null {
-    const parts = pathSplit(path)
-    if (parts.length > 0 && parts[0].endsWith(":")) {
-        return parts[0]
-    } else {
-        return null
-    }
-}
-
-function getRelPath(path: string, start: string): string {
-    // returns the relative path from start to path
-    // e.g. getRelPath("/a/b/c", "/a") -> "b/c"
-    // e.g. getRelPath("/a/b/c", "/a/d/e") -> "../../b/c"
-
-    if (getPathDrive(path) != getPathDrive(start)) {
-        // different drives, can't make a relative path
-        return path
-    }
-
-    const parts = pathSplit(path)
-    const startParts = pathSplit(start)
-    let i = 0
-    while (i < parts.length && i < startParts.length && parts[i] == startParts[i]) {
-        i++
-    }
-    const relParts = startParts.slice(i).map(_ => "..")
-
-    return relParts.concat(parts.slice(i)).join("/")
-}
@@ -0,0 +1,82 @@
+"""
+Times build_frame_tree on the HTML renderer's demo sessions - parsing every
+frame info string each time it's seen, with a new FrameInfoCache, and with a
+warm one, as Session.root_frame() has when it's called again.
+
+The demo sessions are saved as frame trees, so they're converted back into
+records first - one for each leaf, repeated to make a longer session.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from timeit import Timer
+from typing import Any
+
+from pyinstrument.frame_info import ATTRIBUTES_SEP, FrameInfoCache, parse_frame_info
+from pyinstrument.frame_ops import build_frame_tree
+from pyinstrument.frame_records import FrameRecords, FrameRecordType
+from pyinstrument.session import Session
+
+DEMO_DATA_DIR = Path(__file__).parent.parent / "html_renderer" / "demo-data"
+REPEATS = 20
+
+
+class UncachedFrameInfos(FrameInfoCache):
+    def __getitem__(self, frame_info: str):
+        return parse_frame_info(frame_info)
+
+
+def records_from_frame_tree(frame_tree: dict[str, Any]) -> list[FrameRecordType]:
+    records: list[FrameRecordType] = []
+    pending: list[tuple[dict[str, Any], list[str]]] = [(frame_tree, [])]
+
+    while pending:
+        frame, parent_stack = pending.pop()
+        if frame["identifier"] == "[self]":
+            records.append((parent_stack, frame["time"]))
+            continue
+
+        frame_info = "".join(
+            [frame["identifier"], *(ATTRIBUTES_SEP + a for a in frame["attributes"])]
+        )
+        stack = parent_stack + [frame_info]
+        if not frame["children"]:
+            records.append((stack, frame["time"]))
+        for child in reversed(frame["children"]):
+            pending.append((child, stack))
+
+    return records
+
+
+for path in sorted(DEMO_DATA_DIR.glob("*.json")):
+    data = json.loads(path.read_text())
+    session_data = data["session"]
+    session = Session(
+        frame_records=FrameRecords.from_list(records_from_frame_tree(data["frame_tree"]) * REPEATS),
+        start_time=session_data["start_time"],
+        duration=session_data["duration"],
+        min_interval=session_data["min_interval"],
+        max_interval=session_data["max_interval"],
+        sample_count=session_data["sample_count"],
+        start_call_stack=session_data["start_call_stack"],
+        target_description=session_data["target_description"],
+        cpu_time=session_data["cpu_time"] or 0,
+        sys_path=session_data["sys_path"],
+        sys_prefixes=session_data["sys_prefixes"],
+    )
+    warm_cache = FrameInfoCache()
+
+    print(f"{path.stem} ({len(session.frame_records)} records)")
+    for description, make_cache in [
+        ("no cache", UncachedFrameInfos),
+        ("new cache", FrameInfoCache),
+        ("warm cache", lambda: warm_cache),
+    ]:
+        timings = Timer(
+            lambda: build_frame_tree(
+                session.frame_records, context=session, frame_info_cache=make_cache()
+            )
+        ).repeat(number=1, repeat=10)
+        print(f"  {description:<12} min time {min(timings) * 1000:.1f}ms")
@@ -12,7 +12,8 @@ import time
 from typing import Any, List, TextIO, cast
 
 import pyinstrument
-from pyinstrument import Profiler, renderers
+from pyinstrument import Profiler, renderers, session_format
+from pyinstrument.archive import ArchiveEntry, ProfileArchive
 from pyinstrument.session import Session
 from pyinstrument.util import (
     file_is_a_tty,
@@ -27,6 +28,12 @@ from pyinstrument.vendor import appdirs, keypath
 
 
 def main():
+    subcommand = SUBCOMMANDS.get(sys.argv[1]) if sys.argv[1:] else None
+    if subcommand is not None and not os.path.exists(sys.argv[1]):
+        # a script with the same name in the current directory is run as before
+        subcommand(sys.argv[2:])
+        return
+
     usage = "usage: pyinstrument [options] scriptfile [arg] ..."
     version_string = "pyinstrument {v}, on Python {pyv[0]}.{pyv[1]}.{pyv[2]}".format(
         v=pyinstrument.__version__,
@@ -274,6 +281,53 @@ def main():
             "This can reduce the overhead of sampling on some systems."
         ),
     )
+    parser.add_option(
+        "",
+        "--use-signal-timer",
+        dest="use_signal_timer",
+        action="store_true",
+        help=(
+            "Take samples when a SIGPROF timer fires, instead of on function "
+            "calls and returns. This makes the overhead independent of the "
+            "program's call rate, and samples loops that don't call functions. "
+            "Only CPU time is recorded. Unix only."
+        ),
+    )
+    parser.add_option(
+        "",
+        "--use-thread-cputime",
+        dest="use_thread_cputime",
+        action="store_true",
+        help=(
+            "Measure samples with the CPU time used by the profiled thread, "
+            "instead of wall-clock time. Time spent waiting on IO, locks or "
+            "sleep is not recorded."
+        ),
+    )
+    parser.add_option(
+        "",
+        "--use-sys-monitoring",
+        dest="use_sys_monitoring",
+        action="store_true",
+        help=(
+            "Take samples using sys.monitoring, which slows down code that makes "
+            "lots of function calls much less. It's used automatically when the "
+            "interval is at least the thread switch interval. Python 3.12+ only."
+        ),
+    )
+    parser.add_option(
+        "",
+        "--overhead-budget",
+        dest="overhead_budget",
+        action="store",
+        type=float,
+        metavar="FRACTION",
+        help=(
+            "The fraction of the program's time that sampling may use, e.g. "
+            "0.02 for 2%. The sampling interval is widened at runtime to stay "
+            "within it, but is never shorter than --interval."
+        ),
+    )
 
     # parse the options
 
@@ -307,6 +361,16 @@ def main():
     if options.from_path and sys.platform == "win32":
         parser.error("--from-path is not supported on Windows")
 
+    timer_options_used = [
+        options.use_timing_thread,
+        options.use_signal_timer,
+        options.use_thread_cputime,
+    ]
+    if timer_options_used.count(True) > 1:
+        parser.error(
+            "You can only specify one of --use-timing-thread, --use-signal-timer, or --use-thread-cputime"
+        )
+
     renderer_class = get_renderer_class(options)
 
     # open the output file
@@ -345,7 +409,7 @@ def main():
     if options.load_prev:
         session = load_report_from_temp_storage(options.load_prev)
     elif options.load:
-        session = Session.load(options.load)
+        session = Session.load(options.load, lazy=True)
     else:
         # we are running some code
         if options.module is not None:
@@ -389,6 +453,10 @@ def main():
             interval=options.interval,
             async_mode="disabled",
             use_timing_thread=options.use_timing_thread,
+            timer_type="cputime_signal" if options.use_signal_timer else None,
+            use_thread_cputime=options.use_thread_cputime,
+            overhead_budget=options.overhead_budget,
+            use_sys_monitoring=options.use_sys_monitoring,
         )
 
         try:
@@ -418,6 +486,13 @@ def main():
         # don't write HTML to a TTY, open in browser instead
         output_filename = renderer.open_in_browser(session)
         print("stdout is a terminal, so saved profile output to %s" % output_filename)
+    elif isinstance(renderer, renderers.SessionRenderer):
+        # stream the session out, rather than rendering it to a string first
+        if options.outfile:
+            f.close()
+            renderer.save(session, options.outfile)
+        else:
+            renderer.write(session, f)
     else:
         f.write(renderer.render(session))
         if should_close_f_after_writing:
@@ -435,6 +510,227 @@ def main():
         raise inner_exception
 
 
+def diff_main(argv: list[str]):
+    """
+    ``pyinstrument diff BASELINE CANDIDATE`` - compares two saved sessions.
+    """
+    parser: Any = optparse.OptionParser(
+        usage="usage: pyinstrument diff [options] baseline.pyisession candidate.pyisession",
+        description=(
+            "Compares two saved sessions, showing the call stacks that got slower or faster."
+        ),
+    )
+    parser.add_option(
+        "-r",
+        "--renderer",
+        dest="renderer",
+        action="store",
+        type="choice",
+        choices=("text", "html"),
+        default=None,
+        help="how the diff should be rendered - 'text' or 'html'. Defaults to 'text', or the "
+        "type of --outfile.",
+    )
+    parser.add_option(
+        "-o",
+        "--outfile",
+        dest="outfile",
+        action="store",
+        help="save to <outfile> rather than writing to stdout",
+    )
+    parser.add_option(
+        "",
+        "--threshold",
+        dest="threshold",
+        action="store",
+        type=float,
+        default=0.01,
+        metavar="FRACTION",
+        help="only show call stacks whose time changed by at least this fraction of the total, "
+        "default 0.01",
+    )
+    parser.add_option(
+        "",
+        "--compare-line-numbers",
+        dest="compare_line_numbers",
+        action="store_true",
+        default=False,
+        help="match functions by line number as well as name and file. By default, a function "
+        "that moved within its file is still matched.",
+    )
+    parser.add_option(
+        "",
+        "--fail-on-regression",
+        dest="fail_on_regression",
+        action="store",
+        type=float,
+        metavar="FRACTION",
+        help="exit with status 1 if any call stack got slower by more than this fraction of the "
+        "baseline's total time, e.g. 0.05. Useful in CI.",
+    )
+    parser.add_option(
+        "",
+        "--unicode",
+        dest="unicode",
+        action="store_true",
+        help="(text renderer only) force unicode text output",
+    )
+    parser.add_option(
+        "",
+        "--no-unicode",
+        dest="unicode",
+        action="store_false",
+        help="(text renderer only) force ascii text output",
+    )
+    parser.add_option(
+        "",
+        "--color",
+        dest="color",
+        action="store_true",
+        help="(text renderer only) force ansi color text output",
+    )
+    parser.add_option(
+        "",
+        "--no-color",
+        dest="color",
+        action="store_false",
+        help="(text renderer only) force no color text output",
+    )
+
+    options, args = parser.parse_args(argv)  # type: ignore
+    args = cast(List[str], args)  # type: ignore
+
+    if len(args) != 2:
+        parser.error("Please specify a baseline and a candidate session file")
+
+    baseline = Session.load(args[0], lazy=True)
+    candidate = Session.load(args[1], lazy=True)
+    diff = Session.diff(baseline, candidate, ignore_line_numbers=not options.compare_line_numbers)
+
+    renderer_name = options.renderer
+    if renderer_name is None and options.outfile:
+        renderer_name = "html" if options.outfile.endswith((".html", ".htm")) else "text"
+
+    if options.outfile:
+        f = open(options.outfile, "w", encoding="utf-8", errors="surrogateescape")
+    else:
+        f = sys.stdout
+
+    renderer: renderers.DiffRenderer
+    if renderer_name == "html":
+        renderer = renderers.DiffHTMLRenderer(min_fraction=options.threshold)
+    else:
+        renderer = renderers.DiffConsoleRenderer(
+            min_fraction=options.threshold,
+            unicode=(options.unicode if options.unicode is not None else file_supports_unicode(f)),
+            color=options.color if options.color is not None else file_supports_color(f),
+        )
+
+    try:
+        f.write(renderer.render(diff))
+    finally:
+        if options.outfile:
+            f.close()
+
+    if options.fail_on_regression is not None:
+        regressions = diff.regressions(options.fail_on_regression)
+        if regressions:
+            worst = regressions[0]
+            sys.exit(
+                f"pyinstrument: {len(regressions)} call stacks got slower by more than "
+                f"{options.fail_on_regression:.1%} of the baseline's time. The biggest was "
+                f"{worst.function} ({worst.delta:+.3f}s)."
+            )
+
+
+def archive_main(argv: list[str]):
+    """
+    ``pyinstrument archive DIRECTORY QUERY`` - queries a profile archive.
+    """
+    parser: Any = optparse.OptionParser(
+        usage=(
+            "usage: pyinstrument archive [options] DIRECTORY slowest [PATH]\n"
+            "       pyinstrument archive [options] DIRECTORY function NAME"
+        ),
+        description=(
+            "Queries the index of a profile archive. 'slowest' lists the longest sessions, "
+            "optionally only those for PATH, which can contain wildcards. 'function' lists the "
+            "sessions that spent more than --min-fraction of their time in the function NAME."
+        ),
+    )
+    parser.add_option(
+        "-n",
+        "--limit",
+        dest="limit",
+        action="store",
+        type=int,
+        default=20,
+        help="the maximum number of sessions to list, default 20",
+    )
+    parser.add_option(
+        "",
+        "--min-fraction",
+        dest="min_fraction",
+        action="store",
+        type=float,
+        default=0.5,
+        metavar="FRACTION",
+        help="(function only) the fraction of a session's time spent in the function, "
+        "default 0.5",
+    )
+    parser.add_option(
+        "",
+        "--file-path-contains",
+        dest="file_path_contains",
+        action="store",
+        metavar="TEXT",
+        help="(function only) only count functions whose file path contains TEXT",
+    )
+
+    options, args = parser.parse_args(argv)  # type: ignore
+    args = cast(List[str], args)  # type: ignore
+
+    if len(args) < 2:
+        parser.error("Please specify an archive directory and a query")
+
+    directory, query, *query_args = args
+    if not os.path.isdir(directory):
+        parser.error(f"No archive found at {directory}")
+
+    archive = ProfileArchive(directory)
+
+    def describe(entry: ArchiveEntry) -> str:
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.start_time))
+        file_path = os.path.join(directory, entry.filename)
+        return f"{entry.duration:8.3f}s  {timestamp}  {entry.path or '-'}  {file_path}"
+
+    if query == "slowest":
+        if len(query_args) > 1:
+            parser.error("'slowest' takes at most one PATH")
+        path = query_args[0] if query_args else None
+        for entry in archive.slowest(options.limit, path=path):
+            print(describe(entry))
+    elif query == "function":
+        if len(query_args) != 1:
+            parser.error("'function' takes a function NAME")
+        results = archive.spending_time_in(
+            query_args[0],
+            min_fraction=options.min_fraction,
+            file_path_contains=options.file_path_contains,
+            limit=options.limit,
+        )
+        for entry, fraction in results:
+            print(f"{fraction:6.1%}  {describe(entry)}")
+    else:
+        parser.error(f"Unknown query {query!r}. Use 'slowest' or 'function'.")
+
+
+SUBCOMMANDS = {
+    "archive": archive_main,
+    "diff": diff_main,
+}
+
+
 class OptionsParseError(Exception):
     pass
 
@@ -592,6 +888,11 @@ def guess_renderer_from_outfile(outfile: str) -> str | None:
 
     _, ext = os.path.splitext(outfile)
 
+    if session_format.is_compressed_path(outfile):
+        # e.g. profile.pyisession.gz
+        _, ext = os.path.splitext(outfile[: -len(ext)])
+        return "session" if ext == ".pyisession" else None
+
     if ext == ".txt":
         return "text"
     elif ext in [".html", ".htm"]:
@@ -672,6 +973,10 @@ class CommandLineOptions:
     timeline: bool
     interval: float
     use_timing_thread: bool | None
+    use_signal_timer: bool | None
+    use_thread_cputime: bool | None
+    overhead_budget: float | None
+    use_sys_monitoring: bool | None
 
 
 class ValueWithRemainingArgs:
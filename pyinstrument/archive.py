@@ -0,0 +1,353 @@
+"""
+An archive of many sessions - e.g. one per web request - in a directory,
+with an SQLite index of their metadata. The index answers questions like
+"what were the slowest requests to /api/orders?" or "which sessions spent
+more than half their time in this function?" without loading the sessions.
+
+Each session is stored as a ``.pyisession`` file. When it's added, its
+metadata and the time spent in its biggest functions are written to
+``index.sqlite3`` in the same directory.
+"""
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from pyinstrument.frame_info import IDENTIFIER_SEP
+from pyinstrument.session import Session
+from pyinstrument.typing import PathOrStr
+
+# pyright: strict
+
+
+INDEX_FILENAME = "index.sqlite3"
+SESSION_SUFFIX = ".pyisession"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT,
+    start_time REAL NOT NULL,
+    duration REAL NOT NULL,
+    sampled_time REAL NOT NULL,
+    cpu_time REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    target_description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_path_duration ON sessions (path, duration);
+CREATE INDEX IF NOT EXISTS sessions_duration ON sessions (duration);
+
+CREATE TABLE IF NOT EXISTS functions (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    identifier TEXT NOT NULL,
+    function TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    inclusive_time REAL NOT NULL,
+    self_time REAL NOT NULL,
+    -- the inclusive time, not counting time under a function of the same
+    -- name, so these can be added up by name
+    outer_time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS functions_function ON functions (function);
+CREATE INDEX IF NOT EXISTS functions_session_id ON functions (session_id);
+"""
+
+_SESSION_COLUMN_NAMES = [
+    "id",
+    "filename",
+    "path",
+    "start_time",
+    "duration",
+    "sampled_time",
+    "cpu_time",
+    "sample_count",
+    "target_description",
+]
+_SESSION_COLUMNS = ", ".join(f"sessions.{name}" for name in _SESSION_COLUMN_NAMES)
+
+
+@dataclass
+class ArchiveEntry:
+    """
+    The indexed metadata of a session in a :class:`ProfileArchive`.
+    """
+
+    id: int
+    filename: str
+    path: str | None
+    start_time: float
+    duration: float
+    sampled_time: float
+    cpu_time: float
+    sample_count: int
+    target_description: str
+
+
+@dataclass
+class ArchivedFunction:
+    """
+    The time spent in a function in an archived session.
+    """
+
+    session_id: int
+    identifier: str
+    function: str
+    file_path: str
+    inclusive_time: float
+    self_time: float
+
+
+class ProfileArchive:
+    """
+    A directory of sessions, indexed for querying.
+
+    ``path`` is what the session is about, for grouping - for a web request,
+    the URL path. Functions are indexed if they took at least
+    ``min_function_fraction`` of a session's sampled time, so queries for
+    smaller fractions than that won't find them.
+
+    Sessions can be added from several processes at once - the index is
+    only locked while a session's rows are inserted.
+
+    .. code-block:: python
+
+        archive = ProfileArchive("profiles")
+        archive.add(session, path="/api/orders")
+
+        for entry in archive.slowest(20, path="/api/orders"):
+            print(entry.duration, entry.path)
+    """
+
+    def __init__(self, directory: PathOrStr, min_function_fraction: float = 0.01) -> None:
+        self.directory = Path(directory)
+        self.min_function_fraction = min_function_fraction
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        with closing(self._connect()) as connection, connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version > SCHEMA_VERSION:
+                raise ValueError(
+                    f"The archive index in {self.directory} is from a newer version of "
+                    "pyinstrument. Please upgrade pyinstrument to use it."
+                )
+            connection.executescript(_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX_FILENAME
+
+    def add(self, session: Session, path: str | None = None) -> ArchiveEntry:
+        """
+        Saves ``session`` in the archive, and indexes it.
+        """
+        filename = f"{session.start_time:020.6f}-{uuid.uuid4().hex[:12]}{SESSION_SUFFIX}"
+        # write to a temporary file first, so the index never refers to a
+        # partially-written session
+        temp_path = self.directory / (filename + ".tmp")
+        session.save(temp_path, format="binary")
+        os.replace(temp_path, self.directory / filename)
+
+        function_index = session.function_index
+        sampled_time = sum(session.frame_records.times)
+        min_time = self.min_function_fraction * sampled_time
+
+        identifiers_by_name: dict[str, list[str]] = {}
+        for identifier in function_index.identifiers:
+            name = identifier.partition(IDENTIFIER_SEP)[0]
+            identifiers_by_name.setdefault(name, []).append(identifier)
+        outer_times: dict[str, float] = {}
+        for identifiers in identifiers_by_name.values():
+            outer_times.update(function_index.outermost_times(identifiers))
+
+        function_rows: list[tuple[str, str, str, float, float, float]] = []
+        for identifier in function_index.identifiers:
+            inclusive_time = function_index.inclusive_time(identifier)
+            if inclusive_time < min_time or inclusive_time == 0:
+                continue
+            function, _, rest = identifier.partition(IDENTIFIER_SEP)
+            file_path = rest.partition(IDENTIFIER_SEP)[0]
+            function_rows.append(
+                (
+                    identifier,
+                    function,
+                    file_path,
+                    inclusive_time,
+                    function_index.self_time(identifier),
+                    outer_times[identifier],
+                )
+            )
+
+        entry = ArchiveEntry(
+            id=0,
+            filename=filename,
+            path=path,
+            start_time=session.start_time,
+            duration=session.duration,
+            sampled_time=sampled_time,
+            cpu_time=session.cpu_time,
+            sample_count=session.sample_count,
+            target_description=session.target_description,
+        )
+
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT INTO sessions (filename, path, start_time, duration, sampled_time, "
+                "cpu_time, sample_count, target_description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.filename,
+                    entry.path,
+                    entry.start_time,
+                    entry.duration,
+                    entry.sampled_time,
+                    entry.cpu_time,
+                    entry.sample_count,
+                    entry.target_description,
+                ),
+            )
+            assert cursor.lastrowid is not None
+            entry.id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO functions (session_id, identifier, function, file_path, "
+                "inclusive_time, self_time, outer_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(entry.id, *row) for row in function_rows],
+            )
+
+        return entry
+
+    def get(self, id: int) -> ArchiveEntry:
+        """
+        Returns the entry with the given ID. Raises KeyError if there isn't
+        one.
+        """
+        entries = list(
+            self._query_entries(f"SELECT {_SESSION_COLUMNS} FROM sessions WHERE id = ?", (id,))
+        )
+        if not entries:
+            raise KeyError(id)
+        return entries[0]
+
+    def entries(self) -> list[ArchiveEntry]:
+        """
+        Returns all the entries, oldest first.
+        """
+        return list(
+            self._query_entries(f"SELECT {_SESSION_COLUMNS} FROM sessions ORDER BY start_time")
+        )
+
+    def slowest(self, limit: int = 20, path: str | None = None) -> list[ArchiveEntry]:
+        """
+        Returns the ``limit`` longest sessions, slowest first.
+
+        If ``path`` is given, only sessions whose path matches it are
+        returned. It can contain wildcards, like ``/api/orders/*``.
+        """
+        query = f"SELECT {_SESSION_COLUMNS} FROM sessions"
+        parameters: tuple[Any, ...] = ()
+        if path is not None:
+            query += " WHERE path GLOB ?"
+            parameters = (path,)
+        query += " ORDER BY duration DESC LIMIT ?"
+
+        return list(self._query_entries(query, (*parameters, limit)))
+
+    def spending_time_in(
+        self,
+        function: str,
+        min_fraction: float = 0.5,
+        file_path_contains: str | None = None,
+        limit: int | None = None,
+    ) -> list[tuple[ArchiveEntry, float]]:
+        """
+        Returns the sessions that spent more than ``min_fraction`` of their
+        sampled time in functions named ``function``, including the functions
+        they called. Each is returned with that fraction, highest first.
+        Time under several functions of that name, e.g. ones in different
+        modules that call each other, is only counted once.
+
+        If ``file_path_contains`` is given, only functions whose file path
+        contains it are counted, and time is only counted where the outermost
+        function of that name on the stack is one of them.
+        """
+        query = (
+            f"SELECT {_SESSION_COLUMNS}, "
+            "SUM(functions.outer_time) / sessions.sampled_time AS fraction "
+            "FROM functions JOIN sessions ON sessions.id = functions.session_id "
+            "WHERE functions.function = ?"
+        )
+        parameters: tuple[Any, ...] = (function,)
+        if file_path_contains is not None:
+            query += " AND instr(functions.file_path, ?) > 0"
+            parameters += (file_path_contains,)
+        query += " GROUP BY sessions.id HAVING fraction > ? ORDER BY fraction DESC"
+        parameters += (min_fraction,)
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters += (limit,)
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, parameters).fetchall()
+
+        return [(ArchiveEntry(*row[:-1]), row[-1]) for row in rows]
+
+    def top_functions(
+        self, entry: ArchiveEntry, limit: int = 10, by_self_time: bool = True
+    ) -> list[ArchivedFunction]:
+        """
+        Returns the indexed functions of a session that took the most time -
+        either by self time, or including the functions they called.
+        """
+        order_column = "self_time" if by_self_time else "inclusive_time"
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT session_id, identifier, function, file_path, inclusive_time, self_time "
+                f"FROM functions WHERE session_id = ? ORDER BY {order_column} DESC LIMIT ?",
+                (entry.id, limit),
+            ).fetchall()
+
+        return [ArchivedFunction(*row) for row in rows]
+
+    def load(self, entry: ArchiveEntry) -> Session:
+        """
+        Loads the session of an entry.
+        """
+        return Session.load(self.directory / entry.filename, lazy=True)
+
+    def remove(self, entry: ArchiveEntry) -> None:
+        """
+        Deletes a session from the archive.
+        """
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM sessions WHERE id = ?", (entry.id,))
+
+        try:
+            os.unlink(self.directory / entry.filename)
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        with closing(self._connect()) as connection:
+            return connection.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        # a long timeout, because other processes might be adding sessions
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    def _query_entries(
+        self, query: str, parameters: tuple[Any, ...] = ()
+    ) -> Iterator[ArchiveEntry]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute(query, parameters).fetchall()
+
+        for row in rows:
+            yield ArchiveEntry(*row)
@@ -0,0 +1,213 @@
+"""
+Comparison of two sessions, to find what got slower or faster between them -
+for example, between two releases of a program, run on the same workload.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterator
+
+from pyinstrument.frame import DUMMY_ROOT_FRAME_IDENTIFIER, THREAD_FILE_PATH
+from pyinstrument.frame_info import IDENTIFIER_SEP, frame_info_get_identifier
+from pyinstrument.frame_records import ROOT_NODE_ID, FrameRecords
+
+if TYPE_CHECKING:
+    from pyinstrument.session import Session
+
+# pyright: strict
+
+
+BASELINE = 0
+CANDIDATE = 1
+
+
+class DiffNode:
+    """
+    A call stack that appears in either or both of the sessions being
+    compared, with the time spent in it in each.
+    """
+
+    identifier: str
+    parent: DiffNode | None
+    children: dict[str, DiffNode]
+
+    def __init__(self, identifier: str, parent: DiffNode | None) -> None:
+        self.identifier = identifier
+        self.parent = parent
+        self.children = {}
+        # indexed by BASELINE and CANDIDATE
+        self.times = [0.0, 0.0]
+        self.self_times = [0.0, 0.0]
+
+    @property
+    def baseline_time(self) -> float:
+        return self.times[BASELINE]
+
+    @property
+    def candidate_time(self) -> float:
+        return self.times[CANDIDATE]
+
+    @property
+    def delta(self) -> float:
+        """
+        The change in time spent in this call stack, including the functions
+        it calls. Positive if the candidate is slower.
+        """
+        return self.times[CANDIDATE] - self.times[BASELINE]
+
+    @property
+    def self_delta(self) -> float:
+        """
+        The change in time spent in the function itself.
+        """
+        return self.self_times[CANDIDATE] - self.self_times[BASELINE]
+
+    @property
+    def function(self) -> str:
+        return self.identifier.split(IDENTIFIER_SEP)[0]
+
+    @property
+    def file_path(self) -> str | None:
+        parts = self.identifier.split(IDENTIFIER_SEP)
+        return parts[1] if len(parts) > 1 else None
+
+    @property
+    def line_no(self) -> int | None:
+        parts = self.identifier.split(IDENTIFIER_SEP)
+        return int(parts[2]) if len(parts) > 2 else None
+
+    def path(self) -> list[DiffNode]:
+        """
+        Returns the nodes from the outermost call down to this one, not
+        including the root.
+        """
+        result: list[DiffNode] = []
+        node = self
+        while node.parent is not None:
+            result.append(node)
+            node = node.parent
+        result.reverse()
+        return result
+
+    def __repr__(self) -> str:
+        return "DiffNode(%r, baseline_time=%f, candidate_time=%f)" % (
+            self.function,
+            self.baseline_time,
+            self.candidate_time,
+        )
+
+
+class SessionDiff:
+    """
+    The difference between a baseline session and a candidate session.
+
+    Call stacks are matched by the path of frame identifiers from the root,
+    using a dict at each node, so building the diff takes time proportional
+    to the number of distinct call stacks. It doesn't build frame trees or
+    run processors, so the times are those recorded.
+
+    Thread frames are matched by thread name, because thread idents change
+    between runs. If ``ignore_line_numbers`` is True, functions are matched
+    by name and file only, so a function that moved within its file between
+    the two sessions still matches. Matched nodes show the candidate's
+    identifier, i.e. where the function is now.
+    """
+
+    def __init__(self, baseline: Session, candidate: Session, ignore_line_numbers: bool = True):
+        self.baseline = baseline
+        self.candidate = candidate
+        self.ignore_line_numbers = ignore_line_numbers
+        self.root = DiffNode(DUMMY_ROOT_FRAME_IDENTIFIER, parent=None)
+        self._keys: dict[str, str] = {}
+
+        self._add_records(baseline.frame_records, BASELINE)
+        self._add_records(candidate.frame_records, CANDIDATE)
+
+    @property
+    def baseline_total(self) -> float:
+        return self.root.times[BASELINE]
+
+    @property
+    def candidate_total(self) -> float:
+        return self.root.times[CANDIDATE]
+
+    def normalised_delta(self, node: DiffNode) -> float:
+        """
+        The change in the proportion of each session's total time spent in
+        ``node``. This is useful when the sessions ran for different lengths
+        of time, e.g. because they processed a different amount of work.
+        """
+        baseline_total = self.baseline_total
+        candidate_total = self.candidate_total
+        baseline = node.times[BASELINE] / baseline_total if baseline_total else 0.0
+        candidate = node.times[CANDIDATE] / candidate_total if candidate_total else 0.0
+        return candidate - baseline
+
+    def nodes(self) -> Iterator[DiffNode]:
+        """
+        Yields every node, parents before children. The root isn't included.
+        """
+        pending = list(self.root.children.values())
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(node.children.values())
+
+    def regressions(self, min_fraction: float = 0.0, normalised: bool = False) -> list[DiffNode]:
+        """
+        Returns the nodes that got slower by more than ``min_fraction`` of
+        the baseline's total time, slowest first. If ``normalised`` is True,
+        :meth:`normalised_delta` is compared with ``min_fraction`` instead.
+        """
+        if normalised:
+            result = [node for node in self.nodes() if self.normalised_delta(node) > min_fraction]
+            result.sort(key=self.normalised_delta, reverse=True)
+        else:
+            threshold = min_fraction * self.baseline_total
+            result = [node for node in self.nodes() if node.delta > threshold]
+            result.sort(key=lambda node: node.delta, reverse=True)
+        return result
+
+    def _key(self, frame_info: str) -> str:
+        key = self._keys.get(frame_info)
+        if key is None:
+            identifier = frame_info_get_identifier(frame_info)
+            parts = identifier.split(IDENTIFIER_SEP)
+            if len(parts) == 3 and (parts[1] == THREAD_FILE_PATH or self.ignore_line_numbers):
+                key = IDENTIFIER_SEP.join(parts[:2])
+            else:
+                key = identifier
+            self._keys[frame_info] = key
+        return key
+
+    def _add_records(self, frame_records: FrameRecords, side: int):
+        stack_trie = frame_records.stack_trie
+        parents = stack_trie.parents
+        frame_infos = stack_trie.frame_infos
+
+        node_times = [0.0] * len(parents)
+        for stack_id, time in zip(frame_records.stack_ids, frame_records.times):
+            node_times[stack_id] += time
+
+        # parents always have lower IDs than their children
+        diff_nodes = [self.root] * len(parents)
+        for node_id in range(1, len(parents)):
+            parent = diff_nodes[parents[node_id]]
+            key = self._key(frame_infos[node_id])
+            identifier = frame_info_get_identifier(frame_infos[node_id])
+            diff_node = parent.children.get(key)
+            if diff_node is None:
+                diff_node = parent.children[key] = DiffNode(identifier, parent=parent)
+            elif side == CANDIDATE:
+                diff_node.identifier = identifier
+            diff_nodes[node_id] = diff_node
+            diff_node.self_times[side] += node_times[node_id]
+
+        # several trie nodes can share a diff node (e.g. with different line
+        # numbers), but never one and its descendant, so their subtree times
+        # can be added up
+        subtree_times = node_times
+        for node_id in range(len(parents) - 1, ROOT_NODE_ID, -1):
+            subtree_times[parents[node_id]] += subtree_times[node_id]
+            diff_nodes[node_id].times[side] += subtree_times[node_id]
+        self.root.times[side] += subtree_times[ROOT_NODE_ID]
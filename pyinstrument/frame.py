@@ -9,6 +9,7 @@ from typing import Callable, Sequence
 from pyinstrument.frame_info import (
     ATTRIBUTE_MARKER_CLASS_NAME,
     ATTRIBUTE_MARKER_TRACEBACKHIDE,
+    IDENTIFIER_SEP,
     frame_info_get_identifier,
     parse_frame_info,
 )
@@ -32,6 +33,10 @@ SYNTHETIC_FRAME_IDENTIFIERS = frozenset(
     ]
 )
 
+# the file path of the frame at the root of each call stack, which
+# identifies the thread the sample was taken on
+THREAD_FILE_PATH = "<thread>"
+
 # these identifiers can have no children - correspondingly, they can have time
 # that is not the sum of their children's time
 SYNTHETIC_LEAF_IDENTIFIERS = frozenset(
@@ -54,6 +59,21 @@ class Frame:
     Object that represents a stack frame in the parsed tree
     """
 
+    # frames are numerous - a long session can have hundreds of thousands -
+    # so they're slotted, and the identifier's parts and the attributes dict
+    # are only made when they're needed
+    __slots__ = (
+        "identifier",
+        "parent",
+        "group",
+        "time",
+        "absorbed_time",
+        "_context",
+        "_attributes",
+        "_children",
+    )
+
+    identifier: str
     parent: Frame | None
     group: FrameGroup | None
     time: float
@@ -64,7 +84,8 @@ class Frame:
     # tracks the time from frames that were deleted during processing
     absorbed_time: float
 
-    attributes: dict[str, float]
+    _attributes: dict[str, float] | None
+    _children: list[Frame]
 
     def __init__(
         self,
@@ -76,31 +97,51 @@ class Frame:
         identifier = frame_info_get_identifier(identifier_or_frame_info)
         self.identifier = identifier
         self.parent = None
-        self.time = 0.0
         self.group = None
         self.absorbed_time = 0.0
         self._context = context
-
-        self._identifier_parts = identifier.split("\x00")
-        self.attributes = {}
+        self._attributes = None
         self._children = []
 
-        self.record_time_from_frame_info(frame_info=identifier_or_frame_info, time=time)
+        if identifier is identifier_or_frame_info:
+            # no attributes to parse
+            self.time = time
+        else:
+            self.time = 0.0
+            self.record_time_from_frame_info(frame_info=identifier_or_frame_info, time=time)
 
         if children:
             for child in children:
                 self.add_child(child)
 
+    @property
+    def attributes(self) -> dict[str, float]:
+        """
+        The attributes observed in this frame, mapped to the time each was
+        observed for.
+        """
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value: dict[str, float]):
+        self._attributes = value
+
     def record_time_from_frame_info(self, frame_info: str, time: float):
         self.time += time
 
         _, attributes_list = parse_frame_info(frame_info)
 
+        if not attributes_list:
+            return
+
+        attributes = self.attributes
         for attribute in attributes_list:
             try:
-                self.attributes[attribute] += time
+                attributes[attribute] += time
             except KeyError:
-                self.attributes[attribute] = time
+                attributes[attribute] = time
 
     def remove_from_parent(self):
         """
@@ -117,6 +158,11 @@ class Frame:
         return self._context
 
     def set_context(self, context: FrameContext | None):
+        if self._context is context:
+            # a frame's descendants always have its context, so there's
+            # nothing to do. This matters when processors move frames
+            # around within a tree.
+            return
         self._context = context
         for child in self._children:
             child.set_context(context)
@@ -154,17 +200,19 @@ class Frame:
 
     @property
     def function(self) -> str:
-        return self._identifier_parts[0]
+        return self.identifier.split(IDENTIFIER_SEP, 1)[0]
 
     @property
     def file_path(self) -> str | None:
-        if len(self._identifier_parts) > 1:
-            return self._identifier_parts[1]
+        parts = self.identifier.split(IDENTIFIER_SEP, 2)
+        if len(parts) > 1:
+            return parts[1]
 
     @property
     def line_no(self) -> int | None:
-        if len(self._identifier_parts) > 2:
-            return int(self._identifier_parts[2])
+        parts = self.identifier.split(IDENTIFIER_SEP)
+        if len(parts) > 2:
+            return int(parts[2])
 
     @property
     def file_path_short(self) -> str | None:
@@ -216,9 +264,6 @@ class Frame:
             return "%s:%i" % (file_path_short, self.line_no)
         return file_path_short
 
-    _children: list[Frame]
-    attributes: dict[str, float]
-
     def add_child(self, frame: Frame, after: Frame | None = None):
         """
         Adds a child frame, updating the parent link.
@@ -287,9 +332,12 @@ class Frame:
         # observation, and the value representing the duration that it was
         # observed. the first character of the observation is the 'marker' -
         # the type of the attribute, the rest is data.
+        if not self._attributes:
+            return None
+
         matching_attributes = [
             a_tuple
-            for a_tuple in self.attributes.items()
+            for a_tuple in self._attributes.items()
             if a_tuple[0].startswith(attribute_marker)
         ]
 
@@ -348,7 +396,7 @@ class Frame:
         property_decls: list[str] = []
         property_decls.append('"identifier": %s' % encode_str(self.identifier))
         property_decls.append('"time": %f' % self.time)
-        property_decls.append('"attributes": %s' % json.dumps(self.attributes))
+        property_decls.append('"attributes": %s' % json.dumps(self._attributes or {}))
         child_jsons: list[str] = []
         for child in self.children:
             child_jsons.append(child.to_json_str())
@@ -358,6 +406,10 @@ class Frame:
 
 
 class FrameGroup:
+    __slots__ = ("root", "id", "_frames", "_exit_frames")
+
+    root: Frame
+    id: str
     _frames: list[Frame]
     _exit_frames: list[Frame] | None
 
@@ -1,4 +1,5 @@
-from typing import List, Tuple
+import sys
+from typing import Dict, List, Tuple
 
 # pyright: strict
 
@@ -38,3 +39,22 @@ def frame_info_get_identifier(frame_info: str) -> str:
         return frame_info
 
     return frame_info[0:index]
+
+
+class FrameInfoCache(Dict[str, Tuple[str, Tuple[str, ...]]]):
+    """
+    A cache of parsed frame info strings. Looking one up returns the same
+    as :func:`parse_frame_info`, but each string is only parsed the first
+    time, so a session's frame info strings, which repeat a lot, can be
+    looked up instead of parsed again. The identifiers and attributes are
+    interned, so frames with the same identifier or attribute share one
+    string, and comparing them is quick.
+    """
+
+    def __missing__(self, frame_info: str) -> Tuple[str, Tuple[str, ...]]:
+        identifier, attributes = parse_frame_info(frame_info)
+        result = self[frame_info] = (
+            sys.intern(identifier),
+            tuple(sys.intern(attribute) for attribute in attributes),
+        )
+        return result
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Sequence, Tuple
+from typing import Sequence
 
 from pyinstrument.frame import (
     DUMMY_ROOT_FRAME_IDENTIFIER,
@@ -8,63 +8,140 @@ from pyinstrument.frame import (
     Frame,
     FrameContext,
 )
-from pyinstrument.frame_info import frame_info_get_identifier
+from pyinstrument.frame_info import FrameInfoCache
+from pyinstrument.frame_records import ROOT_NODE_ID, FrameRecords, FrameRecordType
 from pyinstrument.typing import LiteralStr, assert_never
 
 # pyright: strict
 
 
-FrameRecordType = Tuple[List[str], float]
+def build_frame_tree(
+    frame_records: Sequence[FrameRecordType],
+    context: FrameContext,
+    frame_info_cache: FrameInfoCache | None = None,
+) -> Frame | None:
+    """
+    Builds a timeline tree of :class:`Frame` objects from the records.
+    Consecutive records that share a part of their call stack share the
+    frames for that part.
 
+    Frame info strings are parsed using ``frame_info_cache``, which can be
+    kept to reuse the parsing next time - see :meth:`Session.root_frame`.
+    """
+    records = FrameRecords.from_list(frame_records)
 
-class IdentifierDoesntMatchException(ValueError):
-    pass
+    if len(records) == 0:
+        return None
 
+    stack_trie = records.stack_trie
+    parents = stack_trie.parents
+    depths = stack_trie.depths
+    frame_infos = stack_trie.frame_infos
 
-def build_frame_tree(
-    frame_records: Sequence[FrameRecordType], context: FrameContext
-) -> Frame | None:
-    if len(frame_records) == 0:
-        return None
+    # parsing is cached per frame info, because the same one appears in many
+    # trie nodes
+    if frame_info_cache is None:
+        frame_info_cache = FrameInfoCache()
+    parse = frame_info_cache.__getitem__
 
     root_frame = Frame(identifier_or_frame_info=DUMMY_ROOT_FRAME_IDENTIFIER, context=context)
 
-    # put the root frame at the bottom of the stack
+    # The call stack of the previous record. Each position holds the trie
+    # node, the frame it's recorded in, and the value of `total_time` when
+    # each of them was entered. Rather than adding time to every frame in
+    # the stack for every record, time is added when a frame or node leaves
+    # the stack, so the work per record is proportional to how much the stack
+    # changed, rather than its depth.
+    node_stack: list[int] = [ROOT_NODE_ID]
+    node_start_times: list[float] = [0.0]
     frame_stack: list[Frame] = [root_frame]
-
-    for frame_info_stack, time in frame_records:
-        stack_depth = 0
-        root_frame.record_time_from_frame_info(DUMMY_ROOT_FRAME_IDENTIFIER, time)
-
-        for stack_depth, frame_info in enumerate(frame_info_stack, start=1):
-            frame_identifier = frame_info_get_identifier(frame_info)
-            try:
-                frame = frame_stack[stack_depth]
-                if frame.identifier != frame_identifier:
-                    # trim any frames after and including this one, and make a new frame
-                    del frame_stack[stack_depth:]
-                    raise IdentifierDoesntMatchException()
-            except (IndexError, IdentifierDoesntMatchException):
-                # create a new frame
-                parent = frame_stack[stack_depth - 1]
-                frame = Frame(identifier_or_frame_info=frame_info)
-                parent.add_child(frame)
-
-                assert len(frame_stack) == stack_depth
-                frame_stack.append(frame)
-
-            frame.record_time_from_frame_info(frame_info=frame_info, time=time)
-
-        # trim any extra frames
-        del frame_stack[stack_depth + 1 :]
-
-        final_frame = frame_stack[-1]
-
-        if not final_frame.is_synthetic_leaf:
-            # record the self-time
-            final_frame.add_child(
-                Frame(identifier_or_frame_info=SELF_TIME_FRAME_IDENTIFIER, time=time)
-            )
+    frame_start_times: list[float] = [0.0]
+
+    self_time_frame: Frame | None = None
+    self_time_start = 0.0
+
+    total_time = 0.0
+
+    def exit_node(position: int):
+        frame = frame_stack[position]
+        time = total_time - node_start_times[position]
+        _, attributes = parse(frame_infos[node_stack[position]])
+        if not attributes:
+            return
+        frame_attributes = frame.attributes
+        for attribute in attributes:
+            frame_attributes[attribute] = frame_attributes.get(attribute, 0.0) + time
+
+    for stack_id, time in zip(records.stack_ids, records.times):
+        if stack_id != node_stack[-1]:
+            # find the deepest node that this stack shares with the previous
+            # one, by walking up from the new leaf
+            new_nodes: list[int] = []
+            node_id = stack_id
+            depth = depths[node_id]
+            while depth >= len(node_stack) or node_stack[depth] != node_id:
+                new_nodes.append(node_id)
+                node_id = parents[node_id]
+                depth -= 1
+            new_nodes.reverse()
+            common_depth = depth
+
+            for position in range(len(node_stack) - 1, common_depth, -1):
+                exit_node(position)
+            del node_stack[common_depth + 1 :]
+            del node_start_times[common_depth + 1 :]
+
+            # frames continue while identifiers match, even though the nodes
+            # differ (e.g. because the line number changed)
+            position = common_depth + 1
+            new_node_index = 0
+            while (
+                new_node_index < len(new_nodes)
+                and position < len(frame_stack)
+                and frame_stack[position].identifier
+                == parse(frame_infos[new_nodes[new_node_index]])[0]
+            ):
+                node_stack.append(new_nodes[new_node_index])
+                node_start_times.append(total_time)
+                position += 1
+                new_node_index += 1
+
+            if position < len(frame_stack) or new_node_index < len(new_nodes):
+                # the frame stack is changing, so the self time frame ends
+                if self_time_frame is not None:
+                    self_time_frame.time += total_time - self_time_start
+                    self_time_frame = None
+
+                for exiting_position in range(len(frame_stack) - 1, position - 1, -1):
+                    exiting_frame = frame_stack[exiting_position]
+                    exiting_frame.time += total_time - frame_start_times[exiting_position]
+                del frame_stack[position:]
+                del frame_start_times[position:]
+
+                for node_id in new_nodes[new_node_index:]:
+                    frame = Frame(identifier_or_frame_info=parse(frame_infos[node_id])[0])
+                    frame_stack[-1].add_child(frame)
+                    frame_stack.append(frame)
+                    frame_start_times.append(total_time)
+                    node_stack.append(node_id)
+                    node_start_times.append(total_time)
+
+        if self_time_frame is None and not frame_stack[-1].is_synthetic_leaf:
+            self_time_frame = Frame(identifier_or_frame_info=SELF_TIME_FRAME_IDENTIFIER)
+            frame_stack[-1].add_child(self_time_frame)
+            self_time_start = total_time
+
+        total_time += time
+
+    # close everything that's still open
+    if self_time_frame is not None:
+        self_time_frame.time += total_time - self_time_start
+
+    for position in range(len(frame_stack) - 1, 0, -1):
+        exit_node(position)
+        frame_stack[position].time += total_time - frame_start_times[position]
+
+    root_frame.time = total_time
 
     if len(root_frame.children) == 1:
         root_frame = root_frame.children[0]
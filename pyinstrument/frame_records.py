@@ -0,0 +1,701 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+    overload,
+)
+
+if TYPE_CHECKING:
+    from pyinstrument.low_level.stat_profile import SampleBuffer
+
+# pyright: strict
+
+
+FrameRecordType = Tuple[List[str], float]
+
+ROOT_NODE_ID = 0
+
+
+class StackTrie:
+    """
+    A prefix tree of call stacks. Stacks that share a prefix store it only
+    once, so a whole call stack can be referred to by a single node ID.
+
+    Each node represents a call stack - the stack of its parent, plus one
+    frame info. Node 0 is the root, which represents the empty stack. A
+    node's parent always has a lower ID than the node itself.
+    """
+
+    parents: list[int]
+    frame_infos: list[str]
+    depths: list[int]
+    _children: list[dict[str, int]]
+
+    def __init__(self) -> None:
+        self.parents = [-1]
+        self.frame_infos = [""]
+        self.depths = [0]
+        self._children = [{}]
+
+    @staticmethod
+    def from_nodes(parents: Sequence[int], frame_infos: Sequence[str]) -> StackTrie:
+        """
+        Creates a StackTrie from lists of parent IDs and frame infos, indexed
+        by node ID, in the same layout as :attr:`parents` and
+        :attr:`frame_infos`.
+        """
+        trie = StackTrie()
+        trie.parents = list(parents)
+        trie.frame_infos = list(frame_infos)
+        trie.depths = [0] * len(parents)
+        trie._children = [{} for _ in parents]
+
+        depths = trie.depths
+        children = trie._children
+        for node_id in range(1, len(parents)):
+            parent_id = parents[node_id]
+            depths[node_id] = depths[parent_id] + 1
+            children[parent_id][frame_infos[node_id]] = node_id
+
+        return trie
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    def child(self, node_id: int, frame_info: str) -> int:
+        """
+        Returns the ID of the node for the stack of ``node_id`` plus
+        ``frame_info``, creating it if necessary.
+        """
+        child_id = self._children[node_id].get(frame_info)
+        if child_id is None:
+            child_id = self._add_node(node_id, frame_info)
+        return child_id
+
+    def node_for_stack(self, stack: Iterable[str], node_id: int = ROOT_NODE_ID) -> int:
+        """
+        Returns the ID of the node for a call stack (listed from the root
+        down), creating nodes as necessary. If ``node_id`` is passed,
+        ``stack`` is taken to be relative to that node.
+        """
+        children = self._children
+
+        for frame_info in stack:
+            child_id = children[node_id].get(frame_info)
+            if child_id is None:
+                child_id = self._add_node(node_id, frame_info)
+            node_id = child_id
+
+        return node_id
+
+    def stack_for_node(self, node_id: int) -> list[str]:
+        """
+        Returns the call stack that a node represents, from the root down.
+        """
+        parents = self.parents
+        frame_infos = self.frame_infos
+
+        stack: list[str] = []
+        while node_id != ROOT_NODE_ID:
+            stack.append(frame_infos[node_id])
+            node_id = parents[node_id]
+
+        stack.reverse()
+        return stack
+
+    def import_nodes(self, other: StackTrie) -> list[int]:
+        """
+        Adds all the stacks in ``other`` to this trie. Returns a list that
+        maps node IDs in ``other`` to node IDs in this trie.
+        """
+        if other is self:
+            return list(range(len(self)))
+
+        mapping = [ROOT_NODE_ID] * len(other)
+        other_parents = other.parents
+        other_frame_infos = other.frame_infos
+
+        # parents always come before their children, so the parent's mapping
+        # is always known by the time we reach the child
+        for node_id in range(1, len(other)):
+            mapping[node_id] = self.child(
+                mapping[other_parents[node_id]], other_frame_infos[node_id]
+            )
+
+        return mapping
+
+    def compacted(self, node_ids: Iterable[int]) -> tuple[StackTrie, list[int]]:
+        """
+        Returns a copy of this trie with only the nodes in ``node_ids`` and
+        their ancestors, and a list that maps node IDs in this trie to node
+        IDs in the copy. Nodes that were dropped map to -1.
+        """
+        parents = self.parents
+        live = bytearray(len(parents))
+        live[ROOT_NODE_ID] = 1
+
+        for node_id in node_ids:
+            while not live[node_id]:
+                live[node_id] = 1
+                node_id = parents[node_id]
+
+        mapping = [-1] * len(parents)
+        new_parents: list[int] = []
+        new_frame_infos: list[str] = []
+        # parents come before their children, so numbering the live nodes in
+        # order keeps that true in the copy
+        for node_id, is_live in enumerate(live):
+            if is_live:
+                mapping[node_id] = len(new_parents)
+                new_parents.append(mapping[parents[node_id]] if node_id != ROOT_NODE_ID else -1)
+                new_frame_infos.append(self.frame_infos[node_id])
+
+        return StackTrie.from_nodes(new_parents, new_frame_infos), mapping
+
+    def roots(self) -> list[int]:
+        """
+        Returns a list that maps each node ID to the ID of its outermost
+        ancestor - the node just below the root. The root maps to itself.
+        """
+        parents = self.parents
+        roots = [ROOT_NODE_ID] * len(parents)
+        for node_id in range(1, len(parents)):
+            parent_id = parents[node_id]
+            roots[node_id] = node_id if parent_id == ROOT_NODE_ID else roots[parent_id]
+        return roots
+
+    def _add_node(self, parent_id: int, frame_info: str) -> int:
+        node_id = len(self.parents)
+        self.parents.append(parent_id)
+        self.frame_infos.append(frame_info)
+        self.depths.append(self.depths[parent_id] + 1)
+        self._children.append({})
+        self._children[parent_id][frame_info] = node_id
+        return node_id
+
+
+class FrameRecords(Sequence[FrameRecordType]):
+    """
+    The samples recorded in a profile session. Each record is a call stack,
+    stored as a :class:`StackTrie` node ID, and the time since the previous
+    record.
+
+    Optionally, records also have a :attr:`timestamps` column, the wall-clock
+    time (as returned by :func:`time.time`) at which each sample was taken.
+    Records with timestamps can be placed on a timeline exactly, even when
+    they come from different sessions.
+
+    Records can also have a :attr:`counts` column, the number of samples in
+    each record. :meth:`add_sample` merges consecutive samples with the same
+    call stack into one record, adding up their time, which saves a lot of
+    records in tight loops. Without counts, each record is one sample.
+
+    For compatibility, this object also acts as a read-only sequence of
+    ``(call_stack, time)`` tuples, but accessing records that way builds the
+    call stack lists, so it's much slower than using :attr:`stack_ids` and
+    :attr:`times` directly.
+
+    The columns of a session loaded lazily from a binary file (see
+    :meth:`pyinstrument.session.Session.load`) are read-only memoryviews of
+    the file, so those records can't be appended to.
+    """
+
+    stack_trie: StackTrie
+    stack_ids: array[int]
+    times: array[float]
+    timestamps: array[float] | None
+    counts: array[int] | None
+
+    def __init__(
+        self,
+        stack_trie: StackTrie | None = None,
+        stack_ids: array[int] | None = None,
+        times: array[float] | None = None,
+        timestamps: array[float] | None = None,
+        counts: array[int] | None = None,
+    ) -> None:
+        self.stack_trie = stack_trie if stack_trie is not None else StackTrie()
+        self.stack_ids = stack_ids if stack_ids is not None else array("I")
+        self.times = times if times is not None else array("d")
+        self.timestamps = timestamps
+        self.counts = counts
+
+        if len(self.stack_ids) != len(self.times):
+            raise ValueError("stack_ids and times must be the same length")
+        if timestamps is not None and len(timestamps) != len(self.times):
+            raise ValueError("timestamps and times must be the same length")
+        if counts is not None and len(counts) != len(self.times):
+            raise ValueError("counts and times must be the same length")
+
+    @staticmethod
+    def from_list(
+        frame_records: Iterable[FrameRecordType],
+        timestamps: Sequence[float] | None = None,
+        counts: Sequence[int] | None = None,
+    ) -> FrameRecords:
+        """
+        Creates a FrameRecords object from a list of ``(call_stack, time)``
+        tuples, and optionally lists of timestamps and counts. If
+        ``frame_records`` is already a FrameRecords object, it's returned
+        unchanged.
+        """
+        if isinstance(frame_records, FrameRecords):
+            return frame_records
+
+        result = FrameRecords()
+        for call_stack, time in frame_records:
+            result.record(call_stack, time)
+
+        if timestamps is not None:
+            if len(timestamps) != len(result):
+                raise ValueError("timestamps and frame_records must be the same length")
+            result.timestamps = array("d", timestamps)
+
+        if counts is not None:
+            if len(counts) != len(result):
+                raise ValueError("counts and frame_records must be the same length")
+            result.counts = array("I", counts)
+
+        return result
+
+    @staticmethod
+    def from_sample_buffer(sample_buffer: SampleBuffer) -> FrameRecords:
+        """
+        Creates a FrameRecords object from the samples recorded natively into
+        a :class:`pyinstrument.low_level.stat_profile.SampleBuffer`.
+        """
+        frame_infos, parents_bytes, stack_ids_bytes, times_bytes = sample_buffer.export()
+
+        parents = array("i")
+        parents.frombytes(parents_bytes)
+        stack_ids = array("I")
+        stack_ids.frombytes(stack_ids_bytes)
+        times = array("d")
+        times.frombytes(times_bytes)
+
+        return FrameRecords(
+            stack_trie=StackTrie.from_nodes(parents, frame_infos),
+            stack_ids=stack_ids,
+            times=times,
+        )
+
+    def record(
+        self, call_stack: Iterable[str], time: float, timestamp: float | None = None
+    ) -> None:
+        """
+        Adds a record to the end. ``timestamp`` is required if, and only if,
+        these records have timestamps.
+        """
+        self.record_stack_id(self.stack_trie.node_for_stack(call_stack), time, timestamp)
+
+    def record_stack_id(
+        self, stack_id: int, time: float, timestamp: float | None = None, count: int = 1
+    ) -> None:
+        """
+        Adds a record to the end, where the stack is already in the trie.
+        ``count`` is the number of samples in the record, which must be 1
+        unless these records have counts.
+        """
+        timestamps = self.timestamps
+        counts = self.counts
+        if (timestamps is None) != (timestamp is None):
+            raise ValueError("A timestamp must be given if, and only if, records have timestamps.")
+        if counts is None and count != 1:
+            raise ValueError("These records don't have counts, so each must be one sample.")
+
+        self.stack_ids.append(stack_id)
+        self.times.append(time)
+        if timestamps is not None:
+            timestamps.append(timestamp)  # type: ignore
+        if counts is not None:
+            counts.append(count)
+
+    def add_sample(self, call_stack: Iterable[str], time: float) -> None:
+        """
+        Adds a sample. If its call stack is the same as the last record's,
+        it's merged into that record - the time is added, and the count goes
+        up by one. Otherwise, a new record is added. The records must have
+        counts, and no timestamps.
+        """
+        counts = self.counts
+        if counts is None or self.timestamps is not None:
+            raise ValueError(
+                "Samples can only be merged into records with counts and no timestamps."
+            )
+
+        stack_id = self.stack_trie.node_for_stack(call_stack)
+        stack_ids = self.stack_ids
+        if stack_ids and stack_ids[-1] == stack_id:
+            self.times[-1] += time
+            counts[-1] += 1
+        else:
+            stack_ids.append(stack_id)
+            self.times.append(time)
+            counts.append(1)
+
+    @property
+    def sample_count(self) -> int:
+        """
+        The number of samples in the records.
+        """
+        if self.counts is None:
+            return len(self)
+        return sum(self.counts)
+
+    def _length_recorded(self) -> int:
+        # record() appends to each array in turn, so if it's running on
+        # another thread, the last array is the one to trust
+        if self.counts is not None:
+            return len(self.counts)
+        return len(self.timestamps) if self.timestamps is not None else len(self.times)
+
+    @staticmethod
+    def concatenate(frame_records: Sequence[FrameRecords]) -> FrameRecords:
+        """
+        Returns a new FrameRecords containing the records of each of
+        ``frame_records``, in order. The result shares the first object's
+        stack trie, which only gains nodes, so the first object is
+        unaffected.
+        """
+        if len(frame_records) == 0:
+            return FrameRecords()
+
+        first = frame_records[0]
+        stack_trie = first.stack_trie
+        stack_ids = array("I", first.stack_ids)
+        times = array("d", first.times)
+        # timestamps are only kept if every input has them
+        timestamps = None
+        if all(r.timestamps is not None for r in frame_records):
+            timestamps = array("d")
+            for other in frame_records:
+                timestamps.extend(other.timestamps)  # type: ignore
+        # counts are kept if any input has them - records without are one
+        # sample each
+        counts = None
+        if any(r.counts is not None for r in frame_records):
+            counts = array("I")
+            for other in frame_records:
+                if other.counts is not None:
+                    counts.extend(other.counts)
+                else:
+                    counts.extend([1] * len(other))
+
+        for other in frame_records[1:]:
+            if other.stack_trie is stack_trie:
+                stack_ids.extend(other.stack_ids)
+            else:
+                mapping = stack_trie.import_nodes(other.stack_trie)
+                stack_ids.extend(map(mapping.__getitem__, other.stack_ids))
+            times.extend(other.times)
+
+        return FrameRecords(
+            stack_trie=stack_trie,
+            stack_ids=stack_ids,
+            times=times,
+            timestamps=timestamps,
+            counts=counts,
+        )
+
+    def snapshot(self) -> FrameRecords:
+        """
+        Returns a copy of the records, sharing the stack trie. It's safe to
+        call this while records are being added on another thread.
+        """
+        return self[: self._length_recorded()]
+
+    def take(self) -> FrameRecords:
+        """
+        Removes the records so far, and returns them, sharing the stack trie.
+        It's safe to call this while records are being added on another
+        thread - records added meanwhile stay in this object.
+        """
+        length = self._length_recorded()
+        result = self[:length]
+        # anything appended since is after this prefix, in every array
+        del self.stack_ids[:length]
+        del self.times[:length]
+        if self.timestamps is not None:
+            del self.timestamps[:length]
+        if self.counts is not None:
+            del self.counts[:length]
+        return result
+
+    def grouped_by_root(self) -> FrameRecords:
+        """
+        Returns a copy with the records reordered so that those with the same
+        root frame - e.g. the same thread - are together, in the order the
+        roots were first seen. Otherwise, the order is kept.
+        """
+        roots = self.stack_trie.roots()
+
+        groups: dict[int, list[int]] = {}
+        for index, stack_id in enumerate(self.stack_ids):
+            groups.setdefault(roots[stack_id], []).append(index)
+
+        return self._reordered([index for group in groups.values() for index in group])
+
+    def sorted_by_timestamp(self) -> FrameRecords:
+        """
+        Returns a copy with the records in timestamp order. Records with the
+        same timestamp keep their order. The records must have timestamps.
+        """
+        timestamps = self.timestamps
+        if timestamps is None:
+            raise ValueError("These records don't have timestamps.")
+
+        return self._reordered(sorted(range(len(timestamps)), key=timestamps.__getitem__))
+
+    def view(self, start: int, stop: int) -> FrameRecords:
+        """
+        Returns the records from index ``start`` up to ``stop``, without
+        copying them - the columns are read-only memoryviews of this object's
+        columns, sharing the stack trie. While the view exists, records can't
+        be added to this object.
+        """
+        return FrameRecords(
+            stack_trie=self.stack_trie,
+            stack_ids=_column_view(self.stack_ids, start, stop),
+            times=_column_view(self.times, start, stop),
+            timestamps=(
+                _column_view(self.timestamps, start, stop) if self.timestamps is not None else None
+            ),
+            counts=_column_view(self.counts, start, stop) if self.counts is not None else None,
+        )
+
+    def select(self, indexes: Sequence[int]) -> FrameRecords:
+        """
+        Returns a copy with only the records at ``indexes``, in that order,
+        sharing the stack trie.
+        """
+        return self._reordered(indexes)
+
+    def _reordered(self, order: Sequence[int]) -> FrameRecords:
+        stack_ids = self.stack_ids
+        times = self.times
+        timestamps = self.timestamps
+        counts = self.counts
+
+        return FrameRecords(
+            stack_trie=self.stack_trie,
+            stack_ids=array("I", [stack_ids[i] for i in order]),
+            times=array("d", [times[i] for i in order]),
+            timestamps=(
+                array("d", [timestamps[i] for i in order]) if timestamps is not None else None
+            ),
+            counts=array("I", [counts[i] for i in order]) if counts is not None else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.stack_ids)
+
+    @overload
+    def __getitem__(self, index: int) -> FrameRecordType: ...
+    @overload
+    def __getitem__(self, index: slice) -> FrameRecords: ...
+    def __getitem__(self, index: Union[int, slice]) -> Union[FrameRecordType, FrameRecords]:
+        if isinstance(index, slice):
+            return FrameRecords(
+                stack_trie=self.stack_trie,
+                stack_ids=self.stack_ids[index],
+                times=self.times[index],
+                timestamps=self.timestamps[index] if self.timestamps is not None else None,
+                counts=self.counts[index] if self.counts is not None else None,
+            )
+
+        return (self.stack_trie.stack_for_node(self.stack_ids[index]), self.times[index])
+
+    def __iter__(self) -> Iterator[FrameRecordType]:
+        stack_for_node = self.stack_trie.stack_for_node
+        for stack_id, time in zip(self.stack_ids, self.times):
+            yield stack_for_node(stack_id), time
+
+    def __repr__(self) -> str:
+        return "FrameRecords(len=%d, len(stack_trie)=%d)" % (len(self), len(self.stack_trie))
+
+
+def _column_view(column: array[Any], start: int, stop: int) -> array[Any]:
+    # a memoryview supports reading like an array does, so it's used in place
+    # of one
+    return cast("array[Any]", memoryview(column).toreadonly()[start:stop])
+
+
+class MergedFrameRecords(FrameRecords):
+    """
+    The records of several FrameRecords objects merged together - in time
+    order if they all have timestamps, otherwise one after the other.
+
+    The merge is done when the columns are first accessed. Until then, this
+    just keeps a reference to each part, so merging in more records one at a
+    time, e.g. when a profiler is restarted many times, doesn't copy the
+    records each time.
+    """
+
+    _parts: list[FrameRecords] | None
+
+    def __init__(self, parts: Iterable[FrameRecords]) -> None:
+        # the columns are set by _merge, see __getattr__
+        self._parts = list(parts)
+        self._length = sum(len(part) for part in self._parts)
+
+    def __getattr__(self, name: str):
+        # only called for attributes that aren't set yet
+        if (
+            name in ("stack_trie", "stack_ids", "times", "timestamps", "counts")
+            and self._parts is not None
+        ):
+            self._merge()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _merge(self):
+        assert self._parts is not None
+
+        # unmerged parts that are themselves merges are expanded, so parts
+        # aren't copied more than once
+        leaves: list[FrameRecords] = []
+        pending = self._parts[::-1]
+        while pending:
+            part = pending.pop()
+            if isinstance(part, MergedFrameRecords) and part._parts is not None:
+                pending.extend(part._parts[::-1])
+            else:
+                leaves.append(part)
+
+        merged = FrameRecords.concatenate(leaves)
+        if merged.timestamps is not None:
+            merged = merged.sorted_by_timestamp()
+
+        self.stack_trie = merged.stack_trie
+        self.stack_ids = merged.stack_ids
+        self.times = merged.times
+        self.timestamps = merged.timestamps
+        self.counts = merged.counts
+        self._parts = None
+
+    def __len__(self) -> int:
+        if self._parts is not None:
+            return self._length
+        return len(self.times)
+
+    def __repr__(self) -> str:
+        if self._parts is not None:
+            return "MergedFrameRecords(len=%d, parts=%d)" % (len(self), len(self._parts))
+        return super().__repr__()
+
+
+class FrameRecordsRingBuffer:
+    """
+    Keeps only the most recent records - those within the last
+    ``max_duration`` seconds of samples, and/or the last ``max_samples``
+    records - so a profiler can run indefinitely in a long-lived process.
+
+    Old records are dropped in batches, and the stack trie is rebuilt when
+    most of its nodes are no longer used, so memory use is proportional to
+    the size of the window, not the length of the profile.
+    """
+
+    # don't bother dropping old records until at least this many have built up
+    MIN_DROPPED_RECORDS = 1000
+
+    def __init__(
+        self,
+        max_duration: float | None = None,
+        max_samples: int | None = None,
+        record_timestamps: bool = False,
+    ) -> None:
+        if max_duration is None and max_samples is None:
+            raise ValueError("At least one of max_duration or max_samples must be set.")
+        if max_duration is not None and max_duration <= 0:
+            raise ValueError("max_duration must be positive.")
+        if max_samples is not None and max_samples <= 0:
+            raise ValueError("max_samples must be positive.")
+
+        self.max_duration = max_duration
+        self.max_samples = max_samples
+        self._records = FrameRecords(timestamps=array("d") if record_timestamps else None)
+        # the index of the oldest record in the window
+        self._start = 0
+        self._window_time = 0.0
+        # re-entrant, because the sampler can fire on the thread that's
+        # taking a snapshot. A record added then is either in the snapshot
+        # or not - the columns are sliced without any Python calls between.
+        self._lock = threading.RLock()
+
+    def record(
+        self, call_stack: Iterable[str], time: float, timestamp: float | None = None
+    ) -> None:
+        """
+        Adds a record, dropping any that fall out of the window.
+        """
+        with self._lock:
+            self._records.record(call_stack, time, timestamp)
+            self._window_time += time
+            self._drop_old_records()
+
+    @property
+    def duration(self) -> float:
+        """
+        The total time of the records in the window.
+        """
+        return self._window_time
+
+    def __len__(self) -> int:
+        return len(self._records) - self._start
+
+    def snapshot(self) -> FrameRecords:
+        """
+        Returns a copy of the records currently in the window. It's safe to
+        call this while records are being added on another thread.
+        """
+        with self._lock:
+            return self._records[self._start :]
+
+    def _drop_old_records(self):
+        times = self._records.times
+        start = self._start
+        end = len(times)
+
+        if self.max_samples is not None and end - start > self.max_samples:
+            new_start = end - self.max_samples
+            self._window_time -= sum(times[start:new_start])
+            start = new_start
+
+        if self.max_duration is not None:
+            # keep the oldest record that's needed to cover max_duration, and
+            # always keep the newest
+            while start < end - 1 and self._window_time - times[start] >= self.max_duration:
+                self._window_time -= times[start]
+                start += 1
+
+        self._start = start
+
+        if start >= self.MIN_DROPPED_RECORDS and start * 2 >= end:
+            self._compact()
+
+    def _compact(self):
+        """
+        Frees the dropped records, and the stack trie nodes that only they
+        used.
+        """
+        records = self._records[self._start :]
+
+        new_stack_trie, mapping = records.stack_trie.compacted(set(records.stack_ids))
+        if len(new_stack_trie) * 2 <= len(records.stack_trie):
+            records.stack_trie = new_stack_trie
+            records.stack_ids = array("I", map(mapping.__getitem__, records.stack_ids))
+
+        self._records = records
+        self._start = 0
+        # avoid accumulating floating point error in the running total
+        self._window_time = sum(records.times)
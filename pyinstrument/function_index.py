@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from array import array
+from typing import Iterable
+
+from pyinstrument.frame_info import IDENTIFIER_SEP, frame_info_get_identifier
+from pyinstrument.frame_records import ROOT_NODE_ID, FrameRecords
+
+# pyright: strict
+
+
+class FunctionIndex:
+    """
+    An index of the functions in a set of frame records, for answering
+    questions like "how much time was spent under this function?" without
+    building and processing a frame tree.
+
+    Functions are referred to by their frame identifier - the function name,
+    file path and line number, separated by null characters, as in
+    :attr:`pyinstrument.frame.Frame.identifier`. :meth:`find` looks them up by
+    name.
+
+    The index is built from the stack trie, so it's roughly proportional to
+    the number of distinct call stacks, not the number of samples. For each
+    function, it stores the outermost trie nodes whose stack contains it;
+    every stack under those nodes contains it too.
+    """
+
+    frame_records: FrameRecords
+
+    def __init__(self, frame_records: FrameRecords) -> None:
+        self.frame_records = frame_records
+        self.length = len(frame_records)
+
+        stack_trie = frame_records.stack_trie
+        parents = stack_trie.parents
+        node_count = len(parents)
+
+        node_identifiers = [frame_info_get_identifier(info) for info in stack_trie.frame_infos]
+
+        node_times = [0.0] * node_count
+        for stack_id, time in zip(frame_records.stack_ids, frame_records.times):
+            node_times[stack_id] += time
+
+        # self time is the time in samples that end at the function
+        self._self_times: dict[str, float] = {}
+        for node_id in range(1, node_count):
+            identifier = node_identifiers[node_id]
+            self._self_times[identifier] = (
+                self._self_times.get(identifier, 0.0) + node_times[node_id]
+            )
+
+        # parents always have lower IDs than their children, so a reverse
+        # pass adds each node's time to its parent after its own is complete
+        subtree_times = node_times
+        for node_id in range(node_count - 1, ROOT_NODE_ID, -1):
+            subtree_times[parents[node_id]] += subtree_times[node_id]
+        self._subtree_times = subtree_times
+
+        children: list[list[int]] = [[] for _ in range(node_count)]
+        for node_id in range(1, node_count):
+            children[parents[node_id]].append(node_id)
+
+        # walk the trie depth-first, numbering the nodes in pre-order, so
+        # each subtree is a contiguous range of positions. Functions that are
+        # already on the path (recursion) aren't indexed again.
+        self._preorder = array("I")
+        self._subtree_ends = [0] * node_count
+        self._positions = [0] * node_count
+        self._top_nodes: dict[str, list[int]] = {}
+        path_counts: dict[str, int] = {}
+
+        pending: list[tuple[int, bool]] = [(ROOT_NODE_ID, False)]
+        while pending:
+            node_id, exiting = pending.pop()
+            identifier = node_identifiers[node_id]
+
+            if exiting:
+                self._subtree_ends[node_id] = len(self._preorder)
+                if node_id != ROOT_NODE_ID:
+                    path_counts[identifier] -= 1
+                continue
+
+            self._positions[node_id] = len(self._preorder)
+            self._preorder.append(node_id)
+
+            if node_id != ROOT_NODE_ID:
+                count = path_counts.get(identifier, 0)
+                if count == 0:
+                    self._top_nodes.setdefault(identifier, []).append(node_id)
+                path_counts[identifier] = count + 1
+
+            pending.append((node_id, True))
+            pending.extend((child_id, False) for child_id in reversed(children[node_id]))
+
+        self._samples_by_node: list[list[int]] | None = None
+
+    @property
+    def identifiers(self) -> list[str]:
+        """
+        The identifiers of all the functions in the records.
+        """
+        return list(self._top_nodes)
+
+    def find(self, function: str, file_path_contains: str | None = None) -> list[str]:
+        """
+        Returns the identifiers of the functions named ``function``,
+        optionally only those whose file path contains ``file_path_contains``.
+        """
+        result: list[str] = []
+        for identifier in self._top_nodes:
+            name, _, rest = identifier.partition(IDENTIFIER_SEP)
+            if name != function:
+                continue
+            if file_path_contains is not None:
+                file_path = rest.partition(IDENTIFIER_SEP)[0]
+                if file_path_contains not in file_path:
+                    continue
+            result.append(identifier)
+        return result
+
+    def inclusive_time(self, identifier: str) -> float:
+        """
+        Returns the time spent in the function, including the functions it
+        called. Recursive calls are only counted once.
+        """
+        subtree_times = self._subtree_times
+        return sum(subtree_times[node_id] for node_id in self._top_nodes.get(identifier, ()))
+
+    def outermost_times(self, identifiers: Iterable[str]) -> dict[str, float]:
+        """
+        Returns the inclusive time of each of ``identifiers``, but only
+        counting the time when none of the others is further up the stack.
+        So, unlike :meth:`inclusive_time`, the times can be added up to get
+        the time spent in any of them - e.g. in every function with a given
+        name - without counting any twice.
+        """
+        positions = self._positions
+        subtree_ends = self._subtree_ends
+        top_nodes = sorted(
+            (positions[node_id], node_id, identifier)
+            for identifier in set(identifiers)
+            for node_id in self._top_nodes.get(identifier, ())
+        )
+
+        result = dict.fromkeys(identifiers, 0.0)
+        # the nodes are in pre-order, so a node is under an earlier one if
+        # it's before the end of the earlier one's subtree
+        covered_until = 0
+        for position, node_id, identifier in top_nodes:
+            if position < covered_until:
+                continue
+            result[identifier] += self._subtree_times[node_id]
+            covered_until = subtree_ends[node_id]
+        return result
+
+    def self_time(self, identifier: str) -> float:
+        """
+        Returns the time spent in the function itself, not in the functions it
+        called.
+        """
+        return self._self_times.get(identifier, 0.0)
+
+    def sample_indexes(self, identifier: str) -> list[int]:
+        """
+        Returns the indexes of the records whose call stack contains the
+        function, in order.
+        """
+        samples_by_node = self._get_samples_by_node()
+        preorder = self._preorder
+        result: list[int] = []
+
+        for top_node_id in self._top_nodes.get(identifier, ()):
+            start = self._positions[top_node_id]
+            end = self._subtree_ends[top_node_id]
+            for position in range(start, end):
+                result.extend(samples_by_node[preorder[position]])
+
+        result.sort()
+        return result
+
+    def filtered_records(self, identifier: str) -> FrameRecords:
+        """
+        Returns the records whose call stack contains the function.
+        """
+        return self.frame_records.select(self.sample_indexes(identifier))
+
+    def is_valid_for(self, frame_records: FrameRecords) -> bool:
+        """
+        Returns True if this index still describes ``frame_records``.
+        """
+        return frame_records is self.frame_records and len(frame_records) == self.length
+
+    def _get_samples_by_node(self) -> list[list[int]]:
+        # this is only needed for sample_indexes, and takes memory
+        # proportional to the number of samples, so it's built on first use
+        if self._samples_by_node is None:
+            samples_by_node: list[list[int]] = [[] for _ in self._positions]
+            for index, stack_id in enumerate(self.frame_records.stack_ids):
+                samples_by_node[stack_id].append(index)
+            self._samples_by_node = samples_by_node
+        return self._samples_by_node
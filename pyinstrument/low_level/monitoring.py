@@ -0,0 +1,202 @@
+"""
+A sampling backend built on sys.monitoring (PEP 669), for Python 3.12+.
+
+It calls the target with the same (frame, event, arg) arguments as
+setstatprofile, but works differently. Once a sample has been taken, event
+callbacks return DISABLE, which turns that event off for the code location
+that raised it, so hot code stops paying for instrumentation almost
+immediately. A background thread calls sys.monitoring.restart_events() once
+per interval to turn them back on.
+
+The background thread needs the GIL to restart events, so in CPU-bound code
+that happens at the points where the interpreter switches threads, and the
+first event after that is always at the same place in a loop. To avoid
+biasing the samples, each restart picks a short random delay, and events
+stay enabled until the first event after that delay is sampled.
+
+Because sys.monitoring is process-wide, events raised on other threads are
+disabled too, without sampling.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import threading
+import timeit
+import types
+from typing import Any, Callable, Optional, Protocol
+
+# pyright: strict
+
+
+TOOL_NAME = "pyinstrument"
+# the maximum random delay before a sample, after events are restarted
+MAX_SAMPLE_DELAY = 0.0001
+
+_getframe = sys._getframe  # pyright: ignore[reportPrivateUsage]
+
+
+class _MonitoringEvents(Protocol):
+    @property
+    def PY_START(self) -> int: ...
+    @property
+    def PY_RETURN(self) -> int: ...
+    @property
+    def CALL(self) -> int: ...
+    @property
+    def C_RETURN(self) -> int: ...
+    @property
+    def C_RAISE(self) -> int: ...
+
+
+class _SysMonitoring(Protocol):
+    """
+    The parts of sys.monitoring that are used here. It's not in the
+    typeshed stubs for the Python versions that pyright checks against.
+    """
+
+    @property
+    def PROFILER_ID(self) -> int: ...
+    @property
+    def DISABLE(self) -> object: ...
+    @property
+    def events(self) -> _MonitoringEvents: ...
+    def get_tool(self, tool_id: int, /) -> Optional[str]: ...
+    def use_tool_id(self, tool_id: int, name: str, /) -> None: ...
+    def free_tool_id(self, tool_id: int, /) -> None: ...
+    def register_callback(
+        self, tool_id: int, event: int, func: Optional[Callable[..., Any]], /
+    ) -> Optional[Callable[..., Any]]: ...
+    def set_events(self, tool_id: int, event_set: int, /) -> None: ...
+    def restart_events(self) -> None: ...
+
+
+def _sys_monitoring() -> _SysMonitoring:
+    if sys.version_info >= (3, 12):
+        return sys.monitoring
+    raise RuntimeError("sys.monitoring requires Python 3.12 or later.")
+
+
+def monitoring_available() -> bool:
+    """
+    Returns True if sys.monitoring is available, and the profiler tool ID
+    isn't being used by another tool.
+    """
+    if sys.version_info < (3, 12):
+        return False
+    monitoring = _sys_monitoring()
+    return monitoring.get_tool(monitoring.PROFILER_ID) is None
+
+
+class MonitoringProfiler:
+    def __init__(
+        self,
+        target: Callable[[types.FrameType, str, Any], Any],
+        interval: float = 0.001,
+        timer_func: Callable[[], float] | None = None,
+    ) -> None:
+        self.target = target
+        self.interval = interval
+        self.get_time = timer_func or timeit.default_timer
+        self.last_invocation = 0.0
+        self.sample_after = 0.0
+        self.thread_ident = threading.get_ident()
+        self._stop_event = threading.Event()
+        self._restart_thread: threading.Thread | None = None
+        self._disable: object = None
+
+    def start(self):
+        monitoring = _sys_monitoring()
+        events = monitoring.events
+        tool_id = monitoring.PROFILER_ID
+
+        monitoring.use_tool_id(tool_id, TOOL_NAME)
+        monitoring.register_callback(tool_id, events.PY_START, self._py_start)
+        monitoring.register_callback(tool_id, events.PY_RETURN, self._py_return)
+        monitoring.register_callback(tool_id, events.CALL, self._call)
+        monitoring.register_callback(tool_id, events.C_RETURN, self._c_return)
+        monitoring.register_callback(tool_id, events.C_RAISE, self._c_return)
+
+        self._disable = monitoring.DISABLE
+        self.thread_ident = threading.get_ident()
+        self.last_invocation = self.get_time()
+        self.sample_after = self.last_invocation + self.interval
+        self._stop_event.clear()
+        self._restart_thread = threading.Thread(
+            target=self._restart_events_periodically,
+            name="pyinstrument-monitoring",
+            daemon=True,
+        )
+        self._restart_thread.start()
+
+        monitoring.set_events(tool_id, events.PY_START | events.PY_RETURN | events.CALL)
+
+    def stop(self):
+        monitoring = _sys_monitoring()
+        tool_id = monitoring.PROFILER_ID
+
+        monitoring.set_events(tool_id, 0)
+        for event in (
+            monitoring.events.PY_START,
+            monitoring.events.PY_RETURN,
+            monitoring.events.CALL,
+            monitoring.events.C_RETURN,
+            monitoring.events.C_RAISE,
+        ):
+            monitoring.register_callback(tool_id, event, None)
+        monitoring.free_tool_id(tool_id)
+
+        self._stop_event.set()
+        if self._restart_thread is not None:
+            self._restart_thread.join()
+            self._restart_thread = None
+
+    def _restart_events_periodically(self):
+        restart_events = _sys_monitoring().restart_events
+        while not self._stop_event.wait(self.interval):
+            now = self.get_time()
+            if now >= self.last_invocation + self.interval:
+                self.sample_after = now + random.uniform(0, MAX_SAMPLE_DELAY)
+            restart_events()
+
+    def _sample(self, frame: types.FrameType, event: str, arg: Any) -> Any:
+        """
+        Takes a sample if one is due. Returns DISABLE if the event that
+        called this should be turned off.
+        """
+        if threading.get_ident() != self.thread_ident:
+            return self._disable
+
+        now = self.get_time()
+        if now < self.last_invocation + self.interval:
+            return self._disable
+        if now < self.sample_after:
+            # a sample is due soon, keep this event enabled
+            return None
+
+        self.last_invocation = now
+        self.target(frame, event, arg)
+        return self._disable
+
+    def _py_start(self, code: types.CodeType, instruction_offset: int):
+        return self._sample(_getframe(1), "call", None)
+
+    def _py_return(self, code: types.CodeType, instruction_offset: int, retval: object):
+        return self._sample(_getframe(1), "return", None)
+
+    def _call(self, code: types.CodeType, instruction_offset: int, callable: object, arg0: object):
+        return self._sample(_getframe(1), "c_call", None)
+
+    def _c_return(
+        self, code: types.CodeType, instruction_offset: int, callable: object, arg0: object
+    ):
+        # C_RETURN still fires for a call in progress when its CALL event
+        # was disabled, so long-running C functions like time.sleep are
+        # attributed correctly. These events can't be disabled.
+        if isinstance(callable, types.BuiltinFunctionType):
+            self._sample(_getframe(1), "c_return", callable)
+        else:
+            # only builtin functions get their own frame, as with
+            # setstatprofile
+            self._sample(_getframe(1), "c_call", None)
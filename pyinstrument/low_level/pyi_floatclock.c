@@ -19,11 +19,35 @@ double pyi_monotonic_coarse_resolution(void)
 
 /* use QueryPerformanceCounter on Windows */
 
+static double
+thread_cputime(void)
+{
+    FILETIME creation_time, exit_time, kernel_time, user_time;
+    ULARGE_INTEGER kernel, user;
+
+    if (!GetThreadTimes(GetCurrentThread(), &creation_time, &exit_time, &kernel_time, &user_time)) {
+        return -1.0;
+    }
+
+    kernel.LowPart = kernel_time.dwLowDateTime;
+    kernel.HighPart = kernel_time.dwHighDateTime;
+    user.LowPart = user_time.dwLowDateTime;
+    user.HighPart = user_time.dwHighDateTime;
+
+    // FILETIME durations are in units of 100 nanoseconds
+    return (double)(kernel.QuadPart + user.QuadPart) * 1e-7;
+}
+
 double pyi_floatclock(PYIFloatClockType timer)
 {
     if (timer == PYI_FLOATCLOCK_MONOTONIC_COARSE) {
         warn_once("CLOCK_MONOTONIC_COARSE not available on this system.");
     }
+    if (timer == PYI_FLOATCLOCK_THREAD_CPUTIME) {
+        double result = thread_cputime();
+        if (result >= 0) return result;
+        warn_once("GetThreadTimes failed, falling back to wall-clock time.");
+    }
     static LARGE_INTEGER ctrStart;
     static double divisor = 0.0;
     LARGE_INTEGER now;
@@ -87,6 +111,13 @@ double pyi_floatclock(PYIFloatClockType timer)
         warn_once("CLOCK_MONOTONIC_COARSE not available on this system.");
 # endif
     }
+    if (timer == PYI_FLOATCLOCK_THREAD_CPUTIME) {
+# ifdef CLOCK_THREAD_CPUTIME_ID
+        res = clock_gettime(CLOCK_THREAD_CPUTIME_ID, &t);
+        if (res == 0) return t.tv_sec + t.tv_nsec * SEC_PER_NSEC;
+# endif
+        warn_once("CLOCK_THREAD_CPUTIME_ID not available on this system, falling back to wall-clock time.");
+    }
 # ifdef CLOCK_MONOTONIC
     res = clock_gettime(CLOCK_MONOTONIC, &t);
     if (res == 0) return t.tv_sec + t.tv_nsec * SEC_PER_NSEC;
@@ -7,6 +7,7 @@
 typedef enum {
     PYI_FLOATCLOCK_DEFAULT = 0,
     PYI_FLOATCLOCK_MONOTONIC_COARSE = 1,
+    PYI_FLOATCLOCK_THREAD_CPUTIME = 2,
 } PYIFloatClockType;
 
 Py_EXPORTED_SYMBOL double pyi_monotonic_coarse_resolution(void);
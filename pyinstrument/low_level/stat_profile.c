@@ -1,3 +1,4 @@
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
 #include <structmember.h>
 #include <frameobject.h>
@@ -43,6 +44,7 @@ typedef struct profiler_state {
     PyObject *timer_func;
     int timer_thread_subscription_id;
     PYIFloatClockType floatclock_type;
+    PyObject *sample_buffer;  // a SampleBuffer, or NULL to call the target with samples
 } ProfilerState;
 
 static void ProfilerState_SetTarget(ProfilerState *self, PyObject *target) {
@@ -112,12 +114,26 @@ static double ProfilerState_GetTime(ProfilerState *self) {
     }
 }
 
+/**
+ * Returns the time used to measure samples recorded into a sample buffer,
+ * given `now` from ProfilerState_GetTime. Wall-clock samples are measured
+ * with the same clock as the Python StackSampler, which is more precise
+ * than the clocks that can be used for the interval check.
+ */
+static double ProfilerState_GetSampleTime(ProfilerState *self, double now) {
+    if (self->timer_func != NULL || self->floatclock_type == PYI_FLOATCLOCK_THREAD_CPUTIME) {
+        return now;
+    }
+    return pyi_floatclock(PYI_FLOATCLOCK_DEFAULT);
+}
+
 static void ProfilerState_Dealloc(ProfilerState *self) {
     ProfilerState_SetTarget(self, NULL);
     Py_XDECREF(self->context_var);
     Py_XDECREF(self->last_context_var_value);
     Py_XDECREF(self->await_stack_list);
     Py_XDECREF(self->timer_func);
+    Py_XDECREF(self->sample_buffer);
     if (self->timer_thread_subscription_id >= 0) {
         pyi_timing_thread_unsubscribe(self->timer_thread_subscription_id);
     }
@@ -177,6 +193,7 @@ static ProfilerState *ProfilerState_New(void) {
     op->timer_func = NULL;
     op->timer_thread_subscription_id = -1;
     op->floatclock_type = PYI_FLOATCLOCK_DEFAULT;
+    op->sample_buffer = NULL;
     return op;
 }
 
@@ -194,6 +211,7 @@ static PyObject *TRACEBACKHIDE_STRING = NULL;
 #define TIMER_TYPE_WALLTIME_THREAD 1
 #define TIMER_TYPE_TIMER_FUNC 2
 #define TIMER_TYPE_WALLTIME_COARSE 3
+#define TIMER_TYPE_CPUTIME_THREAD 4
 
 #define WHAT_CALL 0
 #define WHAT_EXCEPTION 1
@@ -286,41 +304,70 @@ local_names_from_code(PyCodeObject *code)
 #endif
 }
 
-#if PY_VERSION_HEX >= 0x030b0000 // Python 3.11.0
+#define FIRST_ARG_OTHER 0
+#define FIRST_ARG_SELF 1
+#define FIRST_ARG_CLS 2
+
 /**
- * Returns a C-string containing the name of the class in the frame. The
- * memory belongs to the type object, so it should not be freed.
+ * Returns FIRST_ARG_SELF or FIRST_ARG_CLS if the first local variable of the
+ * code object is named 'self' or 'cls', otherwise FIRST_ARG_OTHER.
  */
-static const char *
-_get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
-    PyObject *localsNames = PyCode_GetVarnames(code);
-
-    if (localsNames == NULL) {
-        return NULL;
+static int
+_get_first_arg_kind(PyCodeObject *code) {
+#if PY_VERSION_HEX < 0x030b0000
+    // function args are always the first locals, and self/cls is always the
+    // first arg, so there's nothing to find if there are no args.
+    if (code->co_argcount < 1 || code->co_nlocals < 1) {
+        return FIRST_ARG_OTHER;
     }
+#endif
 
-    PyObject *firstArgName = PyTuple_GET_ITEM(localsNames, 0);
+    PyObject *locals_names = local_names_from_code(code);
 
-    if (firstArgName == NULL) {
-        Py_DECREF(localsNames);
-        return NULL;
+    if (locals_names == NULL) {
+        PyErr_Clear();
+        return FIRST_ARG_OTHER;
     }
 
-    int has_self = PyUnicode_Compare(firstArgName, SELF_STRING) == 0;
-    int has_cls = PyUnicode_Compare(firstArgName, CLS_STRING) == 0;
+    int result = FIRST_ARG_OTHER;
 
-    Py_DECREF(localsNames);
+    // co_varnames must be a tuple
+    if (PyTuple_Check(locals_names) && PyTuple_GET_SIZE(locals_names) >= 1) {
+        PyObject *first_var_name = PyTuple_GET_ITEM(locals_names, 0);
 
-    if (!has_self && !has_cls) {
+        if (PyUnicode_Compare(first_var_name, SELF_STRING) == 0) {
+            result = FIRST_ARG_SELF;
+        } else if (PyUnicode_Compare(first_var_name, CLS_STRING) == 0) {
+            result = FIRST_ARG_CLS;
+        }
+    }
+
+    Py_DECREF(locals_names);
+    return result;
+}
+
+#if PY_VERSION_HEX >= 0x030b0000 // Python 3.11.0
+/**
+ * Returns a borrowed reference to the class of the method running in the
+ * frame, or NULL if it's not a method.
+ */
+static PyTypeObject *
+_get_class_of_frame(PyFrameObject *frame, PyCodeObject *code, int first_arg_kind) {
+    if (first_arg_kind == FIRST_ARG_OTHER) {
         // PyFrame_GetLocals is expensive and changes the frame, so we don't
         // want to call it unless we have to.
         return NULL;
     }
 
-    const char *result = NULL;
+    PyTypeObject *result = NULL;
 
     PyObject *locals = PyFrame_GetLocals(frame);
 
+    if (locals == NULL) {
+        PyErr_Clear();
+        return NULL;
+    }
+
     if (!PyMapping_Check(locals)) {
         Py_DECREF(locals);
         return NULL;
@@ -328,7 +375,7 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
 
     // we still have to check the locals has the key, because it could have
     // been "del'd"
-    if (has_self && PyMapping_HasKey(locals, SELF_STRING)) {
+    if (first_arg_kind == FIRST_ARG_SELF && PyMapping_HasKey(locals, SELF_STRING)) {
         PyObject *self = PyObject_GetItem(locals, SELF_STRING);
 
         if (!self) {
@@ -337,10 +384,10 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
             return NULL;
         }
 
-        result = _PyType_Name(self->ob_type);
+        result = Py_TYPE(self);
         Py_DECREF(self);
     }
-    else if (has_cls && PyMapping_HasKey(locals, CLS_STRING)) {
+    else if (first_arg_kind == FIRST_ARG_CLS && PyMapping_HasKey(locals, CLS_STRING)) {
         PyObject *cls = PyObject_GetItem(locals, CLS_STRING);
 
         if (!cls) {
@@ -350,8 +397,7 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
         }
 
         if (PyType_Check(cls)) {
-            PyTypeObject *type = (PyTypeObject *)cls;
-            result = _PyType_Name(type);
+            result = (PyTypeObject *)cls;
         }
         Py_DECREF(cls);
     }
@@ -393,8 +439,12 @@ _get_first_arg_from_cell_variables(PyFrameObject *frame, PyCodeObject *code) {
     return NULL;
 }
 
-static const char *
-_get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
+/**
+ * Returns a borrowed reference to the class of the method running in the
+ * frame, or NULL if it's not a method.
+ */
+static PyTypeObject *
+_get_class_of_frame(PyFrameObject *frame, PyCodeObject *code, int first_arg_kind) {
     // This code looks only at the first 'fast' frame local.
     //
     // A generalisable way to get a local variable would be to look at every
@@ -405,24 +455,7 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
     // be the first arg, and f_localsplus is always set, even if f_locals
     // exists. So we only look at the first f_localsplus entry.
 
-    if (code->co_argcount < 1) {
-        return NULL;
-    }
-
-    if (!PyTuple_Check(code->co_varnames)) {
-        // co_varnames must be a tuple
-        return NULL;
-    }
-
-    if (code->co_nlocals < 1 || PyTuple_Size(code->co_varnames) < 1) {
-        return NULL;
-    }
-
-    PyObject *first_var_name = PyTuple_GetItem(code->co_varnames, 0);
-    int first_var_is_self = (PyUnicode_Compare(first_var_name, SELF_STRING) == 0);
-    int first_var_is_cls = (PyUnicode_Compare(first_var_name, CLS_STRING) == 0);
-
-    if (!(first_var_is_self || first_var_is_cls)) {
+    if (first_arg_kind == FIRST_ARG_OTHER) {
         return NULL;
     }
 
@@ -440,15 +473,13 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
         return NULL;
     }
 
-    if (first_var_is_self) {
-        PyTypeObject *type = first_var->ob_type;
-        return _PyType_Name(type);
-    } else if (first_var_is_cls) {
+    if (first_arg_kind == FIRST_ARG_SELF) {
+        return first_var->ob_type;
+    } else if (first_arg_kind == FIRST_ARG_CLS) {
         if (!PyType_Check(first_var)) {
             return NULL;
         }
-        PyTypeObject *type = (PyTypeObject *)first_var;
-        return _PyType_Name(type);
+        return (PyTypeObject *)first_var;
     } else {
         Py_FatalError("unreachable code");
     }
@@ -463,8 +494,8 @@ _get_class_name_of_frame(PyFrameObject *frame, PyCodeObject *code) {
  * returns `1` if any variable named `"__trackbackhide__"` is defined in frame
  * locals, returns `0` otherwise
  */
-static const int
-_get_tracebackhide(PyFrameObject *frame, PyCodeObject *code) {
+static int
+_get_tracebackhide(PyCodeObject *code) {
     PyObject *locals_names = local_names_from_code(code);
 
     if (locals_names == NULL) {
@@ -490,29 +521,25 @@ _get_tracebackhide(PyFrameObject *frame, PyCodeObject *code) {
 }
 
 /**
- * Returns a new reference to pyinstrument's frame info string for the given frame.
+ * Returns a new reference to a frame info string built from its parts.
  */
 static PyObject *
-_get_frame_info(PyFrameObject *frame) {
-    PyCodeObject *code = code_from_frame(frame);
-
+_build_frame_info(PyCodeObject *code, PyTypeObject *class, int line_number, int tracebackhide) {
     PyObject *class_name_attribute;
 
-    const char *class_name = _get_class_name_of_frame(frame, code);
-    if (class_name == NULL) {
+    if (class == NULL) {
         class_name_attribute = PyUnicode_New(0, 127); // empty string
     } else {
         class_name_attribute = PyUnicode_FromFormat(
             "%c%c%s",
             1, // 0x01 char denotes 'attribute'
             'c', // 'c' char denotes 'class name'
-            class_name
+            _PyType_Name(class)
         );
     }
 
     PyObject *line_number_attribute;
 
-    int line_number = PyFrame_GetLineNumber(frame);
     if (line_number < 1) {
         line_number_attribute = PyUnicode_New(0, 127);
     } else {
@@ -526,7 +553,6 @@ _get_frame_info(PyFrameObject *frame) {
 
     PyObject *frame_hidden_attribute;
 
-    int tracebackhide = _get_tracebackhide(frame, code);
     if (tracebackhide <= 0) {
         frame_hidden_attribute = PyUnicode_New(0, 127);
     } else {
@@ -550,7 +576,6 @@ _get_frame_info(PyFrameObject *frame) {
         frame_hidden_attribute
     );
 
-    Py_DECREF(code);
     Py_DECREF(class_name_attribute);
     Py_DECREF(line_number_attribute);
     Py_DECREF(frame_hidden_attribute);
@@ -558,6 +583,338 @@ _get_frame_info(PyFrameObject *frame) {
     return result;
 }
 
+//////////////////////
+// Frame info cache //
+//////////////////////
+
+/*
+ * Building frame info strings is most of the cost of taking a sample, so
+ * they're cached. Facts that only depend on the code object (whether the
+ * first arg is self/cls, whether __tracebackhide__ is defined) are kept in
+ * the code cache. Finished frame info strings are kept in the frame info
+ * cache, keyed by code object, class and line number.
+ *
+ * The caches don't keep code objects or classes alive. Each cached code
+ * object has a weakref, whose callback evicts its entries when the code
+ * object is deallocated - the entries for a code object are chained from its
+ * code cache entry, so this doesn't scan the whole cache. Classes are held
+ * by weakrefs without callbacks, and entries whose class has gone are never
+ * matched again. Both caches are fixed-size hash tables, which are cleared
+ * when they fill up.
+ */
+
+#define CODE_CACHE_SIZE 4096         // must be a power of two
+#define FRAME_INFO_CACHE_SIZE 16384  // must be a power of two
+#define CACHE_MAX_USED(size) ((size) / 4 * 3)
+
+// marks an evicted entry. Probing continues past these.
+#define CACHE_TOMBSTONE ((PyCodeObject *)1)
+
+typedef struct {
+    PyCodeObject *code;  // borrowed reference
+    PyObject *weakref;   // strong reference to a weakref to code
+    int first_arg_kind;
+    int tracebackhide;
+    Py_ssize_t first_frame_info;  // index of this code's latest frame info entry, or -1
+} CodeCacheEntry;
+
+typedef struct {
+    PyCodeObject *code;    // borrowed reference. Always has a code cache entry.
+    PyTypeObject *class;   // borrowed reference, or NULL. Only valid while class_ref is alive.
+    PyObject *class_ref;   // strong reference to a weakref to class, or NULL
+    int line_number;
+    PyObject *frame_info;  // strong reference to an interned string
+    Py_ssize_t next_for_code;  // index of the previous entry for the same code, or -1
+} FrameInfoCacheEntry;
+
+static CodeCacheEntry code_cache[CODE_CACHE_SIZE];
+static Py_ssize_t code_cache_used = 0;  // includes tombstones
+static FrameInfoCacheEntry frame_info_cache[FRAME_INFO_CACHE_SIZE];
+static Py_ssize_t frame_info_cache_used = 0;  // includes tombstones
+
+static inline size_t
+_cache_hash(void *a, void *b, int c) {
+    size_t hash = (size_t)a >> 4;
+    hash = (hash * 1000003) ^ ((size_t)b >> 4);
+    hash = (hash * 1000003) ^ (size_t)c;
+    return hash ^ (hash >> 16);
+}
+
+/**
+ * Returns true if `weakref` still refers to `object`.
+ */
+static inline int
+_weakref_refers_to(PyObject *weakref, PyObject *object) {
+#if PY_VERSION_HEX >= 0x030d0000 // Python 3.13.0
+    PyObject *referent = NULL;
+    if (PyWeakref_GetRef(weakref, &referent) < 0) {
+        PyErr_Clear();
+        return 0;
+    }
+    Py_XDECREF(referent);
+    return referent == object;
+#else
+    return PyWeakref_GET_OBJECT(weakref) == object;
+#endif
+}
+
+/**
+ * Evicts a frame info entry. Returns the index of the next entry for the
+ * same code object.
+ */
+static Py_ssize_t
+_frame_info_cache_evict(FrameInfoCacheEntry *entry, PyCodeObject *replacement) {
+    PyObject *class_ref = entry->class_ref;
+    PyObject *frame_info = entry->frame_info;
+    Py_ssize_t next = entry->next_for_code;
+
+    // clear the entry before releasing references, because deallocating
+    // objects can evict other entries.
+    entry->code = replacement;
+    entry->class = NULL;
+    entry->class_ref = NULL;
+    entry->line_number = 0;
+    entry->frame_info = NULL;
+    entry->next_for_code = -1;
+
+    Py_XDECREF(class_ref);
+    Py_XDECREF(frame_info);
+
+    return next;
+}
+
+static void
+_frame_info_cache_clear(void) {
+    for (Py_ssize_t i = 0; i < CODE_CACHE_SIZE; i++) {
+        code_cache[i].first_frame_info = -1;
+    }
+    for (Py_ssize_t i = 0; i < FRAME_INFO_CACHE_SIZE; i++) {
+        _frame_info_cache_evict(&frame_info_cache[i], NULL);
+    }
+    frame_info_cache_used = 0;
+}
+
+static void
+_code_cache_clear(void) {
+    // frame info entries are only valid while their code object is in the
+    // code cache
+    _frame_info_cache_clear();
+
+    for (Py_ssize_t i = 0; i < CODE_CACHE_SIZE; i++) {
+        CodeCacheEntry *entry = &code_cache[i];
+        PyObject *weakref = entry->weakref;
+
+        entry->code = NULL;
+        entry->weakref = NULL;
+        entry->first_frame_info = -1;
+
+        // releasing the weakref unregisters its callback
+        Py_XDECREF(weakref);
+    }
+    code_cache_used = 0;
+}
+
+/**
+ * Weakref callback, called when a cached code object is deallocated. `self`
+ * is an int containing the address of the code object.
+ */
+static PyObject *
+_code_cache_code_died(PyObject *self, PyObject *weakref) {
+    PyCodeObject *code = (PyCodeObject *)PyLong_AsVoidPtr(self);
+    if (code == NULL) {
+        return NULL;
+    }
+
+    size_t mask = CODE_CACHE_SIZE - 1;
+    for (size_t i = _cache_hash(code, NULL, 0) & mask; code_cache[i].code != NULL; i = (i + 1) & mask) {
+        CodeCacheEntry *entry = &code_cache[i];
+        if (entry->code != code) {
+            continue;
+        }
+
+        Py_ssize_t frame_info_index = entry->first_frame_info;
+
+        // the weakref is released when the cache is next cleared - it's
+        // not safe to release it inside its own callback.
+        entry->code = CACHE_TOMBSTONE;
+        entry->first_frame_info = -1;
+
+        while (frame_info_index != -1) {
+            frame_info_index = _frame_info_cache_evict(
+                &frame_info_cache[frame_info_index], CACHE_TOMBSTONE
+            );
+        }
+        break;
+    }
+
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef code_died_callback_def = {
+    "_code_died", (PyCFunction)_code_cache_code_died, METH_O, NULL
+};
+
+/**
+ * Returns the code cache entry for `code`, adding one if needed. Returns
+ * NULL if the code object can't be cached.
+ */
+static CodeCacheEntry *
+_code_cache_get(PyCodeObject *code) {
+    size_t mask = CODE_CACHE_SIZE - 1;
+    size_t start = _cache_hash(code, NULL, 0) & mask;
+
+    for (size_t i = start; code_cache[i].code != NULL; i = (i + 1) & mask) {
+        if (code_cache[i].code == code) {
+            return &code_cache[i];
+        }
+    }
+
+    // cache miss. Gather the facts about this code object, and a weakref to
+    // know when it's gone.
+    int first_arg_kind = _get_first_arg_kind(code);
+    int tracebackhide = _get_tracebackhide(code);
+
+    PyObject *code_address = PyLong_FromVoidPtr(code);
+    if (code_address == NULL) {
+        PyErr_Clear();
+        return NULL;
+    }
+    PyObject *callback = PyCFunction_New(&code_died_callback_def, code_address);
+    Py_DECREF(code_address);
+    if (callback == NULL) {
+        PyErr_Clear();
+        return NULL;
+    }
+    PyObject *weakref = PyWeakref_NewRef((PyObject *)code, callback);
+    Py_DECREF(callback);
+    if (weakref == NULL) {
+        PyErr_Clear();
+        return NULL;
+    }
+
+    if (code_cache_used >= CACHE_MAX_USED(CODE_CACHE_SIZE)) {
+        _code_cache_clear();
+    }
+
+    size_t i = start;
+    while (code_cache[i].code != NULL) {
+        i = (i + 1) & mask;
+    }
+
+    CodeCacheEntry *entry = &code_cache[i];
+    entry->code = code;
+    entry->weakref = weakref;
+    entry->first_arg_kind = first_arg_kind;
+    entry->tracebackhide = tracebackhide;
+    entry->first_frame_info = -1;
+    code_cache_used++;
+
+    return entry;
+}
+
+/**
+ * Returns a borrowed reference to the cached frame info string, or NULL.
+ */
+static PyObject *
+_frame_info_cache_get(PyCodeObject *code, PyTypeObject *class, int line_number) {
+    size_t mask = FRAME_INFO_CACHE_SIZE - 1;
+    size_t i = _cache_hash(code, class, line_number) & mask;
+
+    for (; frame_info_cache[i].code != NULL; i = (i + 1) & mask) {
+        FrameInfoCacheEntry *entry = &frame_info_cache[i];
+        if (entry->code == code && entry->class == class && entry->line_number == line_number) {
+            // a class at this address might have been deallocated, and
+            // another allocated in its place
+            if (class != NULL && !_weakref_refers_to(entry->class_ref, (PyObject *)class)) {
+                continue;
+            }
+            return entry->frame_info;
+        }
+    }
+
+    return NULL;
+}
+
+static void
+_frame_info_cache_add(CodeCacheEntry *code_entry, PyTypeObject *class, int line_number, PyObject *frame_info) {
+    PyObject *class_ref = NULL;
+    if (class != NULL) {
+        class_ref = PyWeakref_NewRef((PyObject *)class, NULL);
+        if (class_ref == NULL) {
+            // this class can't be weakly referenced, so don't cache it
+            PyErr_Clear();
+            return;
+        }
+    }
+
+    if (frame_info_cache_used >= CACHE_MAX_USED(FRAME_INFO_CACHE_SIZE)) {
+        _frame_info_cache_clear();
+    }
+
+    PyCodeObject *code = code_entry->code;
+    size_t mask = FRAME_INFO_CACHE_SIZE - 1;
+    size_t i = _cache_hash(code, class, line_number) & mask;
+
+    while (frame_info_cache[i].code != NULL) {
+        i = (i + 1) & mask;
+    }
+
+    FrameInfoCacheEntry *entry = &frame_info_cache[i];
+    Py_INCREF(frame_info);
+    entry->code = code;
+    entry->class = class;
+    entry->class_ref = class_ref;
+    entry->line_number = line_number;
+    entry->frame_info = frame_info;
+    entry->next_for_code = code_entry->first_frame_info;
+    code_entry->first_frame_info = (Py_ssize_t)i;
+    frame_info_cache_used++;
+}
+
+/**
+ * Returns a new reference to pyinstrument's frame info string for the given frame.
+ */
+static PyObject *
+_get_frame_info(PyFrameObject *frame) {
+    PyCodeObject *code = code_from_frame(frame);
+    int line_number = PyFrame_GetLineNumber(frame);
+
+    CodeCacheEntry *code_entry = _code_cache_get(code);
+
+    if (code_entry == NULL) {
+        // this code object can't be cached, build the frame info directly
+        PyObject *result = _build_frame_info(
+            code,
+            _get_class_of_frame(frame, code, _get_first_arg_kind(code)),
+            line_number,
+            _get_tracebackhide(code)
+        );
+        Py_DECREF(code);
+        return result;
+    }
+
+    int tracebackhide = code_entry->tracebackhide;
+    PyTypeObject *class = _get_class_of_frame(frame, code, code_entry->first_arg_kind);
+
+    PyObject *result = _frame_info_cache_get(code, class, line_number);
+
+    if (result != NULL) {
+        Py_INCREF(result);
+        Py_DECREF(code);
+        return result;
+    }
+
+    result = _build_frame_info(code, class, line_number, tracebackhide);
+
+    if (result != NULL) {
+        PyUnicode_InternInPlace(&result);
+        _frame_info_cache_add(code_entry, class, line_number, result);
+    }
+
+    Py_DECREF(code);
+    return result;
+}
+
 static int
 _parse_timer_type(PyObject *timer_type, int defaultValue) {
     if (timer_type == NULL || timer_type == Py_None) {
@@ -577,12 +934,509 @@ _parse_timer_type(PyObject *timer_type, int defaultValue) {
         return TIMER_TYPE_TIMER_FUNC;
     } else if (PyUnicode_CompareWithASCIIString(timer_type, "walltime_coarse") == 0) {
         return TIMER_TYPE_WALLTIME_COARSE;
+    } else if (PyUnicode_CompareWithASCIIString(timer_type, "cputime_thread") == 0) {
+        return TIMER_TYPE_CPUTIME_THREAD;
+    } else {
+        PyErr_SetString(PyExc_TypeError, "timer_type must be 'walltime', 'walltime_thread', 'walltime_coarse', 'cputime_thread', or 'timer_func'");
+        return -1;
+    }
+}
+
+///////////////////
+// Sample buffer //
+///////////////////
+
+/**
+ * A SampleBuffer records samples without calling into Python. Call stacks
+ * are stored in a prefix tree, where each node is a frame info string plus
+ * the ID of its parent node. Node 0 is the root, the empty stack. Each
+ * sample is stored as the node ID of its call stack, and the time since the
+ * previous sample.
+ *
+ * Nodes are looked up by (parent, frame_info), comparing frame info strings
+ * by identity, so they're always interned before they're added.
+ */
+typedef struct {
+    PyObject_HEAD
+    // the stack trie
+    Py_ssize_t node_count;
+    Py_ssize_t node_capacity;
+    int *node_parents;
+    PyObject **node_frame_infos;  // strong references, NULL for the root
+    // open-addressed hash table of node IDs, keyed by the parent and frame
+    // info of the node. 0 means an empty slot.
+    Py_ssize_t child_table_capacity;  // must be a power of two
+    int *child_table;
+    // the samples
+    Py_ssize_t sample_count;
+    Py_ssize_t sample_capacity;
+    unsigned int *sample_stack_ids;
+    double *sample_times;
+    double last_sample_time;
+    // scratch space used to collect frame infos while walking the stack
+    Py_ssize_t scratch_capacity;
+    PyObject **scratch;
+    // the frame info at the base of every stack, identifying the thread
+    PyObject *root_frame_info;
+    // appended to the stack when the profiler's async context was exited
+    // via an await
+    PyObject *await_frame_info;
+    // appended to the stack when the async context was exited for an
+    // unknown reason. If NULL, samples are recorded as normal.
+    PyObject *out_of_context_frame_info;
+    // when >= 0, samples are recorded with this stack rather than the
+    // current one, because the profiler's async context isn't running
+    int override_stack_id;
+} SampleBuffer;
+
+static PyTypeObject SampleBuffer_Type;
+
+static int
+_grow_array(void **array, Py_ssize_t *capacity, size_t item_size) {
+    Py_ssize_t new_capacity = (*capacity > 0) ? *capacity * 2 : 1024;
+    void *new_array = PyMem_Realloc(*array, new_capacity * item_size);
+    if (new_array == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+    *array = new_array;
+    *capacity = new_capacity;
+    return 0;
+}
+
+static int
+SampleBuffer_GrowChildTable(SampleBuffer *self) {
+    Py_ssize_t new_capacity = self->child_table_capacity * 2;
+    int *new_table = PyMem_Calloc(new_capacity, sizeof(int));
+    if (new_table == NULL) {
+        PyErr_NoMemory();
+        return -1;
+    }
+
+    size_t mask = new_capacity - 1;
+    for (Py_ssize_t node = 1; node < self->node_count; node++) {
+        size_t i = _cache_hash(self->node_frame_infos[node], NULL, self->node_parents[node]) & mask;
+        while (new_table[i] != 0) {
+            i = (i + 1) & mask;
+        }
+        new_table[i] = (int)node;
+    }
+
+    PyMem_Free(self->child_table);
+    self->child_table = new_table;
+    self->child_table_capacity = new_capacity;
+    return 0;
+}
+
+/**
+ * Returns the ID of the node for the stack of `parent` plus `frame_info`,
+ * creating it if necessary. `frame_info` should be interned. Returns -1 on
+ * error.
+ */
+static int
+SampleBuffer_ChildNode(SampleBuffer *self, int parent, PyObject *frame_info) {
+    if (self->node_count >= INT_MAX) {
+        PyErr_SetString(PyExc_OverflowError, "too many stacks in sample buffer");
+        return -1;
+    }
+    if (self->node_count == self->node_capacity) {
+        Py_ssize_t capacity = self->node_capacity;
+        if (_grow_array((void **)&self->node_parents, &capacity, sizeof(int)) == -1) {
+            return -1;
+        }
+        capacity = self->node_capacity;
+        if (_grow_array((void **)&self->node_frame_infos, &capacity, sizeof(PyObject *)) == -1) {
+            return -1;
+        }
+        self->node_capacity = capacity;
+    }
+    if ((self->node_count + 1) * 4 > self->child_table_capacity * 3) {
+        if (SampleBuffer_GrowChildTable(self) == -1) {
+            return -1;
+        }
+    }
+
+    size_t mask = self->child_table_capacity - 1;
+    size_t i = _cache_hash(frame_info, NULL, parent) & mask;
+    int node;
+
+    while ((node = self->child_table[i]) != 0) {
+        if (self->node_parents[node] == parent && self->node_frame_infos[node] == frame_info) {
+            return node;
+        }
+        i = (i + 1) & mask;
+    }
+
+    node = (int)self->node_count++;
+    self->node_parents[node] = parent;
+    Py_INCREF(frame_info);
+    self->node_frame_infos[node] = frame_info;
+    self->child_table[i] = node;
+    return node;
+}
+
+/**
+ * Returns the ID of the node for a Python list of frame info strings, added
+ * to the stack of `node`. Returns -1 on error.
+ */
+static int
+SampleBuffer_NodeForList(SampleBuffer *self, PyObject *stack, int node) {
+    if (!PyList_Check(stack)) {
+        PyErr_SetString(PyExc_TypeError, "call stack must be a list");
+        return -1;
+    }
+
+    for (Py_ssize_t i = 0; i < PyList_GET_SIZE(stack) && node >= 0; i++) {
+        PyObject *frame_info = PyList_GET_ITEM(stack, i);
+        if (!PyUnicode_CheckExact(frame_info)) {
+            PyErr_SetString(PyExc_TypeError, "call stack must contain only strings");
+            return -1;
+        }
+        Py_INCREF(frame_info);
+        PyUnicode_InternInPlace(&frame_info);
+        node = SampleBuffer_ChildNode(self, node, frame_info);
+        Py_DECREF(frame_info);
+    }
+
+    return node;
+}
+
+static int
+SampleBuffer_Append(SampleBuffer *self, int stack_id, double time) {
+    if (self->sample_count == self->sample_capacity) {
+        Py_ssize_t capacity = self->sample_capacity;
+        if (_grow_array((void **)&self->sample_stack_ids, &capacity, sizeof(unsigned int)) == -1) {
+            return -1;
+        }
+        capacity = self->sample_capacity;
+        if (_grow_array((void **)&self->sample_times, &capacity, sizeof(double)) == -1) {
+            return -1;
+        }
+        self->sample_capacity = capacity;
+    }
+
+    self->sample_stack_ids[self->sample_count] = (unsigned int)stack_id;
+    self->sample_times[self->sample_count] = time;
+    self->sample_count++;
+    return 0;
+}
+
+/**
+ * Returns a new reference to the frame info string for a C function,
+ * matching the one built by pyinstrument.stack_sampler.build_call_stack.
+ */
+static PyObject *
+_get_c_function_frame_info(PyObject *c_function) {
+    PyObject *name = PyObject_GetAttrString(c_function, "__qualname__");
+    if (name == NULL) {
+        PyErr_Clear();
+        name = PyObject_GetAttrString(c_function, "__name__");
+        if (name == NULL) {
+            return NULL;
+        }
+    }
+
+    PyObject *result = PyUnicode_FromFormat("%S%c%s%c%i", name, 0, "<built-in>", 0, 0);
+    Py_DECREF(name);
+
+    if (result != NULL) {
+        PyUnicode_InternInPlace(&result);
+    }
+    return result;
+}
+
+/**
+ * Records a sample of the stack at `frame`, following the same rules as
+ * pyinstrument.stack_sampler.build_call_stack. Returns -1 on error.
+ */
+static int
+SampleBuffer_RecordFrame(SampleBuffer *self, PyFrameObject *frame, int what, PyObject *arg, double time) {
+    if (self->override_stack_id >= 0) {
+        return SampleBuffer_Append(self, self->override_stack_id, time);
+    }
+
+    PyObject *c_function_frame_info = NULL;
+    PyFrameObject *current;
+    Py_ssize_t depth = 0;
+    int node = -1;
+
+    if (what == WHAT_CALL) {
+        // if we're entering a function, the time should be attributed to
+        // the caller
+        current = PyFrame_GETBACK(frame);
     } else {
-        PyErr_SetString(PyExc_TypeError, "timer_type must be 'walltime', 'walltime_thread', 'walltime_coarse', or 'timer_func'");
+        Py_INCREF(frame);
+        current = frame;
+    }
+
+    if (what == WHAT_C_RETURN || what == WHAT_C_EXCEPTION) {
+        c_function_frame_info = _get_c_function_frame_info(arg);
+        if (c_function_frame_info == NULL) {
+            goto done;
+        }
+    }
+
+    // collect the frame infos, from the leaf to the root
+    while (current != NULL) {
+        if (depth == self->scratch_capacity) {
+            if (_grow_array((void **)&self->scratch, &self->scratch_capacity, sizeof(PyObject *)) == -1) {
+                goto done;
+            }
+        }
+
+        PyObject *frame_info = _get_frame_info(current);
+        if (frame_info == NULL) {
+            goto done;
+        }
+        PyUnicode_InternInPlace(&frame_info);
+        self->scratch[depth++] = frame_info;
+
+        PyFrameObject *back = PyFrame_GETBACK(current);
+        Py_DECREF(current);
+        current = back;
+    }
+
+    node = SampleBuffer_ChildNode(self, 0, self->root_frame_info);
+    for (Py_ssize_t i = depth - 1; i >= 0 && node >= 0; i--) {
+        node = SampleBuffer_ChildNode(self, node, self->scratch[i]);
+    }
+    if (c_function_frame_info != NULL && node >= 0) {
+        node = SampleBuffer_ChildNode(self, node, c_function_frame_info);
+    }
+
+done:
+    Py_XDECREF(current);
+    Py_XDECREF(c_function_frame_info);
+    for (Py_ssize_t i = 0; i < depth; i++) {
+        Py_DECREF(self->scratch[i]);
+    }
+
+    if (node < 0) {
         return -1;
     }
+    return SampleBuffer_Append(self, node, time);
+}
+
+static PyObject *
+SampleBuffer_new(PyTypeObject *type, PyObject *args, PyObject *kwds) {
+    static char *kwlist[] = {"root_frame_info", "await_frame_info", "out_of_context_frame_info", NULL};
+    PyObject *root_frame_info = NULL;
+    PyObject *await_frame_info = NULL;
+    PyObject *out_of_context_frame_info = NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "UU|O", kwlist, &root_frame_info, &await_frame_info, &out_of_context_frame_info))
+        return NULL;
+
+    if (out_of_context_frame_info == Py_None) {
+        out_of_context_frame_info = NULL;
+    }
+    if (out_of_context_frame_info && !PyUnicode_Check(out_of_context_frame_info)) {
+        PyErr_SetString(PyExc_TypeError, "out_of_context_frame_info must be a str or None");
+        return NULL;
+    }
+
+    SampleBuffer *self = (SampleBuffer *)type->tp_alloc(type, 0);
+    if (self == NULL) {
+        return NULL;
+    }
+
+    self->override_stack_id = -1;
+    self->node_count = 1;
+    self->node_capacity = 1024;
+    self->node_parents = PyMem_Malloc(self->node_capacity * sizeof(int));
+    self->node_frame_infos = PyMem_Malloc(self->node_capacity * sizeof(PyObject *));
+    self->child_table_capacity = 2048;
+    self->child_table = PyMem_Calloc(self->child_table_capacity, sizeof(int));
+
+    if (!self->node_parents || !self->node_frame_infos || !self->child_table) {
+        Py_DECREF(self);
+        return PyErr_NoMemory();
+    }
+
+    self->node_parents[0] = -1;
+    self->node_frame_infos[0] = NULL;
+
+    Py_INCREF(root_frame_info);
+    PyUnicode_InternInPlace(&root_frame_info);
+    self->root_frame_info = root_frame_info;
+    Py_INCREF(await_frame_info);
+    PyUnicode_InternInPlace(&await_frame_info);
+    self->await_frame_info = await_frame_info;
+    if (out_of_context_frame_info) {
+        Py_INCREF(out_of_context_frame_info);
+        PyUnicode_InternInPlace(&out_of_context_frame_info);
+        self->out_of_context_frame_info = out_of_context_frame_info;
+    }
+
+    return (PyObject *)self;
+}
+
+static void
+SampleBuffer_dealloc(SampleBuffer *self) {
+    if (self->node_frame_infos) {
+        for (Py_ssize_t i = 1; i < self->node_count; i++) {
+            Py_DECREF(self->node_frame_infos[i]);
+        }
+    }
+    PyMem_Free(self->node_parents);
+    PyMem_Free(self->node_frame_infos);
+    PyMem_Free(self->child_table);
+    PyMem_Free(self->sample_stack_ids);
+    PyMem_Free(self->sample_times);
+    PyMem_Free(self->scratch);
+    Py_XDECREF(self->root_frame_info);
+    Py_XDECREF(self->await_frame_info);
+    Py_XDECREF(self->out_of_context_frame_info);
+    Py_TYPE(self)->tp_free((PyObject *)self);
+}
+
+static Py_ssize_t
+SampleBuffer_length(SampleBuffer *self) {
+    return self->sample_count;
+}
+
+static PyObject *
+SampleBuffer_record(SampleBuffer *self, PyObject *args) {
+    PyObject *call_stack;
+    double time;
+
+    if (!PyArg_ParseTuple(args, "Od", &call_stack, &time))
+        return NULL;
+
+    int node = SampleBuffer_NodeForList(self, call_stack, 0);
+    if (node < 0 || SampleBuffer_Append(self, node, time) == -1) {
+        return NULL;
+    }
+
+    Py_RETURN_NONE;
 }
 
+static PyObject *
+SampleBuffer_set_async_state(SampleBuffer *self, PyObject *args) {
+    PyObject *state;
+    PyObject *info = NULL;
+
+    if (!PyArg_ParseTuple(args, "U|O", &state, &info))
+        return NULL;
+
+    int node = -1;
+
+    if (PyUnicode_CompareWithASCIIString(state, "in_context") == 0) {
+        node = -1;
+    } else if (PyUnicode_CompareWithASCIIString(state, "out_of_context_awaited") == 0) {
+        node = SampleBuffer_NodeForList(self, info, 0);
+        if (node < 0) {
+            return NULL;
+        }
+        node = SampleBuffer_ChildNode(self, node, self->await_frame_info);
+        if (node < 0) {
+            return NULL;
+        }
+    } else if (PyUnicode_CompareWithASCIIString(state, "out_of_context_unknown") == 0) {
+        if (self->out_of_context_frame_info) {
+            node = SampleBuffer_NodeForList(self, info, 0);
+            if (node < 0) {
+                return NULL;
+            }
+            node = SampleBuffer_ChildNode(self, node, self->out_of_context_frame_info);
+            if (node < 0) {
+                return NULL;
+            }
+        }
+    } else {
+        PyErr_Format(PyExc_ValueError, "unknown async state %R", state);
+        return NULL;
+    }
+
+    self->override_stack_id = node;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+SampleBuffer_export(SampleBuffer *self, PyObject *Py_UNUSED(args)) {
+    PyObject *frame_infos = PyList_New(self->node_count);
+    if (frame_infos == NULL) {
+        return NULL;
+    }
+
+    PyObject *root_frame_info = PyUnicode_FromString("");
+    if (root_frame_info == NULL) {
+        Py_DECREF(frame_infos);
+        return NULL;
+    }
+    PyList_SET_ITEM(frame_infos, 0, root_frame_info);
+
+    for (Py_ssize_t i = 1; i < self->node_count; i++) {
+        Py_INCREF(self->node_frame_infos[i]);
+        PyList_SET_ITEM(frame_infos, i, self->node_frame_infos[i]);
+    }
+
+    return Py_BuildValue(
+        "(Ny#y#y#)",
+        frame_infos,
+        (const char *)self->node_parents, self->node_count * (Py_ssize_t)sizeof(int),
+        (const char *)self->sample_stack_ids, self->sample_count * (Py_ssize_t)sizeof(unsigned int),
+        (const char *)self->sample_times, self->sample_count * (Py_ssize_t)sizeof(double)
+    );
+}
+
+static PyMethodDef SampleBuffer_methods[] = {
+    {"record", (PyCFunction)SampleBuffer_record, METH_VARARGS,
+     "Records a sample with a call stack list, and the time since the previous sample."},
+    {"set_async_state", (PyCFunction)SampleBuffer_set_async_state, METH_VARARGS,
+     "Sets the async state of the profiler, which determines the stack recorded by future samples."},
+    {"export", (PyCFunction)SampleBuffer_export, METH_NOARGS,
+     "Returns a tuple of (frame_infos, parents, stack_ids, times). The last three are bytes objects "
+     "containing arrays of C int, C unsigned int and C double, respectively."},
+    {NULL}  /* Sentinel */
+};
+
+static PySequenceMethods SampleBuffer_as_sequence = {
+    (lenfunc)SampleBuffer_length,  /* sq_length */
+};
+
+static PyTypeObject SampleBuffer_Type = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pyinstrument.stat_profile.SampleBuffer", /* tp_name */
+    sizeof(SampleBuffer),                     /* tp_basicsize */
+    0,                                        /* tp_itemsize */
+    (destructor)SampleBuffer_dealloc,         /* tp_dealloc */
+    0,                                        /* tp_print */
+    0,                                        /* tp_getattr */
+    0,                                        /* tp_setattr */
+    0,                                        /* tp_reserved */
+    0,                                        /* tp_repr */
+    0,                                        /* tp_as_number */
+    &SampleBuffer_as_sequence,                /* tp_as_sequence */
+    0,                                        /* tp_as_mapping */
+    0,                                        /* tp_hash */
+    0,                                        /* tp_call */
+    0,                                        /* tp_str */
+    0,                                        /* tp_getattro */
+    0,                                        /* tp_setattro */
+    0,                                        /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                       /* tp_flags */
+    "A buffer of samples recorded by setstatprofile, without calling into Python.", /* tp_doc */
+    0,                                        /* tp_traverse */
+    0,                                        /* tp_clear */
+    0,                                        /* tp_richcompare */
+    0,                                        /* tp_weaklistoffset */
+    0,                                        /* tp_iter */
+    0,                                        /* tp_iternext */
+    SampleBuffer_methods,                     /* tp_methods */
+    0,                                        /* tp_members */
+    0,                                        /* tp_getset */
+    0,                                        /* tp_base */
+    0,                                        /* tp_dict */
+    0,                                        /* tp_descr_get */
+    0,                                        /* tp_descr_set */
+    0,                                        /* tp_dictoffset */
+    0,                                        /* tp_init */
+    PyType_GenericAlloc,                      /* tp_alloc */
+    SampleBuffer_new,                         /* tp_new */
+    PyObject_Del,                             /* tp_free */
+};
+
 //////////////////////
 // Public functions //
 //////////////////////
@@ -684,6 +1538,20 @@ profile(PyObject *op, PyFrameObject *frame, int what, PyObject *arg)
     }
 
     pState->last_invocation = now;
+
+    if (pState->sample_buffer) {
+        SampleBuffer *buffer = (SampleBuffer *)pState->sample_buffer;
+        double sample_time = ProfilerState_GetSampleTime(pState, now);
+
+        if (SampleBuffer_RecordFrame(buffer, frame, what, arg, sample_time - buffer->last_sample_time) == -1) {
+            PyEval_SetProfile(NULL, NULL);
+            return -1;
+        }
+
+        buffer->last_sample_time = sample_time;
+        return 0;
+    }
+
     result = call_target(pState, frame, what, arg);
 
     if (result == NULL) {
@@ -702,17 +1570,27 @@ profile(PyObject *op, PyFrameObject *frame, int what, PyObject *arg)
 static PyObject *
 setstatprofile(PyObject *m, PyObject *args, PyObject *kwds)
 {
-    static char *kwlist[] = {"target", "interval", "context_var", "timer_type", "timer_func", NULL};
+    static char *kwlist[] = {"target", "interval", "context_var", "timer_type", "timer_func", "sample_buffer", NULL};
     ProfilerState *pState = NULL;
     double interval = 0.0;
     PyObject *target = NULL;
     PyObject *context_var = NULL;
     PyObject *timer_type = NULL;
     PyObject *timer_func = NULL;
+    PyObject *sample_buffer = NULL;
 
-    if (! PyArg_ParseTupleAndKeywords(args, kwds, "O|dO!UO", kwlist, &target, &interval, &PyContextVar_Type, &context_var, &timer_type, &timer_func))
+    if (! PyArg_ParseTupleAndKeywords(args, kwds, "O|dO!UOO", kwlist, &target, &interval, &PyContextVar_Type, &context_var, &timer_type, &timer_func, &sample_buffer))
         return NULL;
 
+    if (sample_buffer == Py_None) {
+        sample_buffer = NULL;
+    }
+
+    if (sample_buffer && !PyObject_TypeCheck(sample_buffer, &SampleBuffer_Type)) {
+        PyErr_SetString(PyExc_TypeError, "sample_buffer must be a SampleBuffer");
+        return NULL;
+    }
+
     if (target == Py_None) {
         target = NULL;
     }
@@ -763,6 +1641,8 @@ setstatprofile(PyObject *m, PyObject *args, PyObject *kwds)
             }
         } else if (timer_type_int == TIMER_TYPE_WALLTIME_COARSE) {
             pState->floatclock_type = PYI_FLOATCLOCK_MONOTONIC_COARSE;
+        } else if (timer_type_int == TIMER_TYPE_CPUTIME_THREAD) {
+            pState->floatclock_type = PYI_FLOATCLOCK_THREAD_CPUTIME;
         } else {
             pState->floatclock_type = PYI_FLOATCLOCK_DEFAULT;
         }
@@ -770,6 +1650,16 @@ setstatprofile(PyObject *m, PyObject *args, PyObject *kwds)
         // initialise the last invocation to avoid immediate callback
         pState->last_invocation = ProfilerState_GetTime(pState);
 
+        if (sample_buffer) {
+            // samples are recorded directly into the buffer, the target is
+            // only called with context_changed events
+            Py_INCREF(sample_buffer);
+            pState->sample_buffer = sample_buffer;
+            ((SampleBuffer *)sample_buffer)->last_sample_time = (
+                ProfilerState_GetSampleTime(pState, pState->last_invocation)
+            );
+        }
+
         if (context_var) {
             Py_INCREF(context_var);
             pState->context_var = context_var;
@@ -792,6 +1682,48 @@ error:
     return NULL;
 }
 
+/**
+ * Changes the interval of the setstatprofile profiler running on the current
+ * thread, without restarting it.
+ */
+static PyObject *
+set_sampling_interval(PyObject *m, PyObject *arg)
+{
+    double interval = PyFloat_AsDouble(arg);
+    if (interval == -1.0 && PyErr_Occurred()) {
+        return NULL;
+    }
+
+    if (interval <= 0) {
+        PyErr_SetString(PyExc_ValueError, "interval must be positive");
+        return NULL;
+    }
+
+    PyThreadState *tstate = PyThreadState_Get();
+
+    if (tstate->c_profilefunc != profile) {
+        PyErr_SetString(PyExc_RuntimeError, "setstatprofile is not active on this thread");
+        return NULL;
+    }
+
+    ProfilerState *pState = (ProfilerState *)tstate->c_profileobj;
+
+    if (pState->timer_thread_subscription_id >= 0) {
+        // the timing thread has to tick at the new interval too. Subscribe
+        // before unsubscribing, so the thread keeps running.
+        int subscription_id = pyi_timing_thread_subscribe(interval);
+        if (subscription_id < 0) {
+            PyErr_Format(PyExc_RuntimeError, "failed to subscribe to timing thread: error %d", subscription_id);
+            return NULL;
+        }
+        pyi_timing_thread_unsubscribe(pState->timer_thread_subscription_id);
+        pState->timer_thread_subscription_id = subscription_id;
+    }
+
+    pState->interval = interval;
+
+    Py_RETURN_NONE;
+}
 
 static PyObject *
 get_frame_info(PyObject *m, PyObject *const *args, Py_ssize_t nargs)
@@ -846,6 +1778,9 @@ measure_timing_overhead(PyObject *m, PyObject * Py_UNUSED(args))
         PyDict_SetItemString(result, "walltime_coarse", value);
         Py_DECREF(value);
     }
+    value = PyFloat_FromDouble(measure_timing_overhead_for_timer(PYI_FLOATCLOCK_THREAD_CPUTIME));
+    PyDict_SetItemString(result, "cputime_thread", value);
+    Py_DECREF(value);
 
     return result;
 }
@@ -868,7 +1803,10 @@ static PyMethodDef module_methods[] = {
     {"setstatprofile", (PyCFunction)setstatprofile, METH_VARARGS | METH_KEYWORDS,
      "Sets the statistical profiler callback. The function in the same manner as setprofile, but "
      "instead of being called every on every call and return, the function is called every "
-     "<interval> seconds with the current stack."},
+     "<interval> seconds with the current stack. If sample_buffer is passed, samples are recorded "
+     "into it instead, and target is only called when the context var changes."},
+    {"set_sampling_interval", (PyCFunction)set_sampling_interval, METH_O,
+     "Changes the interval of the statistical profiler running on the current thread."},
     {"get_frame_info", (PyCFunction)get_frame_info, METH_FASTCALL,
      "Returns the frame identifier string for the given Frame object."},
     {"measure_timing_overhead", (PyCFunction)measure_timing_overhead, METH_NOARGS,
@@ -881,6 +1819,8 @@ static PyMethodDef module_methods[] = {
 PyMODINIT_FUNC PyInit_stat_profile(void)
 {
     PyType_Ready(&ProfilerState_Type);
+    if (PyType_Ready(&SampleBuffer_Type) < 0)
+        return NULL;
 
     static struct PyModuleDef moduledef = {
         PyModuleDef_HEAD_INIT,
@@ -893,5 +1833,16 @@ PyMODINIT_FUNC PyInit_stat_profile(void)
     if (stat_profile_init() == -1)
         return NULL;
 
-    return PyModule_Create(&moduledef);
+    PyObject *module = PyModule_Create(&moduledef);
+    if (module == NULL)
+        return NULL;
+
+    Py_INCREF(&SampleBuffer_Type);
+    if (PyModule_AddObject(module, "SampleBuffer", (PyObject *)&SampleBuffer_Type) < 0) {
+        Py_DECREF(&SampleBuffer_Type);
+        Py_DECREF(module);
+        return NULL;
+    }
+
+    return module;
 }
@@ -1,6 +1,6 @@
 import contextvars
 import types
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Tuple
 
 from pyinstrument.low_level.types import TimerType
 
@@ -10,7 +10,22 @@ def setstatprofile(
     context_var: contextvars.ContextVar[object | None] | None = None,
     timer_type: TimerType | None = None,
     timer_func: Callable[[], float] | None = None,
+    sample_buffer: SampleBuffer | None = None,
 ) -> None: ...
+def set_sampling_interval(interval: float, /) -> None: ...
+
+class SampleBuffer:
+    def __init__(
+        self,
+        root_frame_info: str,
+        await_frame_info: str,
+        out_of_context_frame_info: str | None = None,
+    ) -> None: ...
+    def __len__(self) -> int: ...
+    def record(self, call_stack: list[str], time: float, /) -> None: ...
+    def set_async_state(self, state: str, info: list[str] | None = None, /) -> None: ...
+    def export(self) -> Tuple[list[str], bytes, bytes, bytes]: ...
+
 def get_frame_info(frame: types.FrameType) -> str: ...
 def measure_timing_overhead() -> Dict[TimerType, float]: ...
 def walltime_coarse_resolution() -> float | None: ...
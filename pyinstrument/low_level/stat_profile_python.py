@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import contextvars
 import sys
+import time
 import timeit
 import types
 from typing import Any, Callable, List, Optional, Type
@@ -38,6 +39,8 @@ class PythonStatProfiler:
 
         if timer_type == "walltime":
             self.get_time = timeit.default_timer
+        elif timer_type == "cputime_thread":
+            self.get_time = time.thread_time
         elif timer_type == "walltime_thread":
             self.get_time = pyi_timing_thread_get_time
             self.timing_thread_subscription = pyi_timing_thread_subscribe(interval)
@@ -113,6 +116,24 @@ def setstatprofile(
         sys.setprofile(None)
 
 
+def set_sampling_interval(interval: float) -> None:
+    if interval <= 0:
+        raise ValueError("interval must be positive")
+
+    profile_function = sys.getprofile()
+    profiler = getattr(profile_function, "__self__", None)
+    if not isinstance(profiler, PythonStatProfiler):
+        raise RuntimeError("setstatprofile is not active on this thread")
+
+    if profiler.timing_thread_subscription is not None:
+        # the timing thread has to tick at the new interval too
+        subscription = pyi_timing_thread_subscribe(interval)
+        pyi_timing_thread_unsubscribe(profiler.timing_thread_subscription)
+        profiler.timing_thread_subscription = subscription
+
+    profiler.interval = interval
+
+
 def get_frame_info(frame: types.FrameType) -> str:
     frame_info = "%s\x00%s\x00%i" % (
         frame.f_code.co_name,
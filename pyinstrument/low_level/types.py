@@ -1,3 +1,10 @@
 from pyinstrument.typing import LiteralStr
 
-TimerType = LiteralStr["walltime", "walltime_thread", "timer_func", "walltime_coarse"]
+TimerType = LiteralStr[
+    "walltime",
+    "walltime_thread",
+    "timer_func",
+    "walltime_coarse",
+    "cputime_thread",
+    "cputime_signal",
+]
@@ -2,12 +2,14 @@ import io
 import os
 import sys
 import time
+from pathlib import Path
 
 from django.conf import settings
 from django.http import HttpResponse
 from django.utils.module_loading import import_string
 
 from pyinstrument import Profiler
+from pyinstrument.archive import ProfileArchive
 from pyinstrument.renderers import Renderer
 from pyinstrument.renderers.html import HTMLRenderer
 
@@ -37,6 +39,7 @@ def get_renderer(path) -> Renderer:
 class ProfilerMiddleware(MiddlewareMixin):  # type: ignore
     def process_request(self, request):
         profile_dir = getattr(settings, "PYINSTRUMENT_PROFILE_DIR", None)
+        profile_archive = getattr(settings, "PYINSTRUMENT_PROFILE_ARCHIVE", None)
 
         func_or_path = getattr(settings, "PYINSTRUMENT_SHOW_CALLBACK", None)
         if isinstance(func_or_path, str):
@@ -47,26 +50,48 @@ class ProfilerMiddleware(MiddlewareMixin):  # type: ignore
             show_pyinstrument = lambda request: True
 
         if (
-            show_pyinstrument(request)
-            and getattr(settings, "PYINSTRUMENT_URL_ARGUMENT", "profile") in request.GET
-        ) or profile_dir:
+            (
+                show_pyinstrument(request)
+                and getattr(settings, "PYINSTRUMENT_URL_ARGUMENT", "profile") in request.GET
+            )
+            or profile_dir
+            or profile_archive
+        ):
             interval: float = getattr(settings, "PYINSTRUMENT_INTERVAL", 0.001)
             profiler = Profiler(interval=interval)
             profiler.start()
 
             request.profiler = profiler
 
+    def _get_profile_archive(self, directory) -> ProfileArchive:
+        """Return the archive for the directory, opening it on first use."""
+        archive = getattr(self, "_profile_archive", None)
+        if archive is None or archive.directory != Path(directory):
+            archive = ProfileArchive(directory)
+            self._profile_archive = archive
+        return archive
+
     def process_response(self, request, response):
         if hasattr(request, "profiler"):
             profile_session = request.profiler.stop()
+
+            profile_archive = getattr(settings, "PYINSTRUMENT_PROFILE_ARCHIVE", None)
+            if profile_archive:
+                self._get_profile_archive(profile_archive).add(profile_session, path=request.path)
+
+            profile_dir = getattr(settings, "PYINSTRUMENT_PROFILE_DIR", None)
+            show_profile = getattr(settings, "PYINSTRUMENT_URL_ARGUMENT", "profile") in request.GET
+
+            if not profile_dir and not show_profile:
+                # the session was only profiled for the archive
+                return response
+
             default_filename_template = "{total_time:.3f}s {path} {timestamp:.0f}.{ext}"
 
             configured_renderer = getattr(settings, "PYINSTRUMENT_PROFILE_DIR_RENDERER", None)
             renderer = get_renderer(configured_renderer)
 
-            output = renderer.render(profile_session)
-
-            profile_dir = getattr(settings, "PYINSTRUMENT_PROFILE_DIR", None)
+            output = None
 
             filename_cb = getattr(settings, "PYINSTRUMENT_FILENAME_CALLBACK", None)
 
@@ -83,6 +108,8 @@ class ProfilerMiddleware(MiddlewareMixin):  # type: ignore
                 path = path.replace("?", "_qs_")
 
             if profile_dir:
+                output = renderer.render(profile_session)
+
                 if filename_cb and callable(filename_cb):
                     filename = filename_cb(request, profile_session, renderer)
                     if not isinstance(filename, str):
@@ -103,13 +130,10 @@ class ProfilerMiddleware(MiddlewareMixin):  # type: ignore
                 with open(file_path, "w", encoding="utf-8") as f:
                     f.write(output)
 
-            if getattr(settings, "PYINSTRUMENT_URL_ARGUMENT", "profile") in request.GET:
-                if isinstance(renderer, HTMLRenderer):
-                    return HttpResponse(output)  # type: ignore
-                else:
-                    renderer = HTMLRenderer()
-                    output = renderer.render(profile_session)
-                    return HttpResponse(output)  # type: ignore
+            if show_profile:
+                if output is None or not isinstance(renderer, HTMLRenderer):
+                    output = HTMLRenderer().render(profile_session)
+                return HttpResponse(output)  # type: ignore
             else:
                 return response
         else:
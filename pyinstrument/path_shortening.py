@@ -0,0 +1,128 @@
+"""
+Shortening of file paths, relative to the entries of ``sys.path``.
+
+A path is shown relative to whichever sys.path entry gives the fewest path
+components - e.g. ``django/core/handlers/base.py`` rather than the full path
+into a virtualenv. The result is the same as calling :func:`os.path.relpath`
+with every entry and keeping the shortest, but the entries are indexed once,
+in a trie of their path components, so each path is resolved in one walk
+down it.
+
+The HTML renderer has a port of this, in
+``html_renderer/src/lib/model/PathShortener.ts``.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Sequence
+
+# pyright: strict
+
+
+class _TrieNode:
+    __slots__ = ("children", "best_length", "best_index")
+
+    def __init__(self, length: int, index: int) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        # the entry with the fewest components in this subtree, earliest
+        # first if there's a tie
+        self.best_length = length
+        self.best_index = index
+
+    def add_entry(self, length: int, index: int) -> None:
+        if length < self.best_length:
+            self.best_length = length
+            self.best_index = index
+
+
+class SysPathIndex:
+    """
+    An index of the entries of ``sys_path``, for finding the shortest
+    relative path to a file.
+
+    The relative path from entry E to a path P has ``len(E) - c`` ``..``
+    components followed by ``len(P) - c`` components of P, where c is the
+    length of their common prefix. Walking P's components down the trie,
+    every node is a possible common prefix, and the best entry below it is
+    the one with the fewest components, which each node records.
+    """
+
+    def __init__(self, sys_path: Sequence[str]) -> None:
+        self.sys_path = list(sys_path)
+        # one trie for each drive, which is always '' except on Windows
+        self._roots: dict[str, _TrieNode] = {}
+
+        for index, entry in enumerate(self.sys_path):
+            drive, parts = _split_path(entry)
+            node = self._roots.get(drive)
+            if node is None:
+                node = self._roots[drive] = _TrieNode(len(parts), index)
+            node.add_entry(len(parts), index)
+
+            for part in parts:
+                child = node.children.get(part)
+                if child is None:
+                    child = node.children[part] = _TrieNode(len(parts), index)
+                child.add_entry(len(parts), index)
+                node = child
+
+    def best_entries(self, path: str) -> list[str]:
+        """
+        Returns the entries to try relative paths from - just the one that
+        gives the shortest path, or none if no entry is on the same drive.
+
+        If ``path`` is itself an entry, or a directory containing one, the
+        relative path might be ``.``, which the trie doesn't account for.
+        That's rare, so then every entry is returned, to be tried in turn.
+        """
+        drive, parts = _split_path(path)
+        node = self._roots.get(drive)
+        best: tuple[int, int] | None = None
+
+        for depth, part in enumerate(parts):
+            if node is None:
+                break
+            candidate = (node.best_length - 2 * depth, node.best_index)
+            if best is None or candidate < best:
+                best = candidate
+            node = node.children.get(part)
+        else:
+            if node is not None:
+                return self.sys_path
+
+        return [self.sys_path[best[1]]] if best is not None else []
+
+    def shorten(self, path: str) -> str:
+        """
+        Returns ``path`` relative to the best sys.path entry, if that has
+        fewer components than ``path`` itself.
+        """
+        # if os.sep doesn't appear, probably not a file path at all, more
+        # likely <built-in> or similar
+        if os.sep not in path:
+            return path
+
+        result = path
+        for entry in self.best_entries(path):
+            # On Windows, if path and entry are on different drives, relpath
+            # raises an exception, because it cannot compute a relpath in
+            # this case.
+            try:
+                candidate = os.path.relpath(path, entry)
+            except ValueError:
+                continue
+
+            if len(candidate.split(os.sep)) < len(result.split(os.sep)):
+                result = candidate
+
+        return result
+
+
+def _split_path(path: str) -> tuple[str, list[str]]:
+    """
+    Splits a path into its drive and components, the way os.path.relpath
+    compares them.
+    """
+    drive, rest = os.path.splitdrive(os.path.abspath(path))
+    return os.path.normcase(drive), [os.path.normcase(part) for part in rest.split(os.sep) if part]
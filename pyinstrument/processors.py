@@ -5,12 +5,18 @@ They can mutate the tree in-place, but also can change the root frame, they shou
 called like::
 
     frame = processor(frame, options=...)
+
+Most of them are :class:`FrameVisitor` objects, that work on one frame at a
+time. Renderers run their processors with :func:`run_processors`, which
+walks the tree once for each run of visitors that can share a walk, rather
+than once per processor.
 """
 
 from __future__ import annotations
 
+import functools
 import re
-from typing import Any, Callable, Dict, Union
+from typing import Any, Callable, Dict, Sequence, Union, cast
 
 from pyinstrument.frame import SELF_TIME_FRAME_IDENTIFIER, Frame, FrameGroup
 from pyinstrument.frame_ops import combine_frames, delete_frame_from_tree
@@ -20,43 +26,198 @@ from pyinstrument.frame_ops import combine_frames, delete_frame_from_tree
 
 ProcessorType = Callable[..., Union[Frame, None]]
 ProcessorOptions = Dict[str, Any]
+VisitFunction = Callable[[Frame, ProcessorOptions, Frame], None]
 
 
-def remove_importlib(frame: Frame | None, options: ProcessorOptions) -> Frame | None:
+class FrameVisitor:
     """
-    Removes ``<frozen importlib._bootstrap`` frames that clutter the output.
+    A processor that works on one frame at a time. Its ``visit`` function is
+    called with each frame in the tree that has children, parents before
+    children, along with the options and the root frame of the tree.
+
+    ``visit`` may change the frame's children - remove them, or change their
+    time and attributes - and may depend on the frame, its ancestors and its
+    children, but not on the frame's own time, which an earlier visit to its
+    parent might have changed.
+
+    Consecutive visitors in a renderer's processors are run in a single walk
+    of the tree, rather than one walk each - see :func:`run_processors`. If
+    a visitor needs every earlier processor to have finished with the whole
+    tree - because it moves frames to another parent, or it looks further
+    down the tree than the frame's children - it's marked ``fusable=False``,
+    and starts a new walk.
+
+    A visitor can be called like a function processor, to run it on its own.
     """
-    if frame is None:
-        return None
 
-    for child in frame.children:
-        remove_importlib(child, options=options)
+    def __init__(self, visit: VisitFunction, fusable: bool = True):
+        self.visit = visit
+        self.fusable = fusable
+
+    def can_follow(self, visitors: Sequence[FrameVisitor]) -> bool:
+        """
+        Returns True if this visitor can run in the same walk as ``visitors``.
+        """
+        return self.fusable
 
-        if child.file_path and "<frozen importlib._bootstrap" in child.file_path:
+    def __call__(self, frame: Frame | None, options: ProcessorOptions) -> Frame | None:
+        return walk_frame_visitors([self], frame, options=options)
+
+    def __repr__(self) -> str:
+        return "<%s %s>" % (type(self).__name__, getattr(self, "__name__", self.visit))
+
+
+class FrameRemover(FrameVisitor):
+    """
+    A visitor that removes the frames that ``should_remove`` returns True
+    for, moving their children and self time up to the parent.
+
+    Removing frames like this gives the same tree whatever order it's done
+    in, so consecutive removers at the start of a walk are fused into one,
+    that removes the frames any of them match.
+    """
+
+    def __init__(self, should_remove: Callable[[Frame], bool]):
+        super().__init__(self._remove_children, fusable=False)
+        self.should_remove = should_remove
+
+    def can_follow(self, visitors: Sequence[FrameVisitor]) -> bool:
+        return all(isinstance(v, FrameRemover) for v in visitors)
+
+    @classmethod
+    def combine(cls, removers: Sequence[FrameRemover]) -> FrameRemover:
+        """
+        Returns a remover that removes the frames any of ``removers`` match.
+        """
+        predicates = [r.should_remove for r in removers]
+
+        def should_remove(frame: Frame) -> bool:
+            for predicate in predicates:
+                if predicate(frame):
+                    return True
+            return False
+
+        return cls(should_remove)
+
+    def _remove_children(self, frame: Frame, options: ProcessorOptions, root: Frame) -> None:
+        should_remove = self.should_remove
+        pending = list(filter(should_remove, frame._children))  # type: ignore # noqa
+        while pending:
+            child = pending.pop()
+            # the children brought up are checked too, so that none that
+            # should be removed are left among the frame's children
+            pending.extend(filter(should_remove, child._children))  # type: ignore # noqa
             delete_frame_from_tree(child, replace_with="children")
 
-    return frame
 
+def frame_visitor(fusable: bool = True) -> Callable[[VisitFunction], FrameVisitor]:
+    """
+    Decorator that makes a :class:`FrameVisitor` from a visit function.
+    """
+
+    def decorator(visit: VisitFunction) -> FrameVisitor:
+        visitor = FrameVisitor(visit, fusable=fusable)
+        # copies the name and docstring. update_wrapper returns the visitor
+        # too, but typed as a generic wrapper, so it's not used
+        functools.update_wrapper(visitor, visit)
+        return visitor
 
-def remove_tracebackhide(frame: Frame | None, options: ProcessorOptions) -> Frame | None:
+    return decorator
+
+
+def frame_remover(should_remove: Callable[[Frame], bool]) -> FrameRemover:
     """
-    Removes frames that have set a local `__tracebackhide__` (e.g.
-    `__tracebackhide__ = True`), to hide them from the output.
+    Decorator that makes a :class:`FrameRemover` from a predicate.
+    """
+    remover = FrameRemover(should_remove)
+    functools.update_wrapper(remover, should_remove)
+    return remover
+
+
+def walk_frame_visitors(
+    visitors: Sequence[FrameVisitor], frame: Frame | None, options: ProcessorOptions
+) -> Frame | None:
+    """
+    Walks the tree once, calling each visitor on each frame, in order.
     """
     if frame is None:
         return None
 
-    for child in frame.children:
-        remove_tracebackhide(child, options=options)
+    # removers at the start run as one, so frames brought up by one are
+    # checked by the others too
+    n_removers = 0
+    while n_removers < len(visitors) and isinstance(visitors[n_removers], FrameRemover):
+        n_removers += 1
+    if n_removers > 1:
+        removers = cast("list[FrameRemover]", visitors[:n_removers])
+        visitors = [FrameRemover.combine(removers), *visitors[n_removers:]]
+
+    root = frame
+    pending = [root]
+    while pending:
+        frame = pending.pop()
+        # visitors only change a frame's children, so leaves are skipped
+        if not frame._children:  # type: ignore # noqa
+            continue
+        for visitor in visitors:
+            visitor.visit(frame, options, root)
+        pending.extend(reversed(frame._children))  # type: ignore # noqa
+
+    return root
+
+
+def run_processors(
+    frame: Frame | None, processors: Sequence[ProcessorType], options: ProcessorOptions
+) -> Frame | None:
+    """
+    Runs each processor on the tree, in turn, and returns the result.
 
-        if child.has_tracebackhide:
-            # remove this node, moving the self_time and children up to the parent
-            delete_frame_from_tree(child, replace_with="children")
+    Runs of consecutive :class:`FrameVisitor` processors share one walk of
+    the tree, up to the next one that can't follow them. Other processors
+    are called as functions, each walking the tree itself.
+    """
+    visitors: list[FrameVisitor] = []
+
+    for processor in processors:
+        if isinstance(processor, FrameVisitor) and (not visitors or processor.can_follow(visitors)):
+            visitors.append(processor)
+            continue
+
+        if visitors:
+            frame = walk_frame_visitors(visitors, frame, options=options)
+            visitors = []
+
+        if isinstance(processor, FrameVisitor):
+            visitors.append(processor)
+        else:
+            frame = processor(frame, options=options)
+
+    if visitors:
+        frame = walk_frame_visitors(visitors, frame, options=options)
 
     return frame
 
 
-def aggregate_repeated_calls(frame: Frame | None, options: ProcessorOptions) -> Frame | None:
+@frame_remover
+def remove_importlib(frame: Frame) -> bool:
+    """
+    Removes ``<frozen importlib._bootstrap`` frames that clutter the output.
+    """
+    file_path = frame.file_path
+    return file_path is not None and "<frozen importlib._bootstrap" in file_path
+
+
+@frame_remover
+def remove_tracebackhide(frame: Frame) -> bool:
+    """
+    Removes frames that have set a local `__tracebackhide__` (e.g.
+    `__tracebackhide__ = True`), to hide them from the output.
+    """
+    return frame.has_tracebackhide
+
+
+@frame_visitor(fusable=False)
+def aggregate_repeated_calls(frame: Frame, options: ProcessorOptions, root: Frame) -> None:
     """
     Converts a timeline into a time-aggregate summary.
 
@@ -65,9 +226,6 @@ def aggregate_repeated_calls(frame: Frame | None, options: ProcessorOptions) ->
 
     Useful for outputs that display a summary of execution (e.g. text and html outputs)
     """
-    if frame is None:
-        return None
-
     children_by_identifier: dict[str, Frame] = {}
 
     # iterate over a copy of the children since it's going to mutate while we're iterating
@@ -81,18 +239,13 @@ def aggregate_repeated_calls(frame: Frame | None, options: ProcessorOptions) ->
             # never seen this identifier before. It becomes the aggregate frame.
             children_by_identifier[child.identifier] = child
 
-    # recurse into the children
-    for child in frame.children:
-        aggregate_repeated_calls(child, options=options)
-
     # sort the children by time
     # we use the internal _children list, because we need to mutate it
     frame._children.sort(key=lambda c: c.time, reverse=True)  # type: ignore # noqa
 
-    return frame
-
 
-def group_library_frames_processor(frame: Frame | None, options: ProcessorOptions) -> Frame | None:
+@frame_visitor(fusable=False)
+def group_library_frames_processor(frame: Frame, options: ProcessorOptions, root: Frame) -> None:
     """
     Groups frames that should be hidden into :class:`FrameGroup` objects,
     according to ``hide_regex`` and ``show_regex`` in the options dict, as
@@ -111,9 +264,6 @@ def group_library_frames_processor(frame: Frame | None, options: ProcessorOption
     Single frames are not grouped, there must be at least two frames in a
     group.
     """
-    if frame is None:
-        return None
-
     hide_regex: str | None = options.get("hide_regex")
     show_regex: str | None = options.get("show_regex")
 
@@ -144,20 +294,12 @@ def group_library_frames_processor(frame: Frame | None, options: ProcessorOption
             group = FrameGroup(child)
             add_frames_to_group(child, group)
 
-        group_library_frames_processor(child, options=options)
 
-    return frame
-
-
-def merge_consecutive_self_time(
-    frame: Frame | None, options: ProcessorOptions, recursive: bool = True
-) -> Frame | None:
+@frame_visitor()
+def merge_consecutive_self_time(frame: Frame, options: ProcessorOptions, root: Frame) -> None:
     """
     Combines consecutive 'self time' frames.
     """
-    if frame is None:
-        return None
-
     previous_self_time_frame = None
 
     for child in frame.children:
@@ -172,36 +314,23 @@ def merge_consecutive_self_time(
         else:
             previous_self_time_frame = None
 
-    if recursive:
-        for child in frame.children:
-            merge_consecutive_self_time(child, options=options, recursive=True)
-
-    return frame
-
 
+@frame_visitor()
 def remove_unnecessary_self_time_nodes(
-    frame: Frame | None, options: ProcessorOptions
-) -> Frame | None:
+    frame: Frame, options: ProcessorOptions, root: Frame
+) -> None:
     """
     When a frame has only one child, and that is a self-time frame, remove
     that node and move the time to parent, since it's unnecessary - it
     clutters the output and offers no additional information.
     """
-    if frame is None:
-        return None
-
-    if len(frame.children) == 1 and frame.children[0].identifier == SELF_TIME_FRAME_IDENTIFIER:
-        delete_frame_from_tree(frame.children[0], replace_with="nothing")
-
-    for child in frame.children:
-        remove_unnecessary_self_time_nodes(child, options=options)
-
-    return frame
+    children = frame.children
+    if len(children) == 1 and children[0].identifier == SELF_TIME_FRAME_IDENTIFIER:
+        delete_frame_from_tree(children[0], replace_with="nothing")
 
 
-def remove_irrelevant_nodes(
-    frame: Frame | None, options: ProcessorOptions, total_time: float | None = None
-) -> Frame | None:
+@frame_visitor()
+def remove_irrelevant_nodes(frame: Frame, options: ProcessorOptions, root: Frame) -> None:
     """
     Remove nodes that represent less than e.g. 1% of the output. Options:
 
@@ -209,15 +338,11 @@ def remove_irrelevant_nodes(
       sets the minimum duration of a frame to be included in the output.
       Default: 0.01.
     """
-    if frame is None:
-        return None
+    total_time = root.time
 
-    if total_time is None:
-        total_time = frame.time
-
-        # prevent divide by zero
-        if total_time <= 0:
-            total_time = 1e-44
+    # prevent divide by zero
+    if total_time <= 0:
+        total_time = 1e-44
 
     filter_threshold = options.get("filter_threshold", 0.01)
 
@@ -227,11 +352,6 @@ def remove_irrelevant_nodes(
         if proportion_of_total < filter_threshold:
             delete_frame_from_tree(child, replace_with="nothing")
 
-    for child in frame.children:
-        remove_irrelevant_nodes(child, options=options, total_time=total_time)
-
-    return frame
-
 
 # pylint: disable=W0613
 def remove_first_pyinstrument_frames_processor(
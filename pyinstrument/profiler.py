@@ -5,15 +5,27 @@ import os
 import sys
 import time
 import types
+from array import array
 from pathlib import Path
 from time import process_time
 from typing import IO, Any
 
 from pyinstrument import renderers
 from pyinstrument.frame import AWAIT_FRAME_IDENTIFIER, OUT_OF_CONTEXT_FRAME_IDENTIFIER
+from pyinstrument.frame_records import FrameRecords, FrameRecordsRingBuffer
+from pyinstrument.low_level.stat_profile import SampleBuffer
+from pyinstrument.low_level.types import TimerType
 from pyinstrument.renderers.console import FlatTimeMode
 from pyinstrument.session import Session
-from pyinstrument.stack_sampler import AsyncState, StackSampler, build_call_stack, get_stack_sampler
+from pyinstrument.stack_sampler import (
+    AllThreadsSampler,
+    AsyncState,
+    StackSampler,
+    build_call_stack,
+    get_stack_sampler,
+    resolve_timer_type,
+    thread_frame_info,
+)
 from pyinstrument.typing import LiteralStr, TypeAlias
 from pyinstrument.util import file_supports_color, file_supports_unicode
 
@@ -21,7 +33,7 @@ from pyinstrument.util import file_supports_color, file_supports_unicode
 
 
 class ActiveProfilerSession:
-    frame_records: list[tuple[list[str], float]]
+    frame_records: FrameRecords | SampleBuffer | FrameRecordsRingBuffer
 
     def __init__(
         self,
@@ -30,14 +42,78 @@ class ActiveProfilerSession:
         start_call_stack: list[str],
         target_description: str,
         interval: float,
+        sample_buffer: SampleBuffer | None = None,
+        ring_buffer: FrameRecordsRingBuffer | None = None,
+        record_timestamps: bool = False,
     ) -> None:
         self.start_time = start_time
         self.start_process_time = start_process_time
         self.start_call_stack = start_call_stack
-        self.frame_records = []
+        # when recording natively, samples seen by the profiler are added
+        # to the buffer too, so that they stay in order
+        if sample_buffer is not None:
+            self.frame_records = sample_buffer
+        elif ring_buffer is not None:
+            self.frame_records = ring_buffer
+        elif record_timestamps:
+            self.frame_records = FrameRecords(timestamps=array("d"))
+        else:
+            # consecutive samples with the same call stack are merged into
+            # one record
+            self.frame_records = FrameRecords(counts=array("I"))
+        self.record_timestamps = record_timestamps
         self.target_description = target_description
         self.interval = interval
 
+    def record(self, call_stack: list[str], time_since_last_sample: float) -> None:
+        """
+        Adds a sample.
+        """
+        frame_records = self.frame_records
+        if self.record_timestamps:
+            assert not isinstance(frame_records, SampleBuffer)
+            frame_records.record(call_stack, time_since_last_sample, time.time())
+        elif isinstance(frame_records, FrameRecords):
+            frame_records.add_sample(call_stack, time_since_last_sample)
+        else:
+            frame_records.record(call_stack, time_since_last_sample)
+
+    def collect_frame_records(self, copy: bool = False) -> FrameRecords:
+        """
+        Returns the records so far. If ``copy`` is True, the result is
+        independent of this session, so this can be called while samples are
+        still being recorded.
+        """
+        if isinstance(self.frame_records, SampleBuffer):
+            return FrameRecords.from_sample_buffer(self.frame_records)
+        if isinstance(self.frame_records, FrameRecordsRingBuffer):
+            return self.frame_records.snapshot()
+        if copy:
+            return self.frame_records.snapshot()
+        return self.frame_records
+
+    def take_frame_records(self) -> FrameRecords:
+        """
+        Removes the records so far from this session, and returns them.
+        """
+        frame_records = self.frame_records
+        if not isinstance(frame_records, FrameRecords):
+            raise ValueError(
+                "Samples can't be taken from a profiler with native recording or a ring buffer."
+            )
+
+        # the sampler adds to whichever object self.frame_records is when a
+        # sample starts, and replacing the reference is atomic, so this
+        # doesn't need a lock
+        self.frame_records = FrameRecords(
+            stack_trie=frame_records.stack_trie,
+            timestamps=array("d") if frame_records.timestamps is not None else None,
+            counts=array("I") if frame_records.counts is not None else None,
+        )
+        # a sample that started before the swap can still be added to the
+        # old object, so a copy is returned, which that can't change
+        return frame_records.snapshot()
+
 
 AsyncMode: TypeAlias = LiteralStr["enabled", "disabled", "strict"]
 
@@ -52,12 +128,31 @@ class Profiler:
     _interval: float
     _async_mode: AsyncMode
     use_timing_thread: bool | None
+    timer_type: TimerType | None
+    use_thread_cputime: bool | None
+    overhead_budget: float | None
+    ring_buffer_duration: float | None
+    ring_buffer_samples: int | None
+    record_timestamps: bool
+    use_sys_monitoring: bool | None
+    native_recording: bool
+    all_threads: bool
+    _all_threads_sampler: AllThreadsSampler | None
 
     def __init__(
         self,
         interval: float = 0.001,
         async_mode: AsyncMode = "enabled",
         use_timing_thread: bool | None = None,
+        native_recording: bool = False,
+        timer_type: TimerType | None = None,
+        all_threads: bool = False,
+        use_thread_cputime: bool | None = None,
+        overhead_budget: float | None = None,
+        ring_buffer_duration: float | None = None,
+        ring_buffer_samples: int | None = None,
+        record_timestamps: bool = False,
+        use_sys_monitoring: bool | None = None,
     ):
         """
         Note the profiling will not start until :func:`start` is called.
@@ -67,12 +162,96 @@ class Profiler:
         :param use_timing_thread: If True, the profiler will use a separate
             thread to keep track of time. This is useful if you're on a system
             where getting the time has significant overhead.
+        :param native_recording: If True, samples are recorded by the C
+            extension straight into a buffer, without calling any Python code.
+            This reduces the overhead of each sample, so shorter intervals
+            are practical. It only takes effect while this is the only
+            profiler running on the thread.
+        :param timer_type: How samples are timed. ``'walltime'`` (the
+            default) measures wall-clock time. ``'walltime_thread'`` and
+            ``'cputime_thread'`` are the same as ``use_timing_thread`` and
+            ``use_thread_cputime``. With ``'cputime_signal'``, samples are
+            taken when a SIGPROF interval timer fires, rather than when
+            functions are called or return. The overhead then depends only
+            on the interval, and loops that don't call functions are sampled
+            properly. Samples measure the profiled thread's CPU time, so time
+            spent sleeping or waiting on IO isn't recorded. That's only
+            available on Unix, on the main thread. Options that ask for a
+            different timer type raise a ValueError.
+        :param all_threads: If True, the profiler samples every thread in
+            the process, from a background thread, rather than just the
+            thread that started it. Each thread appears as a separate root
+            in the profile. In this mode, ``async_mode``,
+            ``use_timing_thread``, ``timer_type`` and
+            ``native_recording`` have no effect.
+        :param use_thread_cputime: If True, samples measure the CPU time
+            used by the profiled thread, rather than wall-clock time, so time
+            spent waiting on IO, locks or sleep isn't counted. The clock is
+            read natively, so this costs no more than the default timer.
+        :param overhead_budget: The fraction of the program's time that
+            taking samples may use, e.g. ``0.02`` for 2%. If set, the time
+            spent taking each sample is measured, and the sampling interval
+            is widened or narrowed while profiling to stay within the budget.
+            It's never narrower than ``interval``. The range of intervals used
+            is recorded in the session's ``min_interval`` and ``max_interval``.
+            Samples recorded natively aren't measured, so this has no effect
+            with ``native_recording`` or ``all_threads``.
+        :param ring_buffer_duration: If set, only the most recent
+            ``ring_buffer_duration`` seconds of samples are kept, and older
+            ones are discarded, so memory use stays constant however long the
+            profiler runs. Use :meth:`snapshot` to get a session of the
+            recent samples without stopping. Samples are recorded in Python
+            in this mode, so ``native_recording`` has no effect.
+        :param ring_buffer_samples: If set, only the most recent
+            ``ring_buffer_samples`` samples are kept. This can be combined
+            with ``ring_buffer_duration``.
+        :param record_timestamps: If True, the wall-clock time of each sample
+            is recorded too, and saved with the session. Then sessions that
+            are combined are merged in time order, rather than one after the
+            other. Samples are recorded in Python in this mode, so
+            ``native_recording`` has no effect.
+        :param use_sys_monitoring: On Python 3.12+, samples can be taken
+            with ``sys.monitoring``, which slows call-heavy code down much
+            less. If None, it's used automatically when the interval is at
+            least the thread switch interval (see
+            :func:`sys.getswitchinterval`), async contexts aren't tracked, and
+            the default timer is used. If True, it's used at any interval,
+            but in CPU-bound code, samples are taken at most once per switch
+            interval. That requires ``async_mode="disabled"``. If False, it's
+            never used.
         """
+        # raise now if the options conflict, rather than in start()
+        resolved_timer_type = resolve_timer_type(
+            timer_type, use_timing_thread=use_timing_thread, use_thread_cputime=use_thread_cputime
+        )
+        if use_sys_monitoring:
+            if async_mode != "disabled":
+                raise ValueError(
+                    "sys.monitoring can't track async contexts, so use_sys_monitoring=True "
+                    "requires async_mode='disabled'."
+                )
+            if native_recording:
+                raise ValueError("use_sys_monitoring=True can't be used with native_recording.")
+            if resolved_timer_type not in (None, "walltime"):
+                raise ValueError(
+                    f"use_sys_monitoring=True can't be used with the {resolved_timer_type!r} timer type."
+                )
+
         self._interval = interval
         self._last_session = None
         self._active_session = None
         self._async_mode = async_mode
         self.use_timing_thread = use_timing_thread
+        self.native_recording = native_recording
+        self.timer_type = timer_type
+        self.all_threads = all_threads
+        self.use_thread_cputime = use_thread_cputime
+        self.overhead_budget = overhead_budget
+        self.ring_buffer_duration = ring_buffer_duration
+        self.ring_buffer_samples = ring_buffer_samples
+        self.record_timestamps = record_timestamps
+        self.use_sys_monitoring = use_sys_monitoring
+        self._all_threads_sampler = None
 
     @property
     def interval(self) -> float:
@@ -111,7 +290,8 @@ class Profiler:
     @property
     def last_session(self) -> Session | None:
         """
-        The previous session recorded by the Profiler.
+        The previous session recorded by the Profiler. If the profiler was
+        restarted, this combines the sessions of every run.
         """
         return self._last_session
 
@@ -148,6 +328,29 @@ class Profiler:
         if self.is_running:
             raise ValueError("Profiler is already running.")
 
+        ring_buffer = None
+        if self.ring_buffer_duration is not None or self.ring_buffer_samples is not None:
+            ring_buffer = FrameRecordsRingBuffer(
+                max_duration=self.ring_buffer_duration,
+                max_samples=self.ring_buffer_samples,
+                record_timestamps=self.record_timestamps,
+            )
+
+        sample_buffer = None
+        if (
+            self.native_recording
+            and not self.all_threads
+            and ring_buffer is None
+            and not self.record_timestamps
+        ):
+            sample_buffer = SampleBuffer(
+                root_frame_info=thread_frame_info(),
+                await_frame_info=AWAIT_FRAME_IDENTIFIER,
+                out_of_context_frame_info=(
+                    OUT_OF_CONTEXT_FRAME_IDENTIFIER if self.async_mode == "strict" else None
+                ),
+            )
+
         try:
             self._active_session = ActiveProfilerSession(
                 start_time=time.time(),
@@ -155,14 +358,33 @@ class Profiler:
                 start_call_stack=build_call_stack(caller_frame, "initial", None),
                 target_description=target_description,
                 interval=self.interval,
+                sample_buffer=sample_buffer,
+                ring_buffer=ring_buffer,
+                record_timestamps=self.record_timestamps,
             )
 
+            if self.all_threads:
+                self._all_threads_sampler = AllThreadsSampler(
+                    target=self._sampler_saw_call_stack,
+                    interval=self.interval,
+                    timer_func=get_stack_sampler().timer_func,
+                )
+                self._all_threads_sampler.start()
+                return
+
             use_async_context = self.async_mode != "disabled"
             get_stack_sampler().subscribe(
                 self._sampler_saw_call_stack,
                 desired_interval=self.interval,
                 use_async_context=use_async_context,
-                use_timing_thread=self.use_timing_thread,
+                timer_type=resolve_timer_type(
+                    self.timer_type,
+                    use_timing_thread=self.use_timing_thread,
+                    use_thread_cputime=self.use_thread_cputime,
+                ),
+                use_sys_monitoring=self.use_sys_monitoring,
+                sample_buffer=sample_buffer,
+                overhead_budget=self.overhead_budget,
             )
         except:
             self._active_session = None
@@ -173,30 +395,138 @@ class Profiler:
         Stops the profiler observing, and sets :attr:`last_session`
         to the captured session.
 
-        :return: The captured session.
+        :return: The captured session. If the profiler was restarted, this
+            includes the previous runs too.
         """
         if not self._active_session:
             raise RuntimeError("This profiler is not currently running.")
 
-        try:
-            get_stack_sampler().unsubscribe(self._sampler_saw_call_stack)
-        except StackSampler.SubscriberNotFound:
-            raise RuntimeError(
-                "Failed to stop profiling. Make sure that you start/stop profiling on the same thread."
-            )
+        min_interval = max_interval = self._active_session.interval
 
-        cpu_time = process_time() - self._active_session.start_process_time
+        all_threads_sampler = self._all_threads_sampler
+        if all_threads_sampler is not None:
+            all_threads_sampler.stop()
+            self._all_threads_sampler = None
+        else:
+            try:
+                subscriber = get_stack_sampler().unsubscribe(self._sampler_saw_call_stack)
+            except StackSampler.SubscriberNotFound:
+                raise RuntimeError(
+                    "Failed to stop profiling. Make sure that you start/stop profiling on the same thread."
+                )
+            min_interval = subscriber.min_interval
+            max_interval = subscriber.max_interval
 
         active_session = self._active_session
         self._active_session = None
 
-        session = Session(
-            frame_records=active_session.frame_records,
-            start_time=active_session.start_time,
-            duration=time.time() - active_session.start_time,
+        session = self._session_from_active_session(
+            active_session,
+            frame_records=active_session.collect_frame_records(),
+            min_interval=min_interval,
+            max_interval=max_interval,
+            group_by_thread=all_threads_sampler is not None,
+        )
+
+        if self._last_session is not None:
+            # include the previous session's data too. The records are
+            # merged when they're first read, and the merge is kept, so
+            # restarting without reading them doesn't copy them each time.
+            session = Session.combine(self._last_session, session)
+
+        self._last_session = session
+
+        return session
+
+    def snapshot(self) -> Session:
+        """
+        Returns a session of the samples recorded so far, without stopping
+        the profiler. With a ring buffer, that's just the samples currently
+        in the buffer. Otherwise, it's everything since :meth:`start`.
+
+        Unlike :meth:`stop`, this doesn't include the previous sessions of a
+        restarted profiler, or change :attr:`last_session`.
+
+        This can be called from any thread, for example to dump what a
+        long-running process has been doing recently.
+        """
+        active_session = self._active_session
+        if not active_session:
+            raise RuntimeError("This profiler is not currently running.")
+
+        return self._session_from_active_session(
+            active_session,
+            frame_records=active_session.collect_frame_records(copy=True),
             min_interval=active_session.interval,
             max_interval=active_session.interval,
-            sample_count=len(active_session.frame_records),
+            group_by_thread=self.all_threads,
+        )
+
+    def flush(self) -> Session:
+        """
+        Returns a session of the samples recorded since :meth:`start`, or
+        since the last flush, and removes them from the profiler, which keeps
+        running. So calling this periodically keeps the profiler's memory use
+        down. See :class:`pyinstrument.segments.SegmentWriter`.
+
+        This can be called from any thread. It isn't available with
+        ``native_recording`` or a ring buffer.
+        """
+        active_session = self._active_session
+        if not active_session:
+            raise RuntimeError("This profiler is not currently running.")
+
+        flush_time = time.time()
+        flush_process_time = process_time()
+
+        session = self._session_from_active_session(
+            active_session,
+            frame_records=active_session.take_frame_records(),
+            min_interval=active_session.interval,
+            max_interval=active_session.interval,
+            group_by_thread=self.all_threads,
+        )
+        # the samples left in the active session are from after this point
+        session.duration = flush_time - session.start_time
+        session.cpu_time = flush_process_time - active_session.start_process_time
+        active_session.start_time = flush_time
+        active_session.start_process_time = flush_process_time
+
+        return session
+
+    def _session_from_active_session(
+        self,
+        active_session: ActiveProfilerSession,
+        frame_records: FrameRecords,
+        min_interval: float,
+        max_interval: float,
+        group_by_thread: bool,
+    ) -> Session:
+        if group_by_thread:
+            # samples from each thread are interleaved. Keep each thread's
+            # samples together, so its timeline is continuous.
+            frame_records = frame_records.grouped_by_root()
+
+        start_time = active_session.start_time
+        duration = time.time() - start_time
+        cpu_time = process_time() - active_session.start_process_time
+
+        if isinstance(active_session.frame_records, FrameRecordsRingBuffer):
+            # the session only covers the samples in the buffer
+            window_duration = min(duration, active_session.frame_records.duration)
+            if duration > 0:
+                # CPU time isn't measured per sample, so estimate it
+                cpu_time *= window_duration / duration
+            start_time += duration - window_duration
+            duration = window_duration
+
+        return Session(
+            frame_records=frame_records,
+            start_time=start_time,
+            duration=duration,
+            min_interval=min_interval,
+            max_interval=max_interval,
+            sample_count=frame_records.sample_count,
             target_description=active_session.target_description,
             start_call_stack=active_session.start_call_stack,
             cpu_time=cpu_time,
@@ -204,14 +534,6 @@ class Profiler:
             sys_prefixes=Session.current_sys_prefixes(),
         )
 
-        if self.last_session is not None:
-            # include the previous session's data too
-            session = Session.combine(self.last_session, session)
-
-        self._last_session = session
-
-        return session
-
     @property
     def is_running(self):
         """
@@ -267,27 +589,17 @@ class Profiler:
             and self._async_mode in ["enabled", "strict"]
         ):
             awaiting_coroutine_stack = async_state.info
-            self._active_session.frame_records.append(
-                (
-                    awaiting_coroutine_stack + [AWAIT_FRAME_IDENTIFIER],
-                    time_since_last_sample,
-                )
-            )
+            call_stack = awaiting_coroutine_stack + [AWAIT_FRAME_IDENTIFIER]
         elif (
             async_state
             and async_state.state == "out_of_context_unknown"
             and self._async_mode == "strict"
         ):
             context_exit_frame = async_state.info
-            self._active_session.frame_records.append(
-                (
-                    context_exit_frame + [OUT_OF_CONTEXT_FRAME_IDENTIFIER],
-                    time_since_last_sample,
-                )
-            )
-        else:
-            # regular sync code
-            self._active_session.frame_records.append((call_stack, time_since_last_sample))
+            call_stack = context_exit_frame + [OUT_OF_CONTEXT_FRAME_IDENTIFIER]
+        # otherwise, it's regular sync code
+
+        self._active_session.record(call_stack, time_since_last_sample)
 
     def print(
         self,
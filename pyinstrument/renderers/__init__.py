@@ -1,5 +1,6 @@
 from pyinstrument.renderers.base import FrameRenderer, Renderer
 from pyinstrument.renderers.console import ConsoleRenderer
+from pyinstrument.renderers.diff import DiffConsoleRenderer, DiffHTMLRenderer, DiffRenderer
 from pyinstrument.renderers.html import HTMLRenderer
 from pyinstrument.renderers.jsonrenderer import JSONRenderer
 from pyinstrument.renderers.pstatsrenderer import PstatsRenderer
@@ -8,6 +9,9 @@ from pyinstrument.renderers.speedscope import SpeedscopeRenderer
 
 __all__ = [
     "ConsoleRenderer",
+    "DiffConsoleRenderer",
+    "DiffHTMLRenderer",
+    "DiffRenderer",
     "FrameRenderer",
     "HTMLRenderer",
     "JSONRenderer",
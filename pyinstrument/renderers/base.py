@@ -109,10 +109,9 @@ class FrameRenderer(Renderer):
         raise NotImplementedError()
 
     def preprocess(self, root_frame: Frame | None) -> Frame | None:
-        frame = root_frame
-        for processor in self.processors:
-            frame = processor(frame, options=self.processor_options)
-        return frame
+        return processors.run_processors(
+            root_frame, self.processors, options=self.processor_options
+        )
 
     def render(self, session: Session) -> str:
         """
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import html
+
+from pyinstrument.diff import DiffNode, SessionDiff
+from pyinstrument.renderers.console import ConsoleRenderer
+
+# pyright: strict
+
+
+class DiffRenderer:
+    """
+    Abstract base class for renderers of a :class:`pyinstrument.diff.SessionDiff`.
+
+    Only call stacks whose time changed by at least ``min_fraction`` of the
+    larger session's total time are shown, along with their callers.
+    """
+
+    output_file_extension: str = "txt"
+
+    def __init__(self, min_fraction: float = 0.01):
+        self.min_fraction = min_fraction
+
+    def render(self, diff: SessionDiff) -> str:
+        raise NotImplementedError()
+
+    def visible_children(self, diff: SessionDiff) -> dict[DiffNode, list[DiffNode]]:
+        """
+        Returns the nodes to show, as a map from each shown node (and the
+        root) to its shown children, biggest regressions first.
+        """
+        threshold = self.min_fraction * max(diff.baseline_total, diff.candidate_total)
+        visible: dict[DiffNode, list[DiffNode]] = {}
+
+        # children come after their parents, so walking backwards decides
+        # every child before its parent
+        for node in reversed(list(diff.nodes())):
+            if node in visible or abs(node.delta) >= threshold:
+                visible.setdefault(node, [])
+                assert node.parent is not None
+                visible.setdefault(node.parent, []).append(node)
+
+        for children in visible.values():
+            children.sort(key=lambda node: node.delta, reverse=True)
+
+        visible.setdefault(diff.root, [])
+        return visible
+
+
+class DiffConsoleRenderer(DiffRenderer):
+    """
+    Renders a diff as a tree of call stacks in the terminal, with the change
+    in time of each. Regressions are red and improvements green.
+    """
+
+    def __init__(self, min_fraction: float = 0.01, unicode: bool = False, color: bool = False):
+        super().__init__(min_fraction=min_fraction)
+        self.unicode = unicode
+        self.colors = ConsoleRenderer.colors_enabled if color else ConsoleRenderer.colors_disabled
+
+    def render(self, diff: SessionDiff) -> str:
+        baseline = _describe_session_total(diff.baseline_total, diff.baseline.target_description)
+        candidate = _describe_session_total(diff.candidate_total, diff.candidate.target_description)
+        change = self._delta_str(diff.candidate_total - diff.baseline_total)
+        percent_change = _percent_change(diff.baseline_total, diff.candidate_total)
+
+        lines = [
+            "",
+            f"  Baseline:  {baseline}",
+            f"  Candidate: {candidate}",
+            f"  Change:    {change} {percent_change}",
+            "",
+        ]
+
+        visible = self.visible_children(diff)
+        if not visible[diff.root]:
+            lines.append("No significant changes.")
+        else:
+            if self.unicode:
+                branch, last_branch, pipe = "├─ ", "└─ ", "│  "
+            else:
+                branch, last_branch, pipe = "|- ", "`- ", "|  "
+
+            pending: list[tuple[DiffNode, str, str]] = [
+                (node, "", "") for node in reversed(visible[diff.root])
+            ]
+            while pending:
+                node, indent, child_indent = pending.pop()
+                lines.append(indent + self._node_description(diff, node))
+
+                children = visible[node]
+                for i, child in reversed(list(enumerate(children))):
+                    if i == len(children) - 1:
+                        pending.append((child, child_indent + last_branch, child_indent + "   "))
+                    else:
+                        pending.append((child, child_indent + branch, child_indent + pipe))
+
+        lines.append("")
+        return "\n".join(lines) + "\n"
+
+    def _node_description(self, diff: SessionDiff, node: DiffNode) -> str:
+        arrow = "→" if self.unicode else "->"
+        times = f"{node.baseline_time:.3f} {arrow} {node.candidate_time:.3f}"
+        normalised = f"{diff.normalised_delta(node) * 100:+.1f}pp"
+        location = _location(diff, node)
+
+        faint, end = self.colors.faint, self.colors.end
+
+        return (
+            f"{self._delta_str(node.delta)} {faint}({normalised}, {times}){end}"
+            f" {node.function}  {faint}{location}{end}"
+        )
+
+    def _delta_str(self, delta: float) -> str:
+        if delta > 0:
+            color = self.colors.red
+        elif delta < 0:
+            color = self.colors.green
+        else:
+            color = ""
+        return f"{color}{delta:+.3f}{self.colors.end}"
+
+
+class DiffHTMLRenderer(DiffRenderer):
+    """
+    Renders a diff as a standalone HTML page, with a collapsible tree of call
+    stacks. Regressions are highlighted in red and improvements in green,
+    more strongly for bigger changes.
+    """
+
+    output_file_extension: str = "html"
+
+    def render(self, diff: SessionDiff) -> str:
+        visible = self.visible_children(diff)
+        largest_change = max((abs(node.delta) for node in visible), default=0.0) or 1.0
+
+        def node_summary(node: DiffNode) -> str:
+            intensity = min(abs(node.delta) / largest_change, 1.0)
+            color = "220, 50, 47" if node.delta > 0 else "40, 160, 60"
+            return (
+                f'<span class="delta" style="background: rgba({color}, {intensity * 0.6:.2f})">'
+                f"{node.delta:+.3f}s</span> "
+                f'<span class="detail">({diff.normalised_delta(node) * 100:+.1f}pp, '
+                f"{node.baseline_time:.3f}s &rarr; {node.candidate_time:.3f}s)</span> "
+                f'<span class="function">{html.escape(node.function)}</span> '
+                f'<span class="location">{html.escape(_location(diff, node))}</span>'
+            )
+
+        parts: list[str] = ["<ul>"]
+        # items are nodes to render, or closing tags to write once a node's
+        # children are done
+        pending: list[DiffNode | str] = ["</ul>", *reversed(visible[diff.root])]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+
+            children = visible[item]
+            if children:
+                parts.append(f"<li><details open><summary>{node_summary(item)}</summary><ul>")
+                pending.append("</ul></details></li>")
+                pending.extend(reversed(children))
+            else:
+                parts.append(f'<li class="leaf">{node_summary(item)}</li>')
+
+        if not visible[diff.root]:
+            parts = ["<p>No significant changes.</p>"]
+
+        change = diff.candidate_total - diff.baseline_total
+        baseline = _describe_session_total(diff.baseline_total, diff.baseline.target_description)
+        candidate = _describe_session_total(diff.candidate_total, diff.candidate.target_description)
+
+        return HTML_TEMPLATE.format(
+            baseline=html.escape(baseline),
+            candidate=html.escape(candidate),
+            change=f"{change:+.3f}s {_percent_change(diff.baseline_total, diff.candidate_total)}",
+            tree="".join(parts),
+        )
+
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>pyinstrument diff</title>
+<style>
+body {{ font-family: -apple-system, BlinkMacSystemFont, sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin-bottom: 1.5em; }}
+th {{ text-align: left; padding-right: 1em; }}
+ul {{ list-style: none; padding-left: 1.4em; margin: 0; font-family: monospace; }}
+li.leaf {{ padding-left: 1.1em; }}
+summary {{ cursor: pointer; }}
+.delta {{ display: inline-block; min-width: 6em; text-align: right; padding: 0 0.3em; }}
+.detail, .location {{ color: #888; }}
+</style>
+</head>
+<body>
+<table>
+<tr><th>Baseline</th><td>{baseline}</td></tr>
+<tr><th>Candidate</th><td>{candidate}</td></tr>
+<tr><th>Change</th><td>{change}</td></tr>
+</table>
+{tree}
+</body>
+</html>
+"""
+
+
+def _describe_session_total(total: float, target_description: str) -> str:
+    return f"{total:.3f}s  {target_description}"
+
+
+def _percent_change(baseline: float, candidate: float) -> str:
+    if baseline == 0:
+        return ""
+    return f"({(candidate - baseline) / baseline * 100:+.1f}%)"
+
+
+def _location(diff: SessionDiff, node: DiffNode) -> str:
+    file_path = node.file_path
+    if not file_path:
+        return ""
+    file_path = diff.candidate.shorten_path(file_path)
+    if node.line_no:
+        return f"{file_path}:{node.line_no}"
+    return file_path
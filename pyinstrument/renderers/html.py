@@ -79,11 +79,8 @@ class HTMLRenderer(Renderer):
                 resample_interval = session.duration / 10000
 
             if resample_interval > 0:
-                session = original_session.resample(interval=resample_interval)
-
-                while len(session.frame_records) > 100_000:
-                    resample_interval *= 2
-                    session = original_session.resample(interval=resample_interval)
+                session = original_session.resample(interval=resample_interval, max_samples=100_000)
+                resample_interval = session.min_interval
                 print(
                     f"pyinstrument: session has {len(original_session.frame_records)} samples, which is too many for the HTML renderer to handle. Resampled to {len(session.frame_records)} samples with interval {resample_interval:.6f} seconds. Set the renderer option resample_interval to control this behaviour.",
                     file=sys.stderr,
@@ -1,7 +1,9 @@
-import json
+import io
+from typing import TextIO
 
 from pyinstrument.renderers.base import Renderer
 from pyinstrument.session import Session
+from pyinstrument.typing import PathOrStr
 
 
 class SessionRenderer(Renderer):
@@ -12,4 +14,20 @@ class SessionRenderer(Renderer):
         self.tree_format = tree_format
 
     def render(self, session: Session) -> str:
-        return json.dumps(session.to_json())
+        f = io.StringIO()
+        self.write(session, f)
+        return f.getvalue()
+
+    def write(self, session: Session, file: TextIO) -> None:
+        """
+        Writes the session to ``file``, without building the whole output in
+        memory first.
+        """
+        session.write_json(file)
+
+    def save(self, session: Session, filename: PathOrStr) -> None:
+        """
+        Saves the session to ``filename``, compressed if its extension is
+        ``.gz``, ``.xz`` or ``.lzma``.
+        """
+        session.save(filename, format="json")
@@ -0,0 +1,167 @@
+"""
+Resampling of frame records to a coarser interval, to reduce the number of
+records in a large session.
+
+A record is kept when the running total of record times reaches the next
+multiple of the interval. It takes all the time since the previous kept
+record, so the total time is preserved, apart from any records after the
+last one kept.
+
+If the records have counts (see :meth:`FrameRecords.add_sample`), a record
+can span several multiples of the interval. Each kept record then counts as
+the number of multiples it reached past the previous one - the number of
+samples it stands for at the new interval.
+
+If NumPy is installed, it's used to do this on whole columns at once, which
+is much faster for large sessions. Otherwise, it's done in pure Python. Both
+give exactly the same result.
+"""
+
+from __future__ import annotations
+
+import itertools
+from array import array
+from typing import Any
+
+from pyinstrument.frame_records import FrameRecords
+
+# pyright: strict
+
+
+def _import_numpy() -> Any:
+    """
+    Returns the numpy module, or None if it isn't installed. It's typed as
+    Any, so the NumPy code is checked at the boundaries of the helpers
+    below - NumPy's own stubs aren't complete in strict mode.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+numpy: Any = _import_numpy()
+
+
+def resample(frame_records: FrameRecords, interval: float) -> FrameRecords:
+    """
+    Returns the records resampled to ``interval``, sharing the stack trie.
+    """
+    if len(frame_records) == 0:
+        return FrameRecords(stack_trie=frame_records.stack_trie)
+
+    if numpy is not None:
+        return _resample_numpy(frame_records, interval)
+
+    result = FrameRecords(
+        stack_trie=frame_records.stack_trie,
+        timestamps=array("d") if frame_records.timestamps is not None else None,
+        counts=array("I") if frame_records.counts is not None else None,
+    )
+    timestamps = frame_records.timestamps
+    has_counts = frame_records.counts is not None
+    previous_multiple = 0
+    previous_end = 0.0
+
+    for index, (stack_id, end) in enumerate(
+        zip(frame_records.stack_ids, itertools.accumulate(frame_records.times))
+    ):
+        multiple = int(end / interval)
+        if multiple != previous_multiple:
+            result.record_stack_id(
+                stack_id,
+                end - previous_end,
+                timestamps[index] if timestamps is not None else None,
+                count=multiple - previous_multiple if has_counts else 1,
+            )
+            previous_multiple = multiple
+            previous_end = end
+
+    return result
+
+
+def interval_for_count(frame_records: FrameRecords, interval: float, max_count: int) -> float:
+    """
+    Returns the smallest of ``interval``, ``interval * 2``, ``interval * 4``,
+    and so on, that resamples the records to at most ``max_count`` records.
+
+    This is worked out in one pass. A record is kept at ``interval * 2**k``
+    when its running total, in whole multiples of ``interval``, differs from
+    the previous record's above its lowest ``k`` bits - i.e. when the
+    bit length of the two multiples XORed is more than ``k``. So counting the
+    records by that bit length gives the number kept at every ``k``.
+    """
+    if len(frame_records) == 0:
+        return interval
+
+    if numpy is not None:
+        bit_length_counts = _bit_length_counts_numpy(frame_records, interval)
+    else:
+        bit_length_counts = [0] * 65
+        previous_multiple = 0
+        for end in itertools.accumulate(frame_records.times):
+            multiple = int(end / interval)
+            bit_length_counts[(multiple ^ previous_multiple).bit_length()] += 1
+            previous_multiple = multiple
+
+    # records with a bit length of 0 are never kept
+    kept_count = sum(bit_length_counts[1:])
+    k = 0
+    while kept_count > max_count and k < len(bit_length_counts) - 1:
+        k += 1
+        kept_count -= bit_length_counts[k]
+
+    return interval * 2**k
+
+
+def _resample_numpy(frame_records: FrameRecords, interval: float) -> FrameRecords:
+    assert numpy is not None
+    np = numpy
+
+    ends = np.cumsum(_as_numpy(frame_records.times))
+    multiples = np.floor(ends / interval).astype(np.int64)
+    kept = np.flatnonzero(multiples != np.concatenate(([0], multiples[:-1])))
+
+    kept_ends = ends[kept]
+    previous_ends = np.concatenate(([0.0], kept_ends[:-1]))
+
+    timestamps = frame_records.timestamps
+    counts = None
+    if frame_records.counts is not None:
+        counts = _to_array("I", np.diff(multiples[kept], prepend=0))
+
+    return FrameRecords(
+        stack_trie=frame_records.stack_trie,
+        stack_ids=_to_array("I", _as_numpy(frame_records.stack_ids)[kept]),
+        times=_to_array("d", kept_ends - previous_ends),
+        timestamps=(
+            _to_array("d", _as_numpy(timestamps)[kept]) if timestamps is not None else None
+        ),
+        counts=counts,
+    )
+
+
+def _bit_length_counts_numpy(frame_records: FrameRecords, interval: float) -> list[int]:
+    assert numpy is not None
+    np = numpy
+
+    ends = np.cumsum(_as_numpy(frame_records.times))
+    multiples = np.floor(ends / interval).astype(np.int64)
+    changed_bits = np.bitwise_xor(multiples, np.concatenate(([0], multiples[:-1])))
+    # frexp gives the exponent e where x = m * 2**e and 0.5 <= m < 1, which
+    # is the bit length, for integers that a float represents exactly
+    _, bit_lengths = np.frexp(changed_bits.astype(np.float64))
+
+    return [int(count) for count in np.bincount(bit_lengths, minlength=65)]
+
+
+def _as_numpy(column: array[Any]) -> Any:
+    # the columns support the buffer protocol, so this doesn't copy them
+    assert numpy is not None
+    return numpy.frombuffer(column, dtype=memoryview(column).format)
+
+
+def _to_array(typecode: str, values: Any) -> array[Any]:
+    assert numpy is not None
+    return array(typecode, numpy.ascontiguousarray(values, dtype=typecode).tobytes())
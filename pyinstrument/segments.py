@@ -0,0 +1,166 @@
+"""
+Continuous profiling to disk. A :class:`SegmentWriter` periodically takes the
+samples from a running :class:`pyinstrument.Profiler` and writes them to
+rotating segment files, and :func:`read_segments` combines them back into a
+:class:`pyinstrument.session.Session`.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pyinstrument.session import Session
+from pyinstrument.typing import PathOrStr
+
+if TYPE_CHECKING:
+    from pyinstrument.profiler import Profiler
+
+# pyright: strict
+
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".pyisession"
+
+
+class SegmentWriter:
+    """
+    Writes the samples of a running profiler to segment files in
+    ``directory``, every ``flush_interval`` seconds. Each segment is a
+    complete session file, covering the time since the previous one.
+
+    Segments are written from a background thread, so the profiled thread
+    never waits for the disk. Once flushed, samples are removed from the
+    profiler, so its memory use doesn't grow.
+
+    If ``max_total_bytes`` is set, the oldest segments are deleted when the
+    segments in the directory would take up more than that.
+
+    .. code-block:: python
+
+        profiler = Profiler()
+        profiler.start()
+
+        with SegmentWriter(profiler, "profiles", flush_interval=60):
+            run_server()
+
+        profiler.stop()
+        session = read_segments("profiles")
+    """
+
+    def __init__(
+        self,
+        profiler: Profiler,
+        directory: PathOrStr,
+        flush_interval: float = 60.0,
+        max_total_bytes: int | None = None,
+    ) -> None:
+        self.profiler = profiler
+        self.directory = Path(directory)
+        self.flush_interval = flush_interval
+        self.max_total_bytes = max_total_bytes
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._flush_lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts writing segments in the background.
+        """
+        if self._thread is not None:
+            raise RuntimeError("This SegmentWriter is already running.")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pyinstrument-segment-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops writing segments, after writing the samples recorded so far.
+        """
+        if self._thread is None:
+            raise RuntimeError("This SegmentWriter is not running.")
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args: object):
+        self.stop()
+
+    def flush(self) -> Path | None:
+        """
+        Writes the samples recorded since the last segment to a new segment
+        file, and returns its path. Returns None if the profiler isn't running
+        or there's nothing to write.
+        """
+        with self._flush_lock:
+            if not self.profiler.is_running:
+                return None
+
+            session = self.profiler.flush()
+            if session.sample_count == 0:
+                return None
+
+            path = self.directory / (
+                f"{SEGMENT_PREFIX}{session.start_time:020.6f}-{os.getpid()}{SEGMENT_SUFFIX}"
+            )
+            # write to a temporary file first, so readers never see a
+            # partially-written segment
+            temp_path = path.with_name(path.name + ".tmp")
+            session.save(temp_path, format="binary")
+            os.replace(temp_path, path)
+
+            self._enforce_retention()
+            return path
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def _enforce_retention(self):
+        if self.max_total_bytes is None:
+            return
+
+        paths = segment_paths(self.directory)
+        sizes = [path.stat().st_size for path in paths]
+        total_bytes = sum(sizes)
+
+        for path, size in zip(paths, sizes):
+            if total_bytes <= self.max_total_bytes:
+                break
+            path.unlink()
+            total_bytes -= size
+
+
+def segment_paths(directory: PathOrStr) -> list[Path]:
+    """
+    Returns the paths of the segment files in ``directory``, oldest first.
+    """
+    return sorted(
+        path
+        for path in Path(directory).iterdir()
+        if path.name.startswith(SEGMENT_PREFIX) and path.name.endswith(SEGMENT_SUFFIX)
+    )
+
+
+def read_segments(directory: PathOrStr) -> Session:
+    """
+    Loads the segment files in ``directory``, and combines them into one
+    session.
+    """
+    paths = segment_paths(directory)
+    if not paths:
+        raise ValueError(f"No segments found in {directory}")
+
+    return Session.combine_many([Session.load(path) for path in paths])
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import bisect
+import io
+import itertools
 import json
-import os
+import mmap
 import sys
 from collections import deque
-from typing import Any, Sequence
-
-from pyinstrument.frame import Frame
-from pyinstrument.frame_info import frame_info_get_identifier
-from pyinstrument.frame_ops import FrameRecordType, build_frame_tree
-from pyinstrument.typing import PathOrStr
+from typing import Any, Iterable, Sequence, TextIO
+
+from pyinstrument import resampling, session_format
+from pyinstrument.diff import SessionDiff
+from pyinstrument.frame import THREAD_FILE_PATH, Frame
+from pyinstrument.frame_info import IDENTIFIER_SEP, FrameInfoCache, frame_info_get_identifier
+from pyinstrument.frame_ops import build_frame_tree
+from pyinstrument.frame_records import (
+    ROOT_NODE_ID,
+    FrameRecords,
+    FrameRecordType,
+    MergedFrameRecords,
+    StackTrie,
+)
+from pyinstrument.function_index import FunctionIndex
+from pyinstrument.path_shortening import SysPathIndex
+from pyinstrument.typing import LiteralStr, PathOrStr
 
 # pyright: strict
 
@@ -21,9 +35,11 @@ ASSERTION_MESSAGE = (
 
 
 class Session:
+    frame_records: FrameRecords
+
     def __init__(
         self,
-        frame_records: list[FrameRecordType],
+        frame_records: Sequence[FrameRecordType],
         start_time: float,
         duration: float,
         min_interval: float,
@@ -41,7 +57,7 @@ class Session:
 
         :meta private:
         """
-        self.frame_records = frame_records
+        self.frame_records = FrameRecords.from_list(frame_records)
         self.start_time = start_time
         self.duration = duration
         self.min_interval = min_interval
@@ -53,26 +69,80 @@ class Session:
         self.sys_path = sys_path
         self.sys_prefixes = sys_prefixes
         self._short_file_path_cache = {}
+        self._sys_path_index = None
+        self._function_index: FunctionIndex | None = None
+        # kept between calls to root_frame(), which renderers make each time
+        self._frame_info_cache = FrameInfoCache()
 
     @staticmethod
-    def load(filename: PathOrStr) -> Session:
+    def load(filename: PathOrStr, lazy: bool = False) -> Session:
         """
-        Load a previously saved session from disk.
+        Load a previously saved session from disk. Both the binary and JSON
+        formats are supported - the format is detected from the file's
+        contents. Files with a ``.gz``, ``.xz`` or ``.lzma`` extension are
+        decompressed as they're read.
 
         :param filename: The path to load from.
+        :param lazy: If True, and the file is in the binary format, it's
+            memory-mapped instead of read, and the frame records are decoded
+            as they're accessed. This makes loading a large session almost
+            instant, and operations that only look at part of it only read
+            that part from disk. The file shouldn't be modified while the
+            session is in use. Compressed files can't be mapped, so they're
+            read as normal.
         :rtype: Session
         """
-        with open(filename) as f:
-            return Session.from_json(json.load(f))
-
-    def save(self, filename: PathOrStr) -> None:
+        with session_format.open_file(filename, "rb") as f:
+            is_binary = session_format.is_binary_session(f.read(len(session_format.MAGIC)))
+
+            if is_binary and lazy and not session_format.is_compressed_path(filename):
+                # the map stays open for as long as the records refer to it
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                return Session.from_binary(data, lazy=True)
+
+            f.seek(0)
+            if is_binary:
+                metadata, frame_records = session_format.read(f)
+                return Session.from_json({**metadata, "frame_records": frame_records})
+            else:
+                return Session.from_json(json.load(f))
+
+    def save(self, filename: PathOrStr, format: LiteralStr["binary", "json"] = "json") -> None:
         """
-        Saves a Session object to disk, in a JSON format.
+        Saves a Session object to disk. The session is streamed to the file,
+        so this doesn't need much more memory than the session itself.
 
         :param filename: The path to save to. Using the ``.pyisession`` extension is recommended.
+            If it ends with ``.gz``, ``.xz`` or ``.lzma``, the file is
+            compressed, e.g. ``profile.pyisession.gz``.
+        :param format: ``json`` (the default) can be read by other tools,
+            and by older versions of pyinstrument. ``binary`` is much more
+            compact and faster to load. :meth:`load` reads either.
+        """
+        with session_format.open_file(filename, "wb") as f:
+            if format == "json":
+                with io.TextIOWrapper(f, encoding="utf-8") as text_file:
+                    self.write_json(text_file)
+            else:
+                session_format.write(
+                    f, self.to_json(include_frame_records=False), self.frame_records
+                )
+
+    def to_binary(self) -> bytes:
+        """
+        Returns the session in the binary format used by :meth:`save`.
+        """
+        return session_format.encode(self.to_json(include_frame_records=False), self.frame_records)
+
+    @staticmethod
+    def from_binary(data: bytes | memoryview | mmap.mmap, lazy: bool = False) -> Session:
+        """
+        Creates a session from data in the binary format. If ``lazy`` is
+        True, the session's frame records are views of ``data``, rather than
+        copies.
         """
-        with open(filename, "w") as f:
-            json.dump(self.to_json(), f)
+        metadata, frame_records = session_format.decode(data, lazy=lazy)
+        return Session.from_json({**metadata, "frame_records": frame_records})
 
     def to_json(self, include_frame_records: bool = True):
         result: dict[str, Any] = {
@@ -89,14 +159,42 @@ class Session:
         }
 
         if include_frame_records:
-            result["frame_records"] = self.frame_records
+            result["frame_records"] = list(self.frame_records)
+            if self.frame_records.timestamps is not None:
+                result["frame_record_timestamps"] = list(self.frame_records.timestamps)
+            if self.frame_records.counts is not None:
+                result["frame_record_counts"] = list(self.frame_records.counts)
 
         return result
 
+    def write_json(self, file: TextIO) -> None:
+        """
+        Writes the session to ``file`` as the JSON document returned by
+        :meth:`to_json`. The frame records are written in batches, rather than
+        building the whole document in memory first.
+        """
+        metadata = json.dumps(self.to_json(include_frame_records=False))
+        assert metadata.endswith("}"), ASSERTION_MESSAGE
+
+        file.write(metadata[:-1])
+        file.write(', "frame_records": ')
+        _write_json_list(file, self.frame_records)
+        if self.frame_records.timestamps is not None:
+            file.write(', "frame_record_timestamps": ')
+            _write_json_list(file, self.frame_records.timestamps)
+        if self.frame_records.counts is not None:
+            file.write(', "frame_record_counts": ')
+            _write_json_list(file, self.frame_records.counts)
+        file.write("}")
+
     @staticmethod
     def from_json(json_dict: dict[str, Any]):
         return Session(
-            frame_records=json_dict["frame_records"],
+            frame_records=FrameRecords.from_list(
+                json_dict["frame_records"],
+                timestamps=json_dict.get("frame_record_timestamps"),
+                counts=json_dict.get("frame_record_counts"),
+            ),
             start_time=json_dict["start_time"],
             min_interval=json_dict.get("min_interval", 0.001),
             max_interval=json_dict.get("max_interval", 0.001),
@@ -112,34 +210,61 @@ class Session:
     @staticmethod
     def combine(session1: Session, session2: Session) -> Session:
         """
-        Combines two :class:`Session` objects.
+        Combines two :class:`Session` objects. See :meth:`combine_many`.
 
-        Sessions that are joined in this way probably shouldn't be interpreted
-        as timelines, because the samples are simply concatenated. But
-        aggregate views (the default) of this data will work.
+        :rtype: Session
+        """
+        return Session.combine_many([session1, session2])
+
+    @staticmethod
+    def combine_many(sessions: Sequence[Session]) -> Session:
+        """
+        Combines any number of :class:`Session` objects into one.
+
+        If all the sessions have timestamps, the records are merged in time
+        order, so the result can be viewed as a timeline. Otherwise, the
+        samples are simply concatenated, in order of each session's start
+        time, so the result probably shouldn't be interpreted as a timeline.
+        But aggregate views (the default) of this data will work.
+
+        The records are merged when they're first used, so combining sessions
+        one after another doesn't copy the records each time.
 
         :rtype: Session
         """
-        if session1.start_time > session2.start_time:
-            # swap them around so that session1 is the first one
-            session1, session2 = session2, session1
+        if len(sessions) == 0:
+            raise ValueError("At least one session is required.")
+
+        sessions = sorted(sessions, key=lambda s: s.start_time)
+        first = sessions[0]
 
         return Session(
-            frame_records=session1.frame_records + session2.frame_records,
-            start_time=session1.start_time,
-            min_interval=min(session1.min_interval, session2.min_interval),
-            max_interval=max(session1.max_interval, session2.max_interval),
-            duration=session1.duration + session2.duration,
-            sample_count=session1.sample_count + session2.sample_count,
-            start_call_stack=session1.start_call_stack,
-            target_description=session1.target_description,
-            cpu_time=session1.cpu_time + session2.cpu_time,
-            sys_path=(
-                session1.sys_path + [p for p in session2.sys_path if p not in session1.sys_path]
-            ),
-            sys_prefixes=list(set([*session1.sys_prefixes, *session2.sys_prefixes])),
+            frame_records=MergedFrameRecords(s.frame_records for s in sessions),
+            start_time=first.start_time,
+            min_interval=min(s.min_interval for s in sessions),
+            max_interval=max(s.max_interval for s in sessions),
+            duration=sum(s.duration for s in sessions),
+            sample_count=sum(s.sample_count for s in sessions),
+            start_call_stack=first.start_call_stack,
+            target_description=first.target_description,
+            cpu_time=sum(s.cpu_time for s in sessions),
+            # unique entries, in the order they first appear
+            sys_path=list(dict.fromkeys(p for s in sessions for p in s.sys_path)),
+            sys_prefixes=list(dict.fromkeys(p for s in sessions for p in s.sys_prefixes)),
         )
 
+    @staticmethod
+    def diff(
+        baseline: Session, candidate: Session, ignore_line_numbers: bool = True
+    ) -> SessionDiff:
+        """
+        Compares two sessions, matching their call stacks, to show which got
+        slower or faster. See :class:`pyinstrument.diff.SessionDiff`.
+
+        :rtype: SessionDiff
+        """
+        return SessionDiff(baseline, candidate, ignore_line_numbers=ignore_line_numbers)
+
     @staticmethod
     def current_sys_prefixes() -> list[str]:
         return [sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix]
@@ -152,7 +277,9 @@ class Session:
 
         :rtype: A :class:`Frame` object, or None if the session is empty.
         """
-        root_frame = build_frame_tree(self.frame_records, context=self)
+        root_frame = build_frame_tree(
+            self.frame_records, context=self, frame_info_cache=self._frame_info_cache
+        )
 
         if root_frame is None:
             return None
@@ -182,7 +309,128 @@ class Session:
         frame.remove_from_parent()
         return frame
 
+    @property
+    def function_index(self) -> FunctionIndex:
+        """
+        An index of the functions in this session, for querying the time
+        spent in a function without building a frame tree. It's built the
+        first time it's used.
+
+        .. code-block:: python
+
+            index = session.function_index
+            for identifier in index.find("execute", file_path_contains="psycopg2"):
+                print(index.inclusive_time(identifier))
+
+        :rtype: FunctionIndex
+        """
+        index = self._function_index
+        if index is None or not index.is_valid_for(self.frame_records):
+            index = self._function_index = FunctionIndex(self.frame_records)
+        return index
+
+    def filter_by_function(self, identifier: str) -> Session:
+        """
+        Returns a session with only the samples whose call stack contains the
+        function with frame identifier ``identifier``. Other attributes, like
+        the duration, are unchanged.
+
+        :rtype: Session
+        """
+        frame_records = self.function_index.filtered_records(identifier)
+
+        return Session(
+            frame_records=frame_records,
+            start_time=self.start_time,
+            duration=self.duration,
+            min_interval=self.min_interval,
+            max_interval=self.max_interval,
+            sample_count=frame_records.sample_count,
+            start_call_stack=self.start_call_stack,
+            target_description=self.target_description,
+            cpu_time=self.cpu_time,
+            sys_path=self.sys_path,
+            sys_prefixes=self.sys_prefixes,
+        )
+
+    def slice(
+        self,
+        start: float | None = None,
+        end: float | None = None,
+        threads: Iterable[str | int] | None = None,
+    ) -> Session:
+        """
+        Returns a session with only the samples taken between ``start`` and
+        ``end``, in seconds since the session started, and, if ``threads`` is
+        passed, only the samples from those threads. Threads can be given by
+        name or ident.
+
+        A time range is a view of this session's records, so it's cheap even
+        for a large session. While it exists, records can't be added to this
+        session. With the samples of several threads, e.g. from an
+        ``all_threads`` profile, or when choosing threads, the matching
+        records are copied instead.
+
+        If the records have timestamps, they're used to find the range.
+        Otherwise, the sample times are added up from the start - per
+        thread, if the session has the samples of several threads.
+
+        :rtype: Session
+        """
+        records = self.frame_records
+        start = max(start if start is not None else 0.0, 0.0)
+        end = min(end if end is not None else self.duration, self.duration)
+        end = max(end, start)
+        # include samples at the very end, and any that overrun the duration
+        # due to timer differences
+        include_end = end >= self.duration
+
+        if threads is not None:
+            records = records.select(_thread_record_indexes(records, set(threads)))
+
+        if len(_thread_root_ids(records.stack_trie)) > 1:
+            # each thread's samples cover the whole session, so their
+            # offsets are found separately. Every profile has a thread frame
+            # at the root, so this is only needed for several threads.
+            indexes = [
+                index
+                for index, offset in enumerate(_thread_offsets(records, self.start_time))
+                if start <= offset and (include_end or offset < end)
+            ]
+            records = records.select(indexes)
+        else:
+            if records.timestamps is not None:
+                timestamps = records.timestamps
+                first = bisect.bisect_left(timestamps, self.start_time + start)
+                last = bisect.bisect_left(timestamps, self.start_time + end, lo=first)
+            else:
+                # the offset of each sample is the end of its time
+                offsets = list(itertools.accumulate(records.times))
+                first = bisect.bisect_left(offsets, start)
+                last = bisect.bisect_left(offsets, end, lo=first)
+            if include_end:
+                last = len(records)
+            records = records.view(first, last)
+
+        duration = end - start
+        cpu_time = self.cpu_time * duration / self.duration if self.duration > 0 else 0.0
+
+        return Session(
+            frame_records=records,
+            start_time=self.start_time + start,
+            duration=duration,
+            min_interval=self.min_interval,
+            max_interval=self.max_interval,
+            sample_count=records.sample_count,
+            start_call_stack=self.start_call_stack,
+            target_description=self.target_description,
+            cpu_time=cpu_time,
+            sys_path=self.sys_path,
+            sys_prefixes=self.sys_prefixes,
+        )
+
     _short_file_path_cache: dict[str, str]
+    _sys_path_index: SysPathIndex | None
 
     def shorten_path(self, path: str) -> str:
         """
@@ -192,24 +440,10 @@ class Session:
         if path in self._short_file_path_cache:
             return self._short_file_path_cache[path]
 
-        result = path
-        # if os.sep doesn't appear, probably not a file path at all, more
-        # likely <built-in> or similar
-        if len(path.split(os.sep)) > 1:
-            for sys_path_entry in self.sys_path:
-                # On Windows, if path and sys_path_entry are on
-                # different drives, relpath will result in exception,
-                # because it cannot compute a relpath in this case.
-                # The root cause is that on Windows, there is no root
-                # dir like '/' on Linux.
-                try:
-                    candidate = os.path.relpath(path, sys_path_entry)
-                except ValueError:
-                    continue
-
-                if not result or (len(candidate.split(os.sep)) < len(result.split(os.sep))):
-                    result = candidate
+        if self._sys_path_index is None:
+            self._sys_path_index = SysPathIndex(self.sys_path)
 
+        result = self._sys_path_index.shorten(path)
         self._short_file_path_cache[path] = result
 
         return result
@@ -217,29 +451,26 @@ class Session:
     @staticmethod
     def _resample_frame_records(
         frame_records: Sequence[FrameRecordType], interval: float
-    ) -> list[FrameRecordType]:
+    ) -> FrameRecords:
         """
         Resample frame records to a given interval. Discards samples as needed.
         """
-        result: list[FrameRecordType] = []
-        accumulated_time = 0.0
+        return resampling.resample(FrameRecords.from_list(frame_records), interval)
 
-        for frame_info_stack, time in frame_records:
-            accumulated_time += time
-
-            if accumulated_time >= interval:
-                result.append((frame_info_stack, accumulated_time))
-                accumulated_time = accumulated_time % interval
-
-        return result
-
-    def resample(self, interval: float) -> Session:
+    def resample(self, interval: float, max_samples: int | None = None) -> Session:
         """
         Returns a new Session object with frame records resampled to the given interval.
 
         :param interval: The desired sampling interval in seconds.
+        :param max_samples: If set, the interval is doubled as many times as
+            needed to keep at most this many samples. The interval used is
+            the ``min_interval`` of the result. This is worked out in one
+            pass over the records, without trying each interval.
         :rtype: Session
         """
+        if max_samples is not None:
+            interval = resampling.interval_for_count(self.frame_records, interval, max_samples)
+
         new_frame_records = self._resample_frame_records(self.frame_records, interval)
 
         return Session(
@@ -248,10 +479,85 @@ class Session:
             duration=self.duration,
             min_interval=interval,
             max_interval=interval,
-            sample_count=len(new_frame_records),
+            sample_count=new_frame_records.sample_count,
             start_call_stack=self.start_call_stack,
             target_description=self.target_description,
             cpu_time=self.cpu_time,
             sys_path=self.sys_path,
             sys_prefixes=self.sys_prefixes,
         )
+
+
+def _thread_root_ids(stack_trie: StackTrie, threads: set[str | int] | None = None) -> set[int]:
+    """
+    Returns the IDs of the trie's root frames that are threads - those in
+    ``threads``, by name or ident, if it's passed.
+    """
+    frame_infos = stack_trie.frame_infos
+
+    thread_root_ids: set[int] = set()
+    for node_id, parent_id in enumerate(stack_trie.parents):
+        if parent_id != ROOT_NODE_ID:
+            continue
+        name, file_path, line_no = frame_info_get_identifier(frame_infos[node_id]).split(
+            IDENTIFIER_SEP
+        )
+        if file_path != THREAD_FILE_PATH:
+            continue
+        if threads is None or name in threads or int(line_no) in threads:
+            thread_root_ids.add(node_id)
+
+    return thread_root_ids
+
+
+def _thread_record_indexes(records: FrameRecords, threads: set[str | int]) -> list[int]:
+    """
+    Returns the indexes of the records whose root frame is one of
+    ``threads``, by name or ident.
+    """
+    roots = records.stack_trie.roots()
+    thread_root_ids = _thread_root_ids(records.stack_trie, threads)
+
+    return [
+        index
+        for index, stack_id in enumerate(records.stack_ids)
+        if roots[stack_id] in thread_root_ids
+    ]
+
+
+def _thread_offsets(records: FrameRecords, start_time: float) -> list[float]:
+    """
+    Returns the offset of each record from ``start_time``. Without
+    timestamps, that's the total time of the records of the same thread, up
+    to and including this one.
+    """
+    if records.timestamps is not None:
+        return [timestamp - start_time for timestamp in records.timestamps]
+
+    roots = records.stack_trie.roots()
+    thread_times: dict[int, float] = {}
+    offsets: list[float] = []
+    for stack_id, time in zip(records.stack_ids, records.times):
+        root = roots[stack_id]
+        offset = thread_times.get(root, 0.0) + time
+        thread_times[root] = offset
+        offsets.append(offset)
+    return offsets
+
+
+JSON_WRITE_BATCH_SIZE = 1000
+
+
+def _write_json_list(file: TextIO, items: Iterable[Any]) -> None:
+    """
+    Writes ``items`` as a JSON list, in the same form as json.dumps would,
+    converting a batch at a time.
+    """
+    iterator = iter(items)
+    file.write("[")
+    separator = ""
+    while batch := list(itertools.islice(iterator, JSON_WRITE_BATCH_SIZE)):
+        file.write(separator)
+        file.write(json.dumps(batch)[1:-1])
+        separator = ", "
+    file.write("]")
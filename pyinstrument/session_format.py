@@ -0,0 +1,307 @@
+"""
+The binary .pyisession format. It's much smaller and faster to load than
+JSON, because each frame info string is stored only once, and each record
+is just a few numbers.
+
+The layout is:
+
+- The header: :data:`MAGIC`, then the format version and flags, as
+  little-endian uint16 and uint32.
+- A series of sections, each a little-endian uint64 byte length followed
+  by that many bytes, in this order:
+
+  1. The session metadata, as UTF-8 JSON, in the same form as
+     :meth:`Session.to_json` without the frame records.
+  2. The string table - the byte length of each string, as uint32s.
+  3. The string table - the UTF-8 strings, concatenated.
+  4. The stack trie - each node's parent ID, as int32s. Node 0 is the
+     root.
+  5. The stack trie - each node's frame info, as an index into the string
+     table, as uint32s.
+  6. The records' stack IDs, as uint32s.
+  7. The records' times, as float64s.
+  8. If the timestamps flag is set, the records' timestamps, as float64s.
+  9. If the counts flag is set, the number of samples in each record, as
+     uint32s.
+
+Arrays are little-endian. Times are stored at full precision, so a session
+loads exactly as it was saved.
+
+The record arrays can be used where they are, without copying, so a
+memory-mapped file can be loaded lazily - see :func:`decode`. Sections can
+also be written and read one at a time, so a session can be streamed to and
+from a file - see :func:`write` and :func:`read`.
+
+Session files of either format can be compressed. :func:`open_file` picks
+the compression from the file extension, e.g. ``.pyisession.gz``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import lzma
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import IO, Any, Callable, Iterator, Tuple, cast
+
+from pyinstrument.frame_records import FrameRecords, StackTrie
+from pyinstrument.typing import LiteralStr, PathOrStr, TypeAlias
+
+# pyright: strict
+
+
+MAGIC = b"PYISESSION\x00"
+VERSION = 1
+
+FLAG_TIMESTAMPS = 1 << 0
+FLAG_COUNTS = 1 << 1
+
+_HEADER = struct.Struct("<%dsHI" % len(MAGIC))
+_SECTION_LENGTH = struct.Struct("<Q")
+
+# the array typecodes used in the file
+_Typecode: TypeAlias = LiteralStr["i", "I", "d"]
+
+COMPRESSED_EXTENSIONS = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+}
+
+
+class SessionFormatError(ValueError):
+    pass
+
+
+def is_binary_session(data: bytes | memoryview) -> bool:
+    """
+    Returns True if ``data``, the start of a session file, is in the binary
+    format.
+    """
+    return bytes(data[: len(MAGIC)]) == MAGIC
+
+
+def encode(metadata: dict[str, Any], frame_records: FrameRecords) -> bytes:
+    """
+    Encodes a session, as its metadata and frame records, into the binary
+    format.
+    """
+    f = io.BytesIO()
+    write(f, metadata, frame_records)
+    return f.getvalue()
+
+
+def write(f: IO[bytes], metadata: dict[str, Any], frame_records: FrameRecords) -> None:
+    """
+    Writes a session in the binary format to the file ``f``. Sections are
+    written one at a time, and the record arrays are written directly, so
+    this doesn't build a copy of the session in memory.
+    """
+    stack_trie = frame_records.stack_trie
+    # the trie can be shared with a running profiler, which adds nodes on
+    # another thread, so only the nodes that exist now are written. The
+    # records never refer to later ones.
+    node_count = min(len(stack_trie.parents), len(stack_trie.frame_infos))
+    parents = stack_trie.parents[:node_count]
+    frame_infos = stack_trie.frame_infos[:node_count]
+
+    string_ids: dict[str, int] = {}
+    node_string_ids = array(
+        "I", [string_ids.setdefault(info, len(string_ids)) for info in frame_infos]
+    )
+    encoded_strings = [string.encode("utf-8") for string in string_ids]
+
+    flags = 0
+    if frame_records.timestamps is not None:
+        flags |= FLAG_TIMESTAMPS
+    if frame_records.counts is not None:
+        flags |= FLAG_COUNTS
+
+    f.write(_HEADER.pack(MAGIC, VERSION, flags))
+
+    _write_section(f, json.dumps(metadata).encode("utf-8"))
+    _write_section(f, _array_buffer(array("I", map(len, encoded_strings))))
+    _write_section(f, b"".join(encoded_strings))
+    _write_section(f, _array_buffer(array("i", parents)))
+    _write_section(f, _array_buffer(node_string_ids))
+    _write_section(f, _array_buffer(frame_records.stack_ids))
+    _write_section(f, _array_buffer(frame_records.times))
+    if frame_records.timestamps is not None:
+        _write_section(f, _array_buffer(frame_records.timestamps))
+    if frame_records.counts is not None:
+        _write_section(f, _array_buffer(frame_records.counts))
+
+
+def decode(
+    data: bytes | memoryview | mmap.mmap, lazy: bool = False
+) -> Tuple[dict[str, Any], FrameRecords]:
+    """
+    Decodes a session in the binary format, returning its metadata and frame
+    records.
+
+    If ``lazy`` is True, the records' columns are read-only memoryviews of
+    ``data``, rather than copies. If ``data`` is memory-mapped, the records
+    are then only read from disk as they're accessed. The stack trie is
+    always decoded, but it's usually small compared to the records.
+    """
+    data = memoryview(data)
+    flags = _read_header(data[: _HEADER.size])
+    read_array = _array_view if lazy and sys.byteorder == "little" else _array_from_bytes
+
+    return _decode_sections(flags, _sections_from_data(data), read_array)
+
+
+def read(f: IO[bytes]) -> Tuple[dict[str, Any], FrameRecords]:
+    """
+    Reads a session in the binary format from the file ``f``, returning its
+    metadata and frame records. Sections are read one at a time, so only one
+    is held in memory alongside the decoded records.
+    """
+    flags = _read_header(f.read(_HEADER.size))
+    return _decode_sections(flags, _sections_from_file(f), _array_from_bytes)
+
+
+def open_file(filename: PathOrStr, mode: LiteralStr["rb", "wb"]) -> IO[bytes]:
+    """
+    Opens a session file, compressed or not depending on its extension - see
+    :data:`COMPRESSED_EXTENSIONS`.
+    """
+    ext = _extension(filename)
+    open_compressed = COMPRESSED_EXTENSIONS.get(ext.lower())
+
+    if open_compressed is None:
+        return open(filename, mode)
+    return cast("IO[bytes]", open_compressed(filename, mode))
+
+
+def is_compressed_path(filename: PathOrStr) -> bool:
+    """
+    Returns True if :func:`open_file` would compress ``filename``.
+    """
+    return _extension(filename) in COMPRESSED_EXTENSIONS
+
+
+def _extension(filename: PathOrStr) -> str:
+    path: str = os.fspath(filename)
+    return os.path.splitext(path)[1].lower()
+
+
+def _read_header(header: bytes | memoryview) -> int:
+    """
+    Checks the header, and returns the flags.
+    """
+    if len(header) < _HEADER.size or not is_binary_session(header):
+        raise SessionFormatError("Not a binary pyinstrument session")
+
+    _, version, flags = _HEADER.unpack_from(header)
+    if version > VERSION:
+        raise SessionFormatError(
+            f"This session was saved in a newer format (version {version}). "
+            "Please upgrade pyinstrument to load it."
+        )
+    return flags
+
+
+def _sections_from_data(data: memoryview) -> Iterator[memoryview]:
+    offset = _HEADER.size
+    while offset < len(data):
+        if offset + _SECTION_LENGTH.size > len(data):
+            raise SessionFormatError("Truncated session file")
+        (length,) = _SECTION_LENGTH.unpack_from(data, offset)
+        offset += _SECTION_LENGTH.size
+        if offset + length > len(data):
+            raise SessionFormatError("Truncated session file")
+        yield data[offset : offset + length]
+        offset += length
+
+
+def _sections_from_file(f: IO[bytes]) -> Iterator[memoryview]:
+    while length_data := f.read(_SECTION_LENGTH.size):
+        if len(length_data) < _SECTION_LENGTH.size:
+            raise SessionFormatError("Truncated session file")
+        (length,) = _SECTION_LENGTH.unpack(length_data)
+        section = f.read(length)
+        if len(section) < length:
+            raise SessionFormatError("Truncated session file")
+        yield memoryview(section)
+
+
+def _decode_sections(
+    flags: int,
+    sections: Iterator[memoryview],
+    read_array: Callable[[_Typecode, memoryview], array[Any]],
+) -> Tuple[dict[str, Any], FrameRecords]:
+    def next_section() -> memoryview:
+        section = next(sections, None)
+        if section is None:
+            raise SessionFormatError("Truncated session file")
+        return section
+
+    metadata = json.loads(bytes(next_section()))
+
+    string_lengths = _array_from_bytes("I", next_section())
+    strings_data = next_section()
+    strings: list[str] = []
+    string_offset = 0
+    for length in string_lengths:
+        strings.append(str(strings_data[string_offset : string_offset + length], "utf-8"))
+        string_offset += length
+
+    parents = _array_from_bytes("i", next_section())
+    node_string_ids = _array_from_bytes("I", next_section())
+    frame_infos: list[str] = [strings[string_id] for string_id in node_string_ids]
+
+    frame_records = FrameRecords(
+        stack_trie=StackTrie.from_nodes(parents, frame_infos),
+        stack_ids=read_array("I", next_section()),
+        times=read_array("d", next_section()),
+        timestamps=read_array("d", next_section()) if flags & FLAG_TIMESTAMPS else None,
+        counts=read_array("I", next_section()) if flags & FLAG_COUNTS else None,
+    )
+
+    return metadata, frame_records
+
+
+def _write_section(f: IO[bytes], section: bytes | memoryview) -> None:
+    f.write(_SECTION_LENGTH.pack(memoryview(section).nbytes))
+    f.write(section)
+
+
+def _array_buffer(values: array[Any]) -> memoryview:
+    # the columns can be memoryviews - from a lazy load, or a view - which
+    # don't have a typecode, so the buffer's format is used instead
+    buffer = memoryview(values)
+    if sys.byteorder == "big":
+        swapped: array[Any] = array(buffer.format)
+        swapped.frombytes(buffer.cast("B"))
+        swapped.byteswap()
+        return memoryview(swapped)
+    return buffer
+
+
+def _array_from_bytes(typecode: _Typecode, data: memoryview) -> array[Any]:
+    result: array[Any] = array(typecode)
+    try:
+        result.frombytes(data)
+    except ValueError:
+        raise SessionFormatError("Invalid array length in session file")
+    if sys.byteorder == "big":
+        result.byteswap()
+    return result
+
+
+def _array_view(typecode: _Typecode, data: memoryview) -> array[Any]:
+    """
+    Returns a read-only view of ``data`` as an array of ``typecode``. It
+    supports reading like an array does, so it's used in place of one.
+    """
+    try:
+        view = data.toreadonly().cast(typecode)
+    except TypeError:
+        raise SessionFormatError("Invalid array length in session file")
+    return cast("array[Any]", view)
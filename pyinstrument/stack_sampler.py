@@ -1,17 +1,23 @@
 from __future__ import annotations
 
 import os
+import signal
 import sys
 import textwrap
 import threading
+import time
 import timeit
 import types
 from contextvars import ContextVar
-from typing import Any, Callable, List, NamedTuple, Optional
+from typing import Any, Callable, List, NamedTuple, Optional, TypeVar
 
+from pyinstrument.frame import THREAD_FILE_PATH
+from pyinstrument.low_level.monitoring import MonitoringProfiler, monitoring_available
 from pyinstrument.low_level.stat_profile import (
+    SampleBuffer,
     get_frame_info,
     measure_timing_overhead,
+    set_sampling_interval,
     setstatprofile,
     walltime_coarse_resolution,
 )
@@ -22,11 +28,69 @@ from pyinstrument.util import format_float_with_sig_figs, strtobool, unwrap
 # pyright: strict
 
 
+_T = TypeVar("_T")
+
 thread_locals = threading.local()
 
 StackSamplerSubscriberTarget = Callable[[List[str], float, Optional["AsyncState"]], None]
 
 IGNORE_OVERHEAD_WARNING = strtobool(os.environ.get("PYINSTRUMENT_IGNORE_OVERHEAD_WARNING", "0"))
+# whether sys.monitoring is used automatically, when it's suitable
+USE_SYS_MONITORING = strtobool(os.environ.get("PYINSTRUMENT_USE_SYS_MONITORING", "1"))
+
+# how often, in seconds, the sampling interval is adjusted to fit an
+# overhead budget
+OVERHEAD_BUDGET_WINDOW = 0.1
+# the longest interval that an overhead budget can widen sampling to
+MAX_ADAPTIVE_INTERVAL = 1.0
+
+# the timer types that a profiler can ask for. 'timer_func' is used when the
+# stack sampler has a timer_func, and 'walltime_coarse' is picked
+# automatically when its resolution is good enough.
+SELECTABLE_TIMER_TYPES: tuple[TimerType, ...] = (
+    "walltime",
+    "walltime_thread",
+    "cputime_thread",
+    "cputime_signal",
+)
+
+
+def resolve_timer_type(
+    timer_type: TimerType | None,
+    *,
+    use_timing_thread: bool | None = None,
+    use_thread_cputime: bool | None = None,
+) -> TimerType | None:
+    """
+    Combines a profiler's timer options into one timer type, or None if
+    they don't ask for one. ``use_timing_thread`` and ``use_thread_cputime``
+    are shorthands for the 'walltime_thread' and 'cputime_thread' timer
+    types. Raises ValueError if the options conflict.
+    """
+    if timer_type is not None and timer_type not in SELECTABLE_TIMER_TYPES:
+        raise ValueError(
+            f"timer_type must be one of {', '.join(SELECTABLE_TIMER_TYPES)}, not {timer_type!r}."
+        )
+
+    if use_timing_thread and timer_type not in (None, "walltime_thread"):
+        raise ValueError(f"use_timing_thread can't be used with the {timer_type!r} timer type.")
+    if use_timing_thread is False and timer_type == "walltime_thread":
+        raise ValueError(
+            "use_timing_thread=False can't be used with the 'walltime_thread' timer type."
+        )
+    if use_timing_thread:
+        timer_type = "walltime_thread"
+
+    if use_thread_cputime and timer_type not in (None, "cputime_thread"):
+        raise ValueError(f"use_thread_cputime can't be used with the {timer_type!r} timer type.")
+    if use_thread_cputime is False and timer_type == "cputime_thread":
+        raise ValueError(
+            "use_thread_cputime=False can't be used with the 'cputime_thread' timer type."
+        )
+    if use_thread_cputime:
+        timer_type = "cputime_thread"
+
+    return timer_type
 
 
 class StackSamplerSubscriber:
@@ -37,13 +101,22 @@ class StackSamplerSubscriber:
         desired_interval: float,
         bound_to_async_context: bool,
         async_state: AsyncState | None,
-        use_timing_thread: bool | None = None,
+        timer_type: TimerType | None = None,
+        use_sys_monitoring: bool | None = None,
+        sample_buffer: SampleBuffer | None = None,
+        overhead_budget: float | None = None,
     ) -> None:
         self.target = target
         self.desired_interval = desired_interval
-        self.use_timing_thread = use_timing_thread
+        self.timer_type: TimerType | None = timer_type
+        self.use_sys_monitoring = use_sys_monitoring
         self.bound_to_async_context = bound_to_async_context
         self.async_state = async_state
+        self.sample_buffer = sample_buffer
+        self.overhead_budget = overhead_budget
+        # the range of intervals that samples were taken at
+        self.min_interval = desired_interval
+        self.max_interval = desired_interval
 
 
 active_profiler_context_var: ContextVar[object | None] = ContextVar(
@@ -56,6 +129,12 @@ class StackSampler:
 
     subscribers: list[StackSamplerSubscriber]
     current_sampling_interval: float | None
+    current_sample_buffer: SampleBuffer | None
+    current_use_signal_timer: bool
+    current_use_thread_cputime: bool
+    current_monitoring_profiler: MonitoringProfiler | None
+    current_overhead_budget: float | None
+    current_effective_interval: float | None
     last_profile_time: float
     timer_func: Callable[[], float] | None
     has_warned_about_timing_overhead: bool
@@ -63,9 +142,19 @@ class StackSampler:
     def __init__(self) -> None:
         self.subscribers = []
         self.current_sampling_interval = None
+        self.current_sample_buffer = None
+        self.current_use_signal_timer = False
+        self.current_use_thread_cputime = False
+        self.current_monitoring_profiler = None
+        self.current_overhead_budget = None
+        self.current_effective_interval = None
         self.last_profile_time = 0.0
         self.timer_func = None
         self.has_warned_about_timing_overhead = False
+        self._previous_signal_handler: Any = None
+        self._in_signal_handler = False
+        self._overhead_window_start = 0.0
+        self._overhead_time = 0.0
 
     def subscribe(
         self,
@@ -74,7 +163,47 @@ class StackSampler:
         desired_interval: float,
         use_timing_thread: bool | None = None,
         use_async_context: bool,
+        timer_type: TimerType | None = None,
+        use_sys_monitoring: bool | None = None,
+        sample_buffer: SampleBuffer | None = None,
+        overhead_budget: float | None = None,
     ):
+        """
+        Subscribes ``target`` to samples of the current thread's stack.
+
+        ``timer_type`` chooses how samples are timed, and must match the
+        other subscribers' choices. It's one of
+        :data:`SELECTABLE_TIMER_TYPES`, or None for no preference:
+
+        - 'walltime' measures wall-clock time. This is the default.
+        - 'walltime_thread' is the same as ``use_timing_thread=True``.
+        - 'cputime_thread' measures the CPU time used by this thread, rather
+          than wall-clock time.
+        - 'cputime_signal' takes samples when a SIGPROF interval timer fires,
+          rather than on function calls and returns. See
+          :meth:`_start_signal_sampling`.
+
+        ``use_sys_monitoring`` chooses whether the sys.monitoring backend is
+        used, on Python 3.12+. If None, it's used when it suits the
+        subscribers - see :meth:`_can_use_monitoring`. If True, it's used
+        even for intervals shorter than the thread switch interval, and a
+        ValueError is raised if it can't be used at all.
+
+        If ``sample_buffer`` is passed, and this is the only subscriber,
+        samples are recorded straight into the buffer by the C extension,
+        without calling ``target``. Otherwise, ``target`` is called as usual,
+        and should record the samples itself.
+
+        If ``overhead_budget`` is passed, it's the fraction of time that
+        taking samples may use. The sampling interval is widened at runtime
+        to stay within it, but never narrower than ``desired_interval``. This
+        only happens while every subscriber has a budget.
+        """
+        if overhead_budget is not None and not 0 < overhead_budget < 1:
+            raise ValueError("overhead_budget must be between 0 and 1.")
+
+        timer_type = resolve_timer_type(timer_type, use_timing_thread=use_timing_thread)
+
         if use_async_context:
             if active_profiler_context_var.get() is not None:
                 raise RuntimeError(
@@ -86,18 +215,33 @@ class StackSampler:
         if existing_subscriber is not None:
             raise ValueError("This target is already subscribed to the stack sampler.")
 
-        self.subscribers.append(
-            StackSamplerSubscriber(
-                target=target,
-                desired_interval=desired_interval,
-                use_timing_thread=use_timing_thread,
-                bound_to_async_context=use_async_context,
-                async_state=AsyncState("in_context") if use_async_context else None,
-            )
+        subscriber = StackSamplerSubscriber(
+            target=target,
+            desired_interval=desired_interval,
+            timer_type=timer_type,
+            use_sys_monitoring=use_sys_monitoring,
+            bound_to_async_context=use_async_context,
+            async_state=AsyncState("in_context") if use_async_context else None,
+            sample_buffer=sample_buffer,
+            overhead_budget=overhead_budget,
         )
-        self._update()
-
-    def unsubscribe(self, target: StackSamplerSubscriberTarget):
+        self.subscribers.append(subscriber)
+        try:
+            self._update()
+        except Exception:
+            # this subscriber's preferences can't be met. Go back to sampling
+            # for the others.
+            self.subscribers.remove(subscriber)
+            if use_async_context:
+                active_profiler_context_var.set(None)
+            self._update()
+            raise
+
+    def unsubscribe(self, target: StackSamplerSubscriberTarget) -> StackSamplerSubscriber:
+        """
+        Unsubscribes ``target``. Returns its subscriber, which records the
+        range of intervals that it was sampled at.
+        """
         try:
             subscriber = next(s for s in self.subscribers if s.target == target)  # type: ignore
         except StopIteration:
@@ -112,28 +256,133 @@ class StackSampler:
 
         self._update()
 
+        return subscriber
+
     def _update(self):
         if len(self.subscribers) == 0:
             self._stop_sampling()
             return
 
         min_subscribers_interval = min(s.desired_interval for s in self.subscribers)
-        timing_thread_preferences = set(
-            s.use_timing_thread for s in self.subscribers if s.use_timing_thread is not None
+        timer_type = self._subscribers_preference(
+            [s.timer_type for s in self.subscribers], "timer type"
         )
-        if len(timing_thread_preferences) > 1:
-            raise ValueError(
-                f"Profiler requested different timing thread preferences from a profiler that is already running."
+        use_sys_monitoring = self._subscribers_preference(
+            [s.use_sys_monitoring for s in self.subscribers], "sys.monitoring preference"
+        )
+        use_timing_thread = timer_type == "walltime_thread"
+        use_thread_cputime = timer_type == "cputime_thread"
+
+        if timer_type == "cputime_signal":
+            if use_sys_monitoring:
+                raise ValueError("sys.monitoring can't be used with the signal timer.")
+            # always restart, because whether we need the context-tracking
+            # profile function depends on the subscribers
+            self._start_signal_sampling(interval=min_subscribers_interval)
+            self._reset_overhead_budget()
+            return
+
+        # samples can only be recorded natively when there's just one
+        # subscriber to send them to
+        sample_buffer = self.subscribers[0].sample_buffer if len(self.subscribers) == 1 else None
+
+        if (
+            self.current_sampling_interval != min_subscribers_interval
+            or self.current_sample_buffer is not sample_buffer
+            or self.current_use_signal_timer
+            or self.current_use_thread_cputime != use_thread_cputime
+            # whether sys.monitoring can be used depends on the subscribers
+            or self.current_monitoring_profiler is not None
+            or self._can_use_monitoring(
+                min_subscribers_interval,
+                use_timing_thread,
+                use_thread_cputime,
+                sample_buffer,
+                use_sys_monitoring,
+            )
+        ):
+            self._start_sampling(
+                interval=min_subscribers_interval,
+                use_timing_thread=use_timing_thread,
+                use_thread_cputime=use_thread_cputime,
+                sample_buffer=sample_buffer,
+                use_sys_monitoring=use_sys_monitoring,
             )
 
-        use_timing_thread = next(iter(timing_thread_preferences), False)
+        self._reset_overhead_budget()
 
-        if self.current_sampling_interval != min_subscribers_interval:
-            self._start_sampling(
-                interval=min_subscribers_interval, use_timing_thread=use_timing_thread
+    @staticmethod
+    def _subscribers_preference(preferences: list[_T | None], description: str) -> _T | None:
+        specified_preferences = set(p for p in preferences if p is not None)
+        if len(specified_preferences) > 1:
+            raise ValueError(
+                f"Profiler requested a different {description} from a profiler that is already running."
             )
+        return next(iter(specified_preferences), None)
+
+    def _can_use_monitoring(
+        self,
+        interval: float,
+        use_timing_thread: bool,
+        use_thread_cputime: bool,
+        sample_buffer: SampleBuffer | None,
+        use_sys_monitoring: bool | None,
+    ) -> bool:
+        """
+        Returns True if the sys.monitoring backend should take samples for
+        the current subscribers. It can't track async contexts, record into
+        a sample buffer, or use anything but the default clock.
+
+        Events are only turned back on when the interpreter switches threads,
+        so in CPU-bound code, intervals shorter than the switch interval are
+        sampled less often than requested. Unless a subscriber asked for
+        sys.monitoring, those use setstatprofile instead.
+
+        Raises ValueError if a subscriber asked for sys.monitoring, but it
+        can't be used.
+        """
+        if use_sys_monitoring is False:
+            return False
+        if use_sys_monitoring is None and not USE_SYS_MONITORING:
+            return False
+
+        if self.current_monitoring_profiler is None and not monitoring_available():
+            reason = "it's not available on this Python, or another tool is using it"
+        elif sample_buffer is not None:
+            reason = "samples are being recorded natively"
+        elif self.timer_func is not None:
+            reason = "a custom timer function is being used"
+        elif use_timing_thread or use_thread_cputime:
+            reason = "it only supports the 'walltime' timer type"
+        elif any(s.bound_to_async_context for s in self.subscribers):
+            reason = "it can't track async contexts"
+        else:
+            return use_sys_monitoring or interval >= sys.getswitchinterval()
+
+        if use_sys_monitoring:
+            raise ValueError(f"sys.monitoring can't be used, because {reason}.")
+        return False
+
+    def _start_sampling(
+        self,
+        interval: float,
+        use_timing_thread: bool,
+        use_thread_cputime: bool = False,
+        sample_buffer: SampleBuffer | None = None,
+        use_sys_monitoring: bool | None = None,
+    ):
+        """
+        Starts sampling with the lowest-overhead backend that suits the
+        subscribers. On Python 3.12+, that's sys.monitoring where possible,
+        because it doesn't disable the interpreter's specialisations or
+        fire on every call. Otherwise, it's setstatprofile.
+        """
+        self._stop_signal_timer()
+        use_monitoring = self._can_use_monitoring(
+            interval, use_timing_thread, use_thread_cputime, sample_buffer, use_sys_monitoring
+        )
+        self._stop_monitoring()
 
-    def _start_sampling(self, interval: float, use_timing_thread: bool):
         if use_timing_thread and self.timer_func is not None:
             raise ValueError(
                 f"Profiler requested to use the timing thread but this stack sampler is already using a custom timer function."
@@ -143,6 +392,8 @@ class StackSampler:
 
         if self.timer_func:
             timer_type = "timer_func"
+        elif use_thread_cputime:
+            timer_type = "cputime_thread"
         elif use_timing_thread:
             timer_type = "walltime_thread"
         else:
@@ -154,9 +405,23 @@ class StackSampler:
 
         self._check_timing_overhead(interval=interval, timer_type=timer_type)
 
+        clock_changed = self.current_use_thread_cputime != use_thread_cputime
         self.current_sampling_interval = interval
-        if self.last_profile_time == 0.0:
+        self.current_effective_interval = interval
+        self.current_use_thread_cputime = use_thread_cputime
+        if self.last_profile_time == 0.0 or self.current_sample_buffer is not None or clock_changed:
+            # if samples were being recorded natively, last_profile_time is
+            # stale, and that time has already been recorded in the buffer
             self.last_profile_time = self._timer()
+        self.current_sample_buffer = sample_buffer
+
+        if use_monitoring:
+            setstatprofile(None)
+            self.current_monitoring_profiler = MonitoringProfiler(
+                target=self._sample, interval=interval
+            )
+            self.current_monitoring_profiler.start()
+            return
 
         setstatprofile(
             target=self._sample,
@@ -164,11 +429,108 @@ class StackSampler:
             context_var=active_profiler_context_var,
             timer_type=timer_type,
             timer_func=self.timer_func,
+            sample_buffer=sample_buffer,
         )
 
+    def _start_signal_sampling(self, interval: float):
+        """
+        Samples the stack when a SIGPROF interval timer fires. The timer
+        counts CPU time used by the process, and Python runs the handler as
+        a pending call at the next bytecode boundary. So the overhead depends
+        only on the sampling rate, not on how many function calls the
+        program makes, and tight loops without calls are sampled properly.
+
+        Only the main thread can handle signals, so this mode only works
+        there. Samples are weighted by the main thread's CPU time, so time
+        spent waiting (e.g. in sleep or IO), or running other threads, is not
+        recorded.
+        """
+        if not hasattr(signal, "setitimer"):
+            raise ValueError("The signal timer is not available on this platform.")
+
+        if threading.current_thread() is not threading.main_thread():
+            raise ValueError("The signal timer can only be used on the main thread.")
+
+        if self.timer_func is not None:
+            raise ValueError(
+                "Profiler requested the signal timer but this stack sampler is already using a custom timer function."
+            )
+
+        self._stop_monitoring()
+
+        if self.current_use_signal_timer:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        else:
+            self._previous_signal_handler = signal.signal(signal.SIGPROF, self._signal_handler)
+
+        self.current_sampling_interval = interval
+        self.current_effective_interval = interval
+        self.current_sample_buffer = None
+        self.current_use_signal_timer = True
+        self.last_profile_time = self._signal_timer()
+
+        if any(s.bound_to_async_context for s in self.subscribers):
+            # the profile function is still needed to notice context
+            # changes, but it never takes samples itself
+            setstatprofile(
+                target=self._sample,
+                interval=float("inf"),
+                context_var=active_profiler_context_var,
+            )
+        else:
+            setstatprofile(None)
+
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+
+    def _stop_signal_timer(self):
+        if not self.current_use_signal_timer:
+            return
+
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_signal_handler)
+        self._previous_signal_handler = None
+        self.current_use_signal_timer = False
+        # last_profile_time was measured in CPU time
+        self.last_profile_time = 0.0
+
+    def _signal_handler(self, signum: int, frame: types.FrameType | None):
+        if self._in_signal_handler:
+            # the timer fired again while we were still taking the last
+            # sample. Skip it, the time will be counted in the next sample.
+            return
+
+        self._in_signal_handler = True
+        try:
+            overhead_start = timeit.default_timer() if self.current_overhead_budget else 0.0
+            now = self._signal_timer()
+            time_since_last_sample = now - self.last_profile_time
+
+            call_stack = build_call_stack(frame, "signal", None)
+
+            for subscriber in self.subscribers:
+                subscriber.target(call_stack, time_since_last_sample, subscriber.async_state)
+
+            self.last_profile_time = now
+
+            if self.current_overhead_budget:
+                self._account_overhead(overhead_start)
+        finally:
+            self._in_signal_handler = False
+
+    def _stop_monitoring(self):
+        if self.current_monitoring_profiler is not None:
+            self.current_monitoring_profiler.stop()
+            self.current_monitoring_profiler = None
+
     def _stop_sampling(self):
+        self._stop_signal_timer()
+        self._stop_monitoring()
         setstatprofile(None)
         self.current_sampling_interval = None
+        self.current_effective_interval = None
+        self.current_overhead_budget = None
+        self.current_sample_buffer = None
+        self.current_use_thread_cputime = False
         self.last_profile_time = 0.0
 
     def _sample(self, frame: types.FrameType, event: str, arg: Any):
@@ -191,7 +553,17 @@ class StackSampler:
                 elif subscriber.target == new:
                     assert subscriber.bound_to_async_context
                     subscriber.async_state = AsyncState("in_context")
+                else:
+                    continue
+
+                if subscriber.sample_buffer is not None:
+                    # keep the buffer in sync, so that natively-recorded
+                    # samples have the right stack
+                    subscriber.sample_buffer.set_async_state(
+                        subscriber.async_state.state, subscriber.async_state.info
+                    )
         else:
+            overhead_start = timeit.default_timer() if self.current_overhead_budget else 0.0
             now = self._timer()
             time_since_last_sample = now - self.last_profile_time
 
@@ -202,12 +574,90 @@ class StackSampler:
 
             self.last_profile_time = now
 
+            if self.current_overhead_budget:
+                self._account_overhead(overhead_start)
+
+    def _reset_overhead_budget(self):
+        """
+        Starts measuring overhead against the subscribers' budget, from the
+        current interval. The budget only applies if every subscriber has
+        one.
+        """
+        budgets = [s.overhead_budget for s in self.subscribers]
+        if budgets and all(b is not None for b in budgets):
+            self.current_overhead_budget = min(b for b in budgets if b is not None)
+        else:
+            self.current_overhead_budget = None
+            if self.current_effective_interval != self.current_sampling_interval:
+                # a subscriber without a budget needs the interval it asked for
+                assert self.current_sampling_interval is not None
+                self._set_effective_interval(self.current_sampling_interval)
+
+        self._overhead_window_start = timeit.default_timer()
+        self._overhead_time = 0.0
+
+    def _account_overhead(self, overhead_start: float):
+        """
+        Adds the time since ``overhead_start`` to the time spent sampling.
+        Once per window, changes the interval in proportion to how far the
+        overhead is from the budget.
+        """
+        budget = self.current_overhead_budget
+        interval = self.current_effective_interval
+        assert budget is not None and interval is not None
+        assert self.current_sampling_interval is not None
+
+        now = timeit.default_timer()
+        self._overhead_time += now - overhead_start
+        window = now - self._overhead_window_start
+        if window < OVERHEAD_BUDGET_WINDOW:
+            return
+
+        overhead = self._overhead_time / window
+        self._overhead_window_start = now
+        self._overhead_time = 0.0
+
+        # change by at most 2x per window, so one unusual window doesn't
+        # swing the interval too far
+        new_interval = min(max(interval * overhead / budget, interval / 2), interval * 2)
+        new_interval = min(max(new_interval, self.current_sampling_interval), MAX_ADAPTIVE_INTERVAL)
+
+        # ignore small changes, to avoid constantly adjusting the interval
+        if abs(new_interval - interval) > interval * 0.1:
+            self._set_effective_interval(new_interval)
+
+    def _set_effective_interval(self, interval: float):
+        """
+        Changes the sampling interval of the running backend, without
+        restarting it.
+        """
+        if self.current_use_signal_timer:
+            signal.setitimer(signal.ITIMER_PROF, interval, interval)
+        elif self.current_monitoring_profiler is not None:
+            self.current_monitoring_profiler.interval = interval
+        else:
+            set_sampling_interval(interval)
+
+        self.current_effective_interval = interval
+
+        for subscriber in self.subscribers:
+            subscriber.min_interval = min(subscriber.min_interval, interval)
+            subscriber.max_interval = max(subscriber.max_interval, interval)
+
     def _timer(self):
         if self.timer_func:
             return self.timer_func()
+        elif self.current_use_thread_cputime:
+            return time.thread_time()
         else:
             return timeit.default_timer()
 
+    def _signal_timer(self):
+        # the signal timer counts CPU time, so that's what samples measure.
+        # The handler always runs on the main thread, which is the one that's
+        # sampled, so only its CPU time counts.
+        return time.thread_time()
+
     def _check_timing_overhead(self, interval: float, timer_type: TimerType):
         if self.has_warned_about_timing_overhead:
             return
@@ -274,6 +724,82 @@ class StackSampler:
         pass
 
 
+class AllThreadsSampler:
+    """
+    Samples the stacks of every thread in the process, from a background
+    thread. Unlike :class:`StackSampler`, it doesn't install a profile
+    function, so the overhead is fixed per interval, rather than per call.
+
+    Each sample's time is the time since the previous sample, and every
+    thread is sampled at once, so each thread's samples add up to the
+    profile's duration.
+    """
+
+    def __init__(
+        self,
+        target: Callable[[List[str], float, Optional[AsyncState]], None],
+        interval: float,
+        timer_func: Callable[[], float] | None = None,
+    ) -> None:
+        self.target = target
+        self.interval = interval
+        self.timer_func = timer_func
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            raise RuntimeError("This sampler is already running.")
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="pyinstrument-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops sampling. When this returns, ``target`` won't be called again.
+        """
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        last_sample_time = self._timer()
+
+        while not self._stop_event.wait(self.interval):
+            now = self._timer()
+            time_since_last_sample = now - last_sample_time
+            last_sample_time = now
+
+            thread_names = {t.ident: t.name for t in threading.enumerate()}
+            current_frames = sys._current_frames()  # pyright: ignore[reportPrivateUsage]
+
+            for ident, frame in current_frames.items():
+                if ident == own_ident:
+                    continue
+
+                call_stack: list[str] = []
+                current_frame: types.FrameType | None = frame
+                while current_frame is not None:
+                    call_stack.append(get_frame_info(current_frame))
+                    current_frame = current_frame.f_back
+
+                call_stack.append(_thread_frame_info(thread_names.get(ident, "Thread"), ident))
+                call_stack.reverse()
+
+                self.target(call_stack, time_since_last_sample, None)
+
+    def _timer(self):
+        if self.timer_func:
+            return self.timer_func()
+        else:
+            return timeit.default_timer()
+
+
 def get_stack_sampler() -> StackSampler:
     """
     Gets the stack sampler for the current thread, creating it if necessary
@@ -308,9 +834,7 @@ def build_call_stack(frame: types.FrameType | None, event: str, arg: Any) -> lis
         call_stack.append(get_frame_info(frame))
         frame = frame.f_back
 
-    thread = threading.current_thread()
-    thread_identifier = "%s\x00%s\x00%i" % (thread.name, "<thread>", thread.ident)
-    call_stack.append(thread_identifier)
+    call_stack.append(thread_frame_info())
 
     # we iterated from the leaf to the root, we actually want the call stack
     # starting at the root, so reverse this array
@@ -319,6 +843,20 @@ def build_call_stack(frame: types.FrameType | None, event: str, arg: Any) -> lis
     return call_stack
 
 
+def thread_frame_info() -> str:
+    """
+    Returns the frame info that identifies the current thread, which is the
+    root of every call stack.
+    """
+    thread = threading.current_thread()
+    assert thread.ident is not None
+    return _thread_frame_info(thread.name, thread.ident)
+
+
+def _thread_frame_info(name: str, ident: int) -> str:
+    return "%s\x00%s\x00%i" % (name, THREAD_FILE_PATH, ident)
+
+
 class AsyncState(NamedTuple):
     state: LiteralStr["in_context", "out_of_context_awaited", "out_of_context_unknown"]
     """
@@ -38,6 +38,7 @@ setup(
             # pinned to an older version due to an incompatibility with flaky
             "pytest-asyncio==0.23.8",
             "ipython",
+            "numpy",
         ],
         "bin": [
             "click",
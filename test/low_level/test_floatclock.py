@@ -32,3 +32,23 @@ def test_is_in_seconds():
     duration = time_b - time_a
 
     assert floatclock_duration == pytest.approx(duration, rel=0.1)
+
+
+def test_thread_cputime():
+    PYI_FLOATCLOCK_THREAD_CPUTIME = 2
+
+    cputime_a = pyi_floatclock(PYI_FLOATCLOCK_THREAD_CPUTIME)
+    time.sleep(0.1)
+    cputime_b = pyi_floatclock(PYI_FLOATCLOCK_THREAD_CPUTIME)
+
+    # sleeping doesn't use CPU time
+    assert cputime_b - cputime_a < 0.05
+
+    thread_time_a = time.thread_time()
+    end_time = time.perf_counter() + 0.1
+    while time.perf_counter() < end_time:
+        pass
+    cputime_c = pyi_floatclock(PYI_FLOATCLOCK_THREAD_CPUTIME)
+    thread_time_b = time.thread_time()
+
+    assert cputime_c - cputime_b == pytest.approx(thread_time_b - thread_time_a, rel=0.1, abs=0.01)
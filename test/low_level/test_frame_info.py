@@ -1,4 +1,6 @@
+import gc
 import inspect
+import weakref
 
 import pytest
 
@@ -94,3 +96,75 @@ def test_frame_info_with_classes(test_function, del_local):
     py_frame_info = test_function(stat_profile_python.get_frame_info, del_local=del_local)
 
     assert c_frame_info == py_frame_info
+
+
+def test_frame_info_is_cached():
+    frame = inspect.currentframe()
+    assert frame
+
+    first, second = stat_profile_c.get_frame_info(frame), stat_profile_c.get_frame_info(frame)
+
+    assert first is second
+
+    # moving to another line gives a different frame info
+    third = stat_profile_c.get_frame_info(frame)
+    assert third != first
+    assert third.partition("\x01")[0] == first.partition("\x01")[0]
+
+
+def test_frame_info_cache_doesnt_keep_code_alive():
+    namespace = {}
+    exec(
+        "import inspect\n"
+        "def a_function(get_frame_info):\n"
+        "    return get_frame_info(inspect.currentframe())\n",
+        namespace,
+    )
+    a_function = namespace["a_function"]
+
+    frame_info = a_function(stat_profile_c.get_frame_info)
+    assert frame_info.startswith("a_function\x00<string>\x002")
+
+    code_ref = weakref.ref(a_function.__code__)
+    del a_function, namespace
+    gc.collect()
+
+    assert code_ref() is None
+
+
+def test_frame_info_cache_doesnt_keep_classes_alive():
+    class ADynamicClass:
+        def get_frame_info(self, get_frame_info):
+            return get_frame_info(inspect.currentframe())
+
+    frame_info = ADynamicClass().get_frame_info(stat_profile_c.get_frame_info)
+    assert "ADynamicClass" in frame_info
+
+    class_ref = weakref.ref(ADynamicClass)
+    del ADynamicClass
+    gc.collect()
+
+    assert class_ref() is None
+
+
+def test_frame_info_cache_evicts_dead_code():
+    # code objects are often allocated where a dead one was. The cache must
+    # never return the dead code object's frame info for them.
+    for i in range(50):
+        namespace = {}
+        exec(
+            "import inspect\n"
+            f"class Class{i}:\n"
+            f"    def function_{i}(self, get_frame_info):\n"
+            "        return get_frame_info(inspect.currentframe())\n",
+            namespace,
+        )
+        frame_info = getattr(namespace[f"Class{i}"](), f"function_{i}")(
+            stat_profile_c.get_frame_info
+        )
+
+        assert frame_info.startswith(f"function_{i}\x00")
+        assert f"Class{i}" in frame_info
+
+        del namespace
+        gc.collect()
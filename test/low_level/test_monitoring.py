@@ -0,0 +1,66 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from pyinstrument.low_level.monitoring import MonitoringProfiler, monitoring_available
+
+from ..util import busy_wait
+
+pytestmark = pytest.mark.skipif(
+    not monitoring_available(), reason="sys.monitoring is not available"
+)
+
+
+class EventRecorder:
+    def __init__(self) -> None:
+        self.events: list[tuple[str, str, object]] = []
+
+    def __call__(self, frame, event, arg):
+        self.events.append((frame.f_code.co_name, event, arg))
+
+
+def test_samples():
+    recorder = EventRecorder()
+    profiler = MonitoringProfiler(recorder, interval=0.001)
+
+    profiler.start()
+    try:
+        busy_wait(0.1)
+    finally:
+        profiler.stop()
+
+    assert len(recorder.events) > 10
+    assert sys.monitoring.get_tool(sys.monitoring.PROFILER_ID) is None  # type: ignore
+    assert monitoring_available()
+
+
+def test_builtin_functions_are_sampled_on_return():
+    recorder = EventRecorder()
+    profiler = MonitoringProfiler(recorder, interval=0.001)
+
+    profiler.start()
+    try:
+        time.sleep(0.1)
+    finally:
+        profiler.stop()
+
+    assert ("test_builtin_functions_are_sampled_on_return", "c_return", time.sleep) in (
+        recorder.events
+    )
+
+
+def test_other_threads_are_not_sampled():
+    recorder = EventRecorder()
+    profiler = MonitoringProfiler(recorder, interval=0.001)
+
+    profiler.start()
+    try:
+        thread = threading.Thread(target=busy_wait, args=(0.1,))
+        thread.start()
+        thread.join()
+    finally:
+        profiler.stop()
+
+    assert not any(name == "busy_wait" for name, _, _ in recorder.events)
@@ -4,6 +4,8 @@ from typing import Any
 
 import pytest
 
+from pyinstrument.low_level import stat_profile, stat_profile_python
+
 from ..util import busy_wait, flaky_in_ci
 from .util import parametrize_setstatprofile
 
@@ -49,3 +51,47 @@ def test_internal_object_compatibility(setstatprofile):
     print(type(profile_state).__name__)  # type: ignore
 
     setstatprofile(None)
+
+
+@flaky_in_ci
+@parametrize_setstatprofile
+def test_cputime_thread(setstatprofile):
+    counter = CallCounter()
+    setstatprofile(counter, 0.01, timer_type="cputime_thread")
+    # sleeping doesn't advance the timer, so there are no samples
+    for _ in range(20):
+        time.sleep(0.01)
+    sleep_count = counter.count
+    busy_wait(0.5)
+    setstatprofile(None)
+
+    assert sleep_count <= 2
+    assert 35 <= counter.count - sleep_count <= 65
+
+
+@flaky_in_ci
+@pytest.mark.parametrize(
+    "module", [stat_profile, stat_profile_python], ids=["stat_profile", "stat_profile_python"]
+)
+def test_set_sampling_interval(module):
+    counter = CallCounter()
+    module.setstatprofile(counter, 0.1)
+    module.set_sampling_interval(0.01)
+    busy_wait(1.0)
+    module.setstatprofile(None)
+    assert 70 <= counter.count <= 130
+
+    with pytest.raises(RuntimeError):
+        module.set_sampling_interval(0.01)
+
+
+@flaky_in_ci
+def test_set_sampling_interval_with_timing_thread():
+    counter = CallCounter()
+    stat_profile.setstatprofile(counter, 0.1, timer_type="walltime_thread")
+    # the timing thread's clock only ticks once per interval, so it has to
+    # follow the new interval too
+    stat_profile.set_sampling_interval(0.01)
+    busy_wait(1.0)
+    stat_profile.setstatprofile(None)
+    assert 70 <= counter.count <= 130
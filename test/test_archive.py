@@ -0,0 +1,124 @@
+import pytest
+
+from pyinstrument.archive import INDEX_FILENAME, ProfileArchive
+from pyinstrument.frame_info import frame_info_get_identifier
+from pyinstrument.frame_records import FrameRecords
+
+from .util import dummy_session
+
+VIEW = "view\x00views.py\x001"
+EXECUTE = "execute\x00site-packages/psycopg2/cursor.py\x0010"
+RENDER = "render\x00templates.py\x0020"
+
+
+def request_session(start_time, records):
+    session = dummy_session()
+    session.start_time = start_time
+    session.frame_records = FrameRecords.from_list(records)
+    session.duration = sum(time for _, time in records)
+    session.sample_count = len(records)
+    return session
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = ProfileArchive(tmp_path / "profiles")
+    archive.add(request_session(1.0, [([VIEW], 0.1), ([VIEW, EXECUTE], 0.9)]), path="/api/orders")
+    archive.add(
+        request_session(2.0, [([VIEW], 0.5), ([VIEW, EXECUTE], 0.5), ([VIEW, RENDER], 1.0)]),
+        path="/api/orders/5",
+    )
+    archive.add(request_session(3.0, [([VIEW, RENDER], 0.5)]), path="/")
+    archive.add(request_session(4.0, [([VIEW], 3.0)]), path="/api/orders")
+    return archive
+
+
+def test_slowest(archive):
+    assert [entry.duration for entry in archive.slowest()] == [3.0, 2.0, 1.0, 0.5]
+    assert [entry.duration for entry in archive.slowest(2)] == [3.0, 2.0]
+    assert [entry.duration for entry in archive.slowest(path="/api/orders")] == [3.0, 1.0]
+    assert [entry.path for entry in archive.slowest(path="/api/orders*")] == [
+        "/api/orders",
+        "/api/orders/5",
+        "/api/orders",
+    ]
+
+
+def test_spending_time_in(archive):
+    results = archive.spending_time_in("execute")
+    assert [(entry.start_time, fraction) for entry, fraction in results] == [(1.0, 0.9)]
+
+    results = archive.spending_time_in("execute", min_fraction=0.2)
+    assert [(entry.start_time, fraction) for entry, fraction in results] == [
+        (1.0, 0.9),
+        (2.0, 0.25),
+    ]
+
+    assert archive.spending_time_in("execute", file_path_contains="psycopg2") != []
+    assert archive.spending_time_in("execute", file_path_contains="sqlite") == []
+    assert archive.spending_time_in("missing", min_fraction=0.0) == []
+
+
+def test_spending_time_in_same_named_functions(tmp_path):
+    # functions with the same name, calling each other, aren't counted twice
+    other_execute = "execute\x00db/wrapper.py\x0030"
+    archive = ProfileArchive(tmp_path / "profiles")
+    archive.add(
+        request_session(
+            1.0,
+            [
+                ([VIEW], 0.2),
+                ([VIEW, other_execute], 0.2),
+                ([VIEW, other_execute, EXECUTE], 0.6),
+            ],
+        )
+    )
+
+    ((_, fraction),) = archive.spending_time_in("execute", min_fraction=0.0)
+    assert fraction == pytest.approx(0.8)
+    ((_, fraction),) = archive.spending_time_in(
+        "execute", min_fraction=0.0, file_path_contains="db/"
+    )
+    assert fraction == pytest.approx(0.8)
+
+
+def test_top_functions(archive):
+    (entry,) = [entry for entry in archive.entries() if entry.start_time == 2.0]
+
+    top_functions = archive.top_functions(entry)
+    assert [f.function for f in top_functions] == ["render", "view", "execute"]
+    assert top_functions[0].identifier == frame_info_get_identifier(RENDER)
+    assert top_functions[1].inclusive_time == 2.0
+
+    by_inclusive_time = archive.top_functions(entry, limit=1, by_self_time=False)
+    assert [f.function for f in by_inclusive_time] == ["view"]
+
+
+def test_small_functions_are_not_indexed(tmp_path):
+    archive = ProfileArchive(tmp_path, min_function_fraction=0.2)
+    entry = archive.add(request_session(1.0, [([VIEW], 0.9), ([VIEW, EXECUTE], 0.1)]))
+
+    assert [f.function for f in archive.top_functions(entry)] == ["view"]
+
+
+def test_load_and_remove(archive):
+    entry = archive.slowest(1)[0]
+    assert archive.get(entry.id) == entry
+
+    session = archive.load(entry)
+    assert session.start_time == 4.0
+    assert list(session.frame_records) == [([VIEW], 3.0)]
+
+    archive.remove(entry)
+    assert len(archive) == 3
+    assert not (archive.directory / entry.filename).exists()
+    assert archive.top_functions(entry) == []
+    with pytest.raises(KeyError):
+        archive.get(entry.id)
+
+
+def test_reopen(archive):
+    reopened = ProfileArchive(archive.directory)
+
+    assert reopened.entries() == archive.entries()
+    assert sorted(path.name for path in archive.directory.iterdir())[-1] == INDEX_FILENAME
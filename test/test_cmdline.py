@@ -7,7 +7,10 @@ from pathlib import Path
 
 import pytest
 
-from .util import BUSY_WAIT_SCRIPT
+from pyinstrument.archive import ProfileArchive
+from pyinstrument.frame_records import FrameRecords
+
+from .util import BUSY_WAIT_SCRIPT, dummy_session
 
 EXECUTION_DETAILS_SCRIPT = f"""
 #!{sys.executable}
@@ -236,6 +239,78 @@ class TestCommandLine:
         assert "busy_wait" in str(output)
         assert "do_nothing" in str(output)
 
+    def test_compressed_session_save_and_load(self, pyinstrument_invocation, tmp_path: Path):
+        busy_wait_py = tmp_path / "busy_wait.py"
+        busy_wait_py.write_text(BUSY_WAIT_SCRIPT)
+
+        session_file = tmp_path / "session.pyisession.gz"
+
+        # the renderer is guessed from the extension
+        subprocess.check_call(
+            [*pyinstrument_invocation, f"--outfile={session_file}", str(busy_wait_py)]
+        )
+        assert session_file.read_bytes()[:2] == b"\x1f\x8b"
+
+        output = subprocess.check_output([*pyinstrument_invocation, f"--load={session_file}"])
+        assert "busy_wait" in str(output)
+
+    def test_diff(self, pyinstrument_invocation, tmp_path: Path):
+        baseline = dummy_session()
+        baseline.frame_records = FrameRecords.from_list([(["slow_func\x00a.py\x001"], 1.0)])
+        candidate = dummy_session()
+        candidate.frame_records = FrameRecords.from_list([(["slow_func\x00a.py\x001"], 2.0)])
+        baseline.save(tmp_path / "baseline.pyisession")
+        candidate.save(tmp_path / "candidate.pyisession")
+        session_files = [
+            str(tmp_path / "baseline.pyisession"),
+            str(tmp_path / "candidate.pyisession"),
+        ]
+
+        output = subprocess.check_output([*pyinstrument_invocation, "diff", *session_files])
+        assert "+1.000" in str(output)
+        assert "slow_func" in str(output)
+
+        html_file = tmp_path / "diff.html"
+        subprocess.check_call(
+            [*pyinstrument_invocation, "diff", f"--outfile={html_file}", *session_files]
+        )
+        assert "<!DOCTYPE html>" in html_file.read_text()
+
+        process = subprocess.run(
+            [*pyinstrument_invocation, "diff", "--fail-on-regression=0.5", *session_files],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        assert process.returncode == 1
+        assert "slow_func" in str(process.stderr)
+
+        subprocess.check_call(
+            [*pyinstrument_invocation, "diff", "--fail-on-regression=1.5", *session_files],
+            stdout=subprocess.DEVNULL,
+        )
+
+    def test_archive(self, pyinstrument_invocation, tmp_path: Path):
+        archive = ProfileArchive(tmp_path / "profiles")
+        for duration, path in [(1.0, "/api/orders"), (2.0, "/api/users"), (3.0, "/api/orders")]:
+            session = dummy_session()
+            session.duration = duration
+            session.frame_records = FrameRecords.from_list([(["slow_func\x00a.py\x001"], 1.0)])
+            archive.add(session, path=path)
+
+        output = subprocess.check_output(
+            [*pyinstrument_invocation, "archive", str(archive.directory), "slowest", "/api/orders"]
+        ).decode()
+        lines = output.splitlines()
+        assert len(lines) == 2
+        assert "3.000s" in lines[0] and "/api/orders" in lines[0]
+        assert "1.000s" in lines[1]
+
+        output = subprocess.check_output(
+            [*pyinstrument_invocation, "archive", str(archive.directory), "function", "slow_func"]
+        ).decode()
+        assert len(output.splitlines()) == 3
+        assert "100.0%" in output
+
     def test_interval(self, pyinstrument_invocation, tmp_path: Path):
         busy_wait_py = tmp_path / "busy_wait.py"
         busy_wait_py.write_text(BUSY_WAIT_SCRIPT)
@@ -0,0 +1,163 @@
+import pytest
+
+from pyinstrument.frame_info import frame_info_get_identifier
+from pyinstrument.frame_records import FrameRecords
+from pyinstrument.renderers import DiffConsoleRenderer, DiffHTMLRenderer
+from pyinstrument.session import Session
+
+from .util import dummy_session
+
+A = "a\x00a.py\x001"
+B = "b\x00b.py\x0010"
+B_MOVED = "b\x00b.py\x0020"
+C = "c\x00c.py\x001"
+D = "d\x00d.py\x001"
+THREAD_1 = "MainThread\x00<thread>\x00123"
+THREAD_2 = "MainThread\x00<thread>\x00456"
+
+
+def session_with(records):
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(records)
+    return session
+
+
+@pytest.fixture
+def diff():
+    baseline = session_with(
+        [
+            ([A], 1.0),
+            ([A, B], 2.0),
+            ([A, B, C], 3.0),
+            ([A, D], 4.0),
+        ]
+    )
+    candidate = session_with(
+        [
+            ([A], 1.0),
+            ([A, B_MOVED], 2.0),
+            ([A, B_MOVED, C], 9.0),
+            ([A, D], 1.0),
+        ]
+    )
+    return Session.diff(baseline, candidate)
+
+
+def find_node(diff, *functions):
+    node = diff.root
+    for function in functions:
+        (node,) = [child for child in node.children.values() if child.function == function]
+    return node
+
+
+def test_alignment(diff):
+    assert diff.baseline_total == 10.0
+    assert diff.candidate_total == 13.0
+
+    a = find_node(diff, "a")
+    assert a.delta == 3.0
+    assert a.self_delta == 0.0
+
+    # B moved within its file, but is still matched
+    b = find_node(diff, "a", "b")
+    assert (b.baseline_time, b.candidate_time) == (5.0, 11.0)
+    assert b.self_delta == 0.0
+    # the line number is where B is in the candidate
+    assert b.line_no == 20
+
+    c = find_node(diff, "a", "b", "c")
+    assert c.delta == 6.0
+    assert [node.function for node in c.path()] == ["a", "b", "c"]
+
+    d = find_node(diff, "a", "d")
+    assert d.delta == -3.0
+    assert diff.normalised_delta(d) == pytest.approx(1 / 13 - 4 / 10)
+
+
+def test_compare_line_numbers():
+    baseline = session_with([([A, B], 1.0)])
+    candidate = session_with([([A, B_MOVED], 1.0)])
+    diff = Session.diff(baseline, candidate, ignore_line_numbers=False)
+
+    a = find_node(diff, "a")
+    assert len(a.children) == 2
+    assert sorted((child.delta, child.line_no) for child in a.children.values()) == [
+        (-1.0, 10),
+        (1.0, 20),
+    ]
+
+
+def test_threads_are_matched_by_name():
+    baseline = session_with([([THREAD_1, A], 1.0)])
+    candidate = session_with([([THREAD_2, A], 3.0)])
+    diff = Session.diff(baseline, candidate)
+
+    assert find_node(diff, "MainThread", "a").delta == 2.0
+
+
+def test_identifiers_with_class_names():
+    a_method = "method\x00a.py\x005\x01cFoo"
+    diff = Session.diff(session_with([([a_method], 1.0)]), session_with([([a_method], 2.0)]))
+
+    (node,) = diff.nodes()
+    assert node.identifier == frame_info_get_identifier(a_method)
+    assert node.delta == 1.0
+
+
+def test_regressions(diff):
+    assert [node.function for node in diff.regressions()] == ["b", "c", "a"]
+    # 0.5 of the baseline's total of 10s
+    assert [node.function for node in diff.regressions(0.5)] == ["b", "c"]
+    assert [node.function for node in diff.regressions(0.6)] == []
+    # c's share went from 30% to 69%
+    assert [node.function for node in diff.regressions(0.3, normalised=True)] == ["c", "b"]
+
+
+def test_console_renderer(diff):
+    output = DiffConsoleRenderer(min_fraction=0.01, unicode=False, color=False).render(diff)
+
+    assert "Baseline:  10.000s" in output
+    assert "Candidate: 13.000s" in output
+    assert "+3.000 (+30.0%)" in output
+
+    lines = output.splitlines()
+    (b_line,) = [line for line in lines if " b  " in line]
+    assert b_line.startswith("|- +6.000")
+    assert "5.000 -> 11.000" in b_line
+    (c_line,) = [line for line in lines if " c  " in line]
+    assert c_line.startswith("|  `- +6.000")
+    (d_line,) = [line for line in lines if " d  " in line]
+    assert d_line.startswith("`- -3.000")
+
+    # regressions are listed before improvements
+    assert lines.index(b_line) < lines.index(d_line)
+
+
+def test_console_renderer_threshold(diff):
+    output = DiffConsoleRenderer(min_fraction=0.4).render(diff)
+
+    # only b and c changed by at least 40% of 13s, so d is hidden
+    assert " c  " in output
+    assert " d  " not in output
+
+    unchanged = Session.diff(diff.baseline, diff.baseline)
+    assert "No significant changes." in DiffConsoleRenderer().render(unchanged)
+
+
+def test_html_renderer(diff):
+    output = DiffHTMLRenderer().render(diff)
+
+    assert output.startswith("<!DOCTYPE html>")
+    assert "+6.000s" in output
+    assert "-3.000s" in output
+    assert output.count("<details") == 2  # a and b have children shown
+    assert '<li class="leaf">' in output
+
+
+def test_deep_diff_renders():
+    stack = [f"f{i}\x00deep.py\x00{i}" for i in range(3000)]
+    diff = Session.diff(session_with([(stack, 1.0)]), session_with([(stack, 2.0)]))
+
+    assert len(list(diff.nodes())) == 3000
+    assert "f2999" in DiffConsoleRenderer().render(diff)
+    assert "f2999" in DiffHTMLRenderer().render(diff)
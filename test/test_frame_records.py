@@ -0,0 +1,503 @@
+import sys
+from array import array
+
+import pytest
+
+from pyinstrument.frame import SELF_TIME_FRAME_IDENTIFIER, Frame
+from pyinstrument.frame_info import FrameInfoCache, frame_info_get_identifier
+from pyinstrument.frame_ops import build_frame_tree
+from pyinstrument.frame_records import (
+    ROOT_NODE_ID,
+    FrameRecords,
+    FrameRecordsRingBuffer,
+    MergedFrameRecords,
+    StackTrie,
+)
+from pyinstrument.low_level.stat_profile import SampleBuffer
+from pyinstrument.session import Session
+
+from .util import dummy_session
+
+A = "a\x00a.py\x001"
+B = "b\x00b.py\x001"
+C = "c\x00c.py\x001"
+
+
+def test_stack_trie_shares_prefixes():
+    trie = StackTrie()
+
+    ab = trie.node_for_stack([A, B])
+    ac = trie.node_for_stack([A, C])
+
+    assert ab != ac
+    assert trie.parents[ab] == trie.parents[ac] == trie.node_for_stack([A])
+    assert trie.node_for_stack([A, B]) == ab
+    # root, a, a/b, a/c
+    assert len(trie) == 4
+
+    assert trie.stack_for_node(ab) == [A, B]
+    assert trie.stack_for_node(ROOT_NODE_ID) == []
+    assert trie.depths[ab] == 2
+
+
+def test_stack_trie_import_nodes():
+    trie = StackTrie()
+    trie.node_for_stack([A, B])
+
+    other = StackTrie()
+    other_ac = other.node_for_stack([A, C])
+    other_b = other.node_for_stack([B])
+
+    mapping = trie.import_nodes(other)
+
+    assert trie.stack_for_node(mapping[other_ac]) == [A, C]
+    assert trie.stack_for_node(mapping[other_b]) == [B]
+    assert mapping[other.node_for_stack([A])] == trie.node_for_stack([A])
+
+
+def test_frame_records_acts_like_a_list():
+    records_list = [([A, B], 0.1), ([A, C], 0.2), ([A, B], 0.3)]
+    records = FrameRecords.from_list(records_list)
+
+    assert len(records) == 3
+    assert list(records) == records_list
+    assert records[1] == ([A, C], 0.2)
+    assert records[-1] == ([A, B], 0.3)
+    assert list(records[1:]) == records_list[1:]
+    # identical stacks are stored once
+    assert records.stack_ids[0] == records.stack_ids[2]
+
+
+def test_frame_records_concatenate():
+    records_1 = FrameRecords.from_list([([A, B], 0.1)])
+    records_2 = FrameRecords.from_list([([C], 0.2), ([A, B], 0.3)])
+
+    result = FrameRecords.concatenate([records_1, records_2])
+
+    assert list(result) == [([A, B], 0.1), ([C], 0.2), ([A, B], 0.3)]
+    # the inputs are unchanged
+    assert list(records_1) == [([A, B], 0.1)]
+
+
+def test_session_accepts_frame_records_list():
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list([([A, B], 1.0), ([A, C], 2.0)])
+
+    json_dict = session.to_json()
+    assert json_dict["frame_records"] == [([A, B], 1.0), ([A, C], 2.0)]
+
+    loaded = Session.from_json(json_dict)
+    assert list(loaded.frame_records) == list(session.frame_records)
+
+
+def test_build_frame_tree_from_trie():
+    records = FrameRecords.from_list(
+        [
+            ([A, B + "\x01l2"], 1.0),
+            ([A, B + "\x01l3"], 2.0),
+            ([A, C], 4.0),
+            ([A], 8.0),
+        ]
+    )
+
+    root = build_frame_tree(records, context=dummy_session())
+
+    assert root
+    root.self_check()
+    assert root.identifier == A
+    assert root.time == 15.0
+
+    b, c, self_time = root.children
+    assert b.identifier == B
+    assert b.time == 3.0
+    # consecutive records with the same identifier share a frame, but their
+    # attributes are kept separately
+    assert b.attributes == {"l2": 1.0, "l3": 2.0}
+    assert c.identifier == C
+    assert c.time == 4.0
+    assert self_time.identifier == "[self]"
+    assert self_time.time == 8.0
+
+
+def test_build_frame_tree_with_frame_info_cache():
+    records = FrameRecords.from_list([([A, B + "\x01l2"], 1.0), ([A, B + "\x01l3"], 2.0)])
+    cache = FrameInfoCache()
+
+    first = build_frame_tree(records, context=dummy_session(), frame_info_cache=cache)
+    assert set(cache) == {A, B + "\x01l2", B + "\x01l3"}
+    assert cache[B + "\x01l2"] == ("b\x00b.py\x001", ("l2",))
+
+    second = build_frame_tree(records, context=dummy_session(), frame_info_cache=cache)
+    assert first and second
+    assert first.to_json_str() == second.to_json_str()
+    # parsed strings are interned, so frames share them
+    assert first.children[0].identifier is second.children[0].identifier
+
+    session = dummy_session()
+    session.frame_records = records
+    assert session.root_frame(trim_stem=False) is not None
+    assert len(session._frame_info_cache) == 3
+
+
+def test_frame_is_compact():
+    frame = Frame("b\x00b.py\x0012\x01cB\x01l13", time=2.0)
+
+    assert not hasattr(frame, "__dict__")
+    assert (frame.function, frame.file_path, frame.line_no) == ("b", "b.py", 12)
+    assert frame.attributes == {"cB": 2.0, "l13": 2.0}
+    assert frame.class_name == "B"
+
+    # frames without attributes don't allocate a dict until it's used
+    self_time = Frame(SELF_TIME_FRAME_IDENTIFIER, time=1.0)
+    assert self_time.class_name is None
+    assert self_time._attributes is None
+    assert (self_time.function, self_time.file_path, self_time.line_no) == ("[self]", None, None)
+
+
+def test_frame_records_from_sample_buffer():
+    buffer = SampleBuffer(root_frame_info=A, await_frame_info="[await]")
+    buffer.record([A, B], 1.0)
+    buffer.record([A, C], 2.0)
+
+    # while out of context, samples are recorded with the await stack
+    buffer.set_async_state("out_of_context_awaited", [A, B])
+    buffer.set_async_state("in_context")
+    buffer.record([A, B], 3.0)
+
+    assert len(buffer) == 3
+
+    records = FrameRecords.from_sample_buffer(buffer)
+
+    assert list(records) == [([A, B], 1.0), ([A, C], 2.0), ([A, B], 3.0)]
+    assert records.stack_trie.stack_for_node(records.stack_trie.node_for_stack([A, B, "[await]"]))
+    assert records.stack_ids[0] == records.stack_ids[2]
+
+
+def test_frame_records_grouped_by_root():
+    records = FrameRecords.from_list(
+        [([A, B], 1.0), ([C], 2.0), ([A], 3.0), ([C, B], 4.0), ([A, C], 5.0)]
+    )
+
+    grouped = records.grouped_by_root()
+
+    assert list(grouped) == [
+        ([A, B], 1.0),
+        ([A], 3.0),
+        ([A, C], 5.0),
+        ([C], 2.0),
+        ([C, B], 4.0),
+    ]
+
+
+def test_stack_trie_compacted():
+    trie = StackTrie()
+    ab = trie.node_for_stack([A, B])
+    trie.node_for_stack([C])
+    ac = trie.node_for_stack([A, C])
+
+    compacted, mapping = trie.compacted([ac])
+
+    # root, a, a/c
+    assert len(compacted) == 3
+    assert compacted.stack_for_node(mapping[ac]) == [A, C]
+    assert mapping[ab] == -1
+
+
+def test_ring_buffer_max_samples():
+    buffer = FrameRecordsRingBuffer(max_samples=2)
+    buffer.record([A], 1.0)
+    buffer.record([B], 2.0)
+    buffer.record([C], 3.0)
+
+    assert len(buffer) == 2
+    assert list(buffer.snapshot()) == [([B], 2.0), ([C], 3.0)]
+    assert buffer.duration == 5.0
+
+
+def test_ring_buffer_max_duration():
+    buffer = FrameRecordsRingBuffer(max_duration=3.5)
+    for stack in [[A], [B], [C], [A, B]]:
+        buffer.record(stack, 1.0)
+
+    # enough records are kept to cover the duration
+    assert list(buffer.snapshot()) == [([A], 1.0), ([B], 1.0), ([C], 1.0), ([A, B], 1.0)]
+
+    buffer.record([A, C], 1.0)
+    assert list(buffer.snapshot()) == [([B], 1.0), ([C], 1.0), ([A, B], 1.0), ([A, C], 1.0)]
+
+
+def test_ring_buffer_memory_is_bounded():
+    buffer = FrameRecordsRingBuffer(max_samples=10)
+
+    for i in range(10000):
+        # every record has a new stack
+        buffer.record([A, f"f{i}\x00file.py\x001"], 0.001)
+
+    assert len(buffer) == 10
+    assert len(buffer._records) < 2 * FrameRecordsRingBuffer.MIN_DROPPED_RECORDS
+    assert len(buffer._records.stack_trie) < 4 * FrameRecordsRingBuffer.MIN_DROPPED_RECORDS
+
+    snapshot = buffer.snapshot()
+    assert [stack for stack, _ in snapshot] == [
+        [A, f"f{i}\x00file.py\x001"] for i in range(9990, 10000)
+    ]
+    assert buffer.duration == pytest.approx(0.01)
+
+
+def test_ring_buffer_record_during_snapshot():
+    buffer = FrameRecordsRingBuffer(max_samples=2)
+    buffer.record([A], 1.0)
+
+    # like the sampler, record on the same thread, while the snapshot is
+    # being taken
+    def profile(frame, event, arg):
+        if event == "call" and frame.f_code.co_name == "__getitem__" and len(buffer) == 1:
+            buffer.record([B], 2.0)
+
+    sys.setprofile(profile)
+    try:
+        snapshot = buffer.snapshot()
+    finally:
+        sys.setprofile(None)
+
+    assert list(snapshot) == [([A], 1.0), ([B], 2.0)]
+
+
+def test_frame_records_take():
+    records = FrameRecords.from_list([([A, B], 1.0), ([C], 2.0)])
+
+    taken = records.take()
+    records.record([A], 3.0)
+
+    assert list(taken) == [([A, B], 1.0), ([C], 2.0)]
+    assert list(records) == [([A], 3.0)]
+    assert taken.stack_trie is records.stack_trie
+
+
+def test_frame_records_timestamps():
+    records = FrameRecords.from_list([([A], 1.0), ([B], 1.0)], timestamps=[10.0, 11.0])
+    assert records.timestamps is not None
+
+    records.record([C], 1.0, 12.0)
+    with pytest.raises(ValueError):
+        records.record([C], 1.0)
+
+    assert list(records[1:].timestamps or []) == [11.0, 12.0]
+    assert list(records.take().timestamps or []) == [10.0, 11.0, 12.0]
+    assert list(records.timestamps) == []
+
+    # timestamps are dropped if any of the inputs don't have them
+    with_timestamps = FrameRecords.from_list([([A], 1.0)], timestamps=[5.0])
+    without_timestamps = FrameRecords.from_list([([B], 1.0)])
+    assert FrameRecords.concatenate([with_timestamps, without_timestamps]).timestamps is None
+    assert FrameRecords.concatenate([with_timestamps, with_timestamps]).timestamps is not None
+
+
+def test_frame_records_sorted_by_timestamp():
+    records = FrameRecords.from_list(
+        [([A], 1.0), ([B], 2.0), ([C], 3.0)], timestamps=[30.0, 10.0, 20.0]
+    )
+
+    result = records.sorted_by_timestamp()
+
+    assert list(result) == [([B], 2.0), ([C], 3.0), ([A], 1.0)]
+    assert list(result.timestamps or []) == [10.0, 20.0, 30.0]
+
+    with pytest.raises(ValueError):
+        FrameRecords.from_list([([A], 1.0)]).sorted_by_timestamp()
+
+
+def test_session_timestamps_round_trip():
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(
+        [([A, B], 1.0), ([A, C], 2.0)], timestamps=[100.0, 102.0]
+    )
+
+    loaded = Session.from_json(session.to_json())
+
+    assert list(loaded.frame_records.timestamps or []) == [100.0, 102.0]
+
+
+def test_session_combine_merges_by_timestamp():
+    session_1 = dummy_session()
+    session_1.frame_records = FrameRecords.from_list(
+        [([A], 1.0), ([A], 1.0)], timestamps=[100.0, 102.0]
+    )
+    session_2 = dummy_session()
+    session_2.start_time = 101.0
+    session_2.frame_records = FrameRecords.from_list(
+        [([B], 1.0), ([B], 1.0)], timestamps=[101.0, 103.0]
+    )
+
+    combined = Session.combine(session_1, session_2)
+
+    assert [stack for stack, _ in combined.frame_records] == [[A], [B], [A], [B]]
+    assert list(combined.frame_records.timestamps or []) == [100.0, 101.0, 102.0, 103.0]
+
+
+def test_merged_frame_records_are_merged_lazily():
+    parts = [FrameRecords.from_list([([A, B], 1.0)]) for _ in range(3)]
+
+    merged = MergedFrameRecords(parts)
+    merged = MergedFrameRecords([merged, FrameRecords.from_list([([C], 2.0)])])
+
+    assert len(merged) == 4
+    assert merged._parts is not None
+
+    assert list(merged) == [([A, B], 1.0)] * 3 + [([C], 2.0)]
+    assert merged._parts is None
+    assert merged.timestamps is None
+
+    merged.record([A], 3.0)
+    assert len(merged) == 5
+
+
+def test_session_combine_many():
+    sessions = []
+    for i in range(3):
+        session = dummy_session()
+        session.start_time = 10.0 - i
+        session.duration = 1.0
+        session.sample_count = 1
+        session.sys_path = ["common", f"path{i}"]
+        session.sys_prefixes = ["prefix"]
+        session.frame_records = FrameRecords.from_list([([[A, B, C][i]], 1.0)])
+        sessions.append(session)
+
+    combined = Session.combine_many(sessions)
+
+    assert combined.start_time == 8.0
+    assert combined.duration == 3.0
+    assert combined.sample_count == 3
+    assert combined.sys_path == ["common", "path2", "path1", "path0"]
+    assert combined.sys_prefixes == ["prefix"]
+    # in order of start time
+    assert [stack for stack, _ in combined.frame_records] == [[C], [B], [A]]
+
+
+def test_ring_buffer_timestamps():
+    buffer = FrameRecordsRingBuffer(max_samples=2, record_timestamps=True)
+    for i in range(3000):
+        buffer.record([A], 1.0, float(i))
+
+    assert list(buffer.snapshot().timestamps or []) == [2998.0, 2999.0]
+
+
+def test_view_doesnt_copy():
+    records = FrameRecords.from_list([([A], 1.0), ([B], 2.0), ([C], 3.0)])
+
+    view = records.view(1, 3)
+
+    assert list(view) == [([B], 2.0), ([C], 3.0)]
+    assert isinstance(view.times, memoryview)
+    assert view.stack_trie is records.stack_trie
+
+
+MAIN_THREAD = "MainThread\x00<thread>\x001"
+WORKER_THREAD = "worker\x00<thread>\x002"
+
+
+def sliceable_session(**kwargs):
+    # like an all_threads profile, each thread's samples cover the session,
+    # and they're grouped by thread
+    session = dummy_session()
+    session.start_time = 100.0
+    session.duration = 4.0
+    session.cpu_time = 2.0
+    session.frame_records = FrameRecords.from_list(
+        [
+            ([MAIN_THREAD, A], 2.0),
+            ([MAIN_THREAD, C], 2.0),
+            ([WORKER_THREAD, B], 2.0),
+            ([WORKER_THREAD, A], 2.0),
+        ],
+        **kwargs,
+    )
+    session.sample_count = 4
+    return session
+
+
+@pytest.mark.parametrize("timestamps", [None, [102.0, 104.0, 102.0, 104.0]])
+def test_session_slice_by_time(timestamps):
+    session = sliceable_session(timestamps=timestamps)
+
+    sliced = session.slice(1.5, 3.5)
+
+    assert [stack[1] for stack, _ in sliced.frame_records] == [A, B]
+    assert sliced.start_time == 101.5
+    assert sliced.duration == 2.0
+    assert sliced.cpu_time == 1.0
+    assert sliced.sample_count == 2
+
+    root_frame = sliced.root_frame(trim_stem=False)
+    assert root_frame is not None
+    assert root_frame.time == 4.0
+
+    # open-ended slices include the ends
+    assert len(session.slice(end=2.5).frame_records) == 2
+    assert len(session.slice(start=2.5).frame_records) == 2
+
+
+def test_session_slice_single_thread_is_a_view():
+    session = dummy_session()
+    session.duration = 3.0
+    session.frame_records = FrameRecords.from_list([([A], 1.0), ([B], 1.0), ([C], 1.0)])
+
+    sliced = session.slice(0.5, 2.5)
+
+    assert [stack for stack, _ in sliced.frame_records] == [[A], [B]]
+    assert isinstance(sliced.frame_records.times, memoryview)
+
+
+def test_session_slice_by_thread():
+    session = sliceable_session()
+
+    assert [stack[1] for stack, _ in session.slice(threads=["worker"]).frame_records] == [B, A]
+    assert [stack[1] for stack, _ in session.slice(threads=[1]).frame_records] == [A, C]
+    # the time range is within the thread's own samples
+    assert [stack[1] for stack, _ in session.slice(2.5, threads=[2]).frame_records] == [A]
+    assert [stack[1] for stack, _ in session.slice(end=2.5, threads=[2]).frame_records] == [B]
+    assert len(session.slice(threads=["missing"]).frame_records) == 0
+
+
+def test_add_sample_merges_repeated_stacks():
+    records = FrameRecords(counts=array("I"))
+    for stack, time in [([A, B], 1.0), ([A, B], 2.0), ([A, C], 4.0), ([A, B], 8.0), ([A, B], 16.0)]:
+        records.add_sample(stack, time)
+
+    assert list(records) == [([A, B], 3.0), ([A, C], 4.0), ([A, B], 24.0)]
+    assert list(records.counts or []) == [2, 1, 2]
+    assert records.sample_count == 5
+
+    # the columns are carried through copies, views and merges
+    assert list(records[1:].counts or []) == [1, 2]
+    assert list(records.view(0, 2).counts or []) == [2, 1]
+    assert list(records.select([2, 0]).counts or []) == [2, 2]
+    merged = FrameRecords.concatenate([records, FrameRecords.from_list([([C], 1.0)])])
+    assert list(merged.counts or []) == [2, 1, 2, 1]
+    assert merged.sample_count == 6
+
+    # the tree is the same as if every sample had its own record
+    root_frame = build_frame_tree(records, context=dummy_session())
+    assert root_frame
+    assert root_frame.time == 31.0
+
+    with pytest.raises(ValueError):
+        FrameRecords().add_sample([A], 1.0)
+    with pytest.raises(ValueError):
+        FrameRecords().record_stack_id(ROOT_NODE_ID, 1.0, count=2)
+
+
+def test_session_sample_count_with_counts():
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(
+        [([A], 1.0), ([A, B], 2.0), ([A], 3.0)], counts=[10, 20, 30]
+    )
+    session.sample_count = 60
+    session.duration = 6.0
+
+    loaded = Session.from_json(session.to_json())
+    assert list(loaded.frame_records.counts or []) == [10, 20, 30]
+
+    assert session.slice(0.0, 3.5).sample_count == 30
+    assert session.filter_by_function(frame_info_get_identifier(B)).sample_count == 20
@@ -0,0 +1,101 @@
+import pytest
+
+from pyinstrument.frame_info import frame_info_get_identifier
+from pyinstrument.frame_records import FrameRecords
+
+from .util import dummy_session
+
+A = "a\x00a.py\x001"
+B = "b\x00b.py\x001\x01l5"
+B_OTHER_LINE = "b\x00b.py\x001\x01l9"
+C = "execute\x00site-packages/psycopg2/cursor.py\x0010\x01l12"
+B_ID = frame_info_get_identifier(B)
+C_ID = frame_info_get_identifier(C)
+
+
+@pytest.fixture
+def session():
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(
+        [
+            ([A], 1.0),
+            ([A, B], 2.0),
+            ([A, B_OTHER_LINE, C], 4.0),
+            # recursion - B is only counted once
+            ([A, B, C, B], 8.0),
+            ([A, C], 16.0),
+        ]
+    )
+    return session
+
+
+def test_inclusive_and_self_time(session):
+    index = session.function_index
+
+    assert index.inclusive_time(A) == 31.0
+    assert index.self_time(A) == 1.0
+    assert index.inclusive_time(B_ID) == 14.0
+    assert index.self_time(B_ID) == 10.0
+    assert index.inclusive_time(C_ID) == 28.0
+    assert index.self_time(C_ID) == 20.0
+    assert index.inclusive_time("missing") == 0.0
+
+
+def test_find(session):
+    index = session.function_index
+
+    assert index.find("execute") == [C_ID]
+    assert index.find("execute", file_path_contains="psycopg2") == [C_ID]
+    assert index.find("execute", file_path_contains="sqlite") == []
+    assert sorted(index.identifiers) == sorted([A, B_ID, C_ID])
+
+
+def test_filter_by_function(session):
+    filtered = session.filter_by_function(C_ID)
+
+    assert filtered.sample_count == 3
+    assert [time for _, time in filtered.frame_records] == [4.0, 8.0, 16.0]
+    assert session.function_index.sample_indexes(C_ID) == [2, 3, 4]
+    assert session.function_index.sample_indexes(B_ID) == [1, 2, 3]
+
+
+def test_index_is_cached(session):
+    index = session.function_index
+    assert session.function_index is index
+
+    session.frame_records.record([A], 1.0)
+    assert session.function_index is not index
+    assert session.function_index.inclusive_time(A) == 32.0
+
+
+def test_matches_frame_tree(session):
+    root_frame = session.root_frame(trim_stem=False)
+    assert root_frame is not None
+
+    assert session.function_index.inclusive_time(A) == root_frame.time
+
+
+def test_malformed_line_number():
+    # the index only uses the identifier, so a line number that isn't a
+    # number doesn't stop it being queried
+    malformed = "broken\x00broken.py\x00?\x01l3"
+    malformed_id = frame_info_get_identifier(malformed)
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list([([A, malformed], 1.0), ([A], 2.0)])
+    index = session.function_index
+
+    assert index.find("broken", file_path_contains="broken.py") == [malformed_id]
+    assert index.inclusive_time(malformed_id) == 1.0
+    assert index.self_time(malformed_id) == 1.0
+    assert index.sample_indexes(malformed_id) == [0]
+
+
+def test_outermost_times(session):
+    index = session.function_index
+
+    # B and C call each other, so their inclusive times overlap
+    assert index.inclusive_time(B_ID) + index.inclusive_time(C_ID) == 42.0
+    times = index.outermost_times([B_ID, C_ID])
+    assert times == {B_ID: 14.0, C_ID: 16.0}
+    # every sample except the first contains one of them
+    assert sum(times.values()) == 30.0
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+
+import pytest
+
+from pyinstrument.path_shortening import SysPathIndex
+
+from .util import dummy_session
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="uses posix paths")
+
+SYS_PATH = [
+    "/home/user/project",
+    "/usr/lib/python3.12",
+    "/usr/lib/python3.12/lib-dynload",
+    "/home/user/.venv/lib/python3.12/site-packages",
+    "/home/user/.venv/lib/python3.12/site-packages/setuptools/_vendor",
+]
+
+
+def shorten_with_every_entry(path, sys_path):
+    # the straightforward version, which tries every entry
+    result = path
+    if os.sep in path:
+        for entry in sys_path:
+            candidate = os.path.relpath(path, entry)
+            if len(candidate.split(os.sep)) < len(result.split(os.sep)):
+                result = candidate
+    return result
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/home/user/project/app/views.py", "app/views.py"),
+        ("/usr/lib/python3.12/json/decoder.py", "json/decoder.py"),
+        ("/home/user/.venv/lib/python3.12/site-packages/django/urls.py", "django/urls.py"),
+        (
+            "/home/user/.venv/lib/python3.12/site-packages/setuptools/_vendor/packaging/tags.py",
+            "packaging/tags.py",
+        ),
+        ("/usr/lib/python3.12/lib-dynload/x.so", "x.so"),
+        ("/usr/lib/python3.13/os.py", "../python3.13/os.py"),
+        ("/opt/x.py", "/opt/x.py"),
+        ("<built-in>", "<built-in>"),
+        ("/home/user", ".."),
+    ],
+)
+def test_shorten(path, expected):
+    assert SysPathIndex(SYS_PATH).shorten(path) == expected
+    assert shorten_with_every_entry(path, SYS_PATH) == expected
+
+
+def test_matches_trying_every_entry():
+    rng = random.Random(0)
+    names = ["a", "b", "lib", "site-packages"]
+
+    def random_path(max_depth):
+        return "/" + "/".join(rng.choice(names) for _ in range(rng.randint(0, max_depth)))
+
+    for _ in range(200):
+        sys_path = [random_path(4) for _ in range(rng.randint(0, 6))] + ["", "."]
+        rng.shuffle(sys_path)
+        index = SysPathIndex(sys_path)
+
+        for _ in range(50):
+            path = random_path(6) + rng.choice(["/f.py", ""])
+            assert index.shorten(path) == shorten_with_every_entry(path, sys_path)
+
+
+def test_session_shorten_path():
+    session = dummy_session()
+    session.sys_path = SYS_PATH
+
+    assert session.shorten_path("/home/user/project/app/views.py") == "app/views.py"
+    # cached
+    assert session.shorten_path("/home/user/project/app/views.py") == "app/views.py"
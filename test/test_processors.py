@@ -360,3 +360,133 @@ def test_group_library_frames_processor(monkeypatch):
     assert group_root.children[0].children[0] in group.frames
     assert group_root.children[0].children[0] in group.exit_frames
     assert group_root.children[0].children[0].children[0] not in group.frames
+
+
+def importing_frame_tree():
+    # importlib and __tracebackhide__ frames nested within each other, so that
+    # removing one kind brings up frames of the other kind
+    frame = Frame(
+        identifier_or_frame_info="<module>\x00app.py\x001\x01h0",
+        children=[
+            Frame(
+                identifier_or_frame_info="_find_and_load\x00<frozen importlib._bootstrap>\x00997\x01h0",
+                children=[
+                    self_time_frame(0.1),
+                    Frame(
+                        identifier_or_frame_info="hidden\x00../foo.py\x0010\x01h1",
+                        children=[
+                            self_time_frame(0.2),
+                            Frame(
+                                identifier_or_frame_info="_call\x00<frozen importlib._bootstrap>\x00241\x01h0",
+                                children=[
+                                    Frame(
+                                        identifier_or_frame_info="<module>\x00app/b.py\x001\x01h0",
+                                        children=[self_time_frame(0.3)],
+                                    )
+                                ],
+                            ),
+                        ],
+                    ),
+                    Frame(
+                        identifier_or_frame_info="<module>\x00app/a.py\x001\x01h0",
+                        children=[self_time_frame(0.4)],
+                    ),
+                ],
+            ),
+            self_time_frame(0.001),
+        ],
+        context=dummy_session(),
+    )
+    calculate_frame_tree_times(frame)
+    return frame
+
+
+def describe_frame_tree(frame):
+    return (frame.identifier, approx(frame.time), [describe_frame_tree(c) for c in frame.children])
+
+
+def test_run_processors_matches_running_each_in_turn():
+    processor_list = [
+        processors.remove_importlib,
+        processors.remove_tracebackhide,
+        processors.merge_consecutive_self_time,
+        processors.aggregate_repeated_calls,
+        processors.remove_irrelevant_nodes,
+        processors.remove_unnecessary_self_time_nodes,
+        processors.remove_first_pyinstrument_frames_processor,
+        processors.group_library_frames_processor,
+    ]
+
+    expected = importing_frame_tree()
+    for processor in processor_list:
+        expected = processor(expected, options={})
+
+    frame = processors.run_processors(importing_frame_tree(), processor_list, options={})
+
+    assert frame
+    frame.self_check()
+    assert describe_frame_tree(frame) == describe_frame_tree(expected)
+    assert [c.identifier for c in frame.children] == [
+        "<module>\x00app/a.py\x001",
+        SELF_TIME_FRAME_IDENTIFIER,
+        "<module>\x00app/b.py\x001",
+    ]
+
+
+def test_run_processors_fuses_visitors():
+    visits = []
+    function_processor_calls = []
+
+    def make_visitor(name, fusable):
+        @processors.frame_visitor(fusable=fusable)
+        def visitor(frame, options, root):
+            if frame is root or frame is root.children[0]:
+                visits.append((name, frame is root))
+
+        return visitor
+
+    def function_processor(frame, options):
+        function_processor_calls.append(list(visits))
+        return frame
+
+    frame = processors.run_processors(
+        importing_frame_tree(),
+        [
+            make_visitor("a", fusable=False),
+            make_visitor("b", fusable=True),
+            make_visitor("c", fusable=False),
+            make_visitor("d", fusable=True),
+            function_processor,
+            make_visitor("e", fusable=True),
+        ],
+        options={},
+    )
+
+    assert frame
+    # visitors in the same walk visit each frame in turn
+    assert visits == [
+        ("a", True),
+        ("b", True),
+        ("a", False),
+        ("b", False),
+        ("c", True),
+        ("d", True),
+        ("c", False),
+        ("d", False),
+        ("e", True),
+        ("e", False),
+    ]
+    assert function_processor_calls == [visits[:8]]
+
+
+def test_frame_removers_fuse_with_each_other():
+    assert processors.remove_tracebackhide.can_follow([processors.remove_importlib])
+    assert not processors.remove_tracebackhide.can_follow(
+        [processors.remove_importlib, processors.merge_consecutive_self_time]
+    )
+    assert processors.merge_consecutive_self_time.can_follow(
+        [processors.remove_importlib, processors.remove_tracebackhide]
+    )
+    assert not processors.aggregate_repeated_calls.can_follow(
+        [processors.merge_consecutive_self_time]
+    )
@@ -2,6 +2,7 @@ import asyncio
 import dataclasses
 import inspect
 import json
+import threading
 import time
 from functools import partial
 from test.fake_time_util import fake_time
@@ -10,11 +11,13 @@ from typing import Generator, Optional
 import pytest
 
 from pyinstrument import Profiler, renderers
-from pyinstrument.frame import Frame
+from pyinstrument.frame import DUMMY_ROOT_FRAME_IDENTIFIER, Frame
+from pyinstrument.frame_records import FrameRecords, MergedFrameRecords
+from pyinstrument.profiler import ActiveProfilerSession
 from pyinstrument.renderers.speedscope import SpeedscopeEvent, SpeedscopeEventType, SpeedscopeFrame
 from pyinstrument.session import Session
 
-from .util import assert_never, busy_wait, flaky_in_ci
+from .util import assert_never, busy_wait, flaky_in_ci, walk_frames
 
 # Utilities #
 
@@ -358,6 +361,39 @@ def test_state_management():
     assert profiler.last_session is None
 
 
+def test_restarted_profiler_merges_once(monkeypatch):
+    merges = 0
+    merge = MergedFrameRecords._merge
+
+    def counting_merge(self: MergedFrameRecords):
+        nonlocal merges
+        merges += 1
+        merge(self)
+
+    monkeypatch.setattr(MergedFrameRecords, "_merge", counting_merge)
+
+    profiler = Profiler(interval=0.0001)
+    previous_sample_count = 0
+    for _ in range(20):
+        profiler.start()
+        busy_wait(0.005)
+        session = profiler.stop()
+        # stop() returns every run so far, without merging their records
+        assert profiler.last_session is session
+        assert session.sample_count > previous_sample_count
+        assert len(session.frame_records) > 0
+        previous_sample_count = session.sample_count
+
+    assert merges == 0
+
+    # the records are merged once, when they're first read
+    session = profiler.last_session
+    assert session is not None
+    assert sum(session.frame_records.counts or []) == session.sample_count
+    assert len(session.frame_records.times) > 0
+    assert merges == 1
+
+
 @pytest.mark.parametrize(
     "profiler_method_name,renderer_class",
     [
@@ -405,3 +441,300 @@ def test_profiler_raises_on_double_subscribe():
         profiler.start()
     assert "Profiler is already running" in str(e.value)
     profiler.stop()
+
+
+def _profile_functions(profiler: Profiler) -> Session:
+    with fake_time():
+        profiler.start()
+
+        long_function_a()
+        long_function_b()
+        ClassWithMethods().long_method()
+        ClassWithMethods.long_class_method()
+
+        return profiler.stop()
+
+
+def test_native_recording_matches_python_recording():
+    python_session = _profile_functions(Profiler())
+    native_session = _profile_functions(Profiler(native_recording=True))
+
+    assert len(native_session.frame_records) == len(python_session.frame_records)
+
+    def summarise(frame: Optional[Frame]):
+        assert frame
+        return (frame.identifier, frame.time, [summarise(c) for c in frame.children])
+
+    assert summarise(native_session.root_frame()) == summarise(python_session.root_frame())
+
+    native_root_frame = native_session.root_frame()
+    assert native_root_frame
+    assert native_root_frame.time == pytest.approx(1.25)
+
+
+def test_native_recording_with_another_profiler():
+    native_profiler = Profiler(native_recording=True)
+    other_profiler = Profiler(async_mode="disabled")
+
+    with fake_time():
+        native_profiler.start()
+        long_function_a()
+
+        # while the other profiler runs, samples go via Python
+        other_profiler.start()
+        long_function_b()
+        other_profiler.stop()
+
+        long_function_a()
+        native_session = native_profiler.stop()
+
+    root_frame = native_session.root_frame()
+    assert root_frame
+    assert root_frame.time == pytest.approx(1.0)
+
+    other_root_frame = other_profiler.last_session and other_profiler.last_session.root_frame()
+    assert other_root_frame
+    assert other_root_frame.time == pytest.approx(0.5)
+
+
+@flaky_in_ci
+def test_all_threads():
+    stop_event = threading.Event()
+
+    def worker():
+        while not stop_event.is_set():
+            busy_wait(0.01)
+
+    worker_thread = threading.Thread(target=worker, name="worker")
+    worker_thread.start()
+
+    try:
+        with Profiler(all_threads=True, interval=0.001) as profiler:
+            busy_wait(0.2)
+    finally:
+        stop_event.set()
+        worker_thread.join()
+
+    session = profiler.last_session
+    assert session
+
+    # the sampler thread doesn't sample itself
+    thread_names = {
+        stack[0].split("\x00")[0]
+        for stack, _ in session.frame_records
+        if stack[0].split("\x00")[1] == "<thread>"
+    }
+    assert thread_names == {threading.current_thread().name, "worker"}
+
+    root_frame = session.root_frame()
+    assert root_frame
+    assert root_frame.identifier == DUMMY_ROOT_FRAME_IDENTIFIER
+    assert len(root_frame.children) == 2
+
+    for thread_frame in root_frame.children:
+        assert thread_frame.time == pytest.approx(0.2, rel=0.3)
+
+    assert any(f.function == "worker" for f in walk_frames(root_frame))
+
+
+@flaky_in_ci
+def test_all_threads_slice():
+    stop_event = threading.Event()
+
+    def worker():
+        while not stop_event.is_set():
+            busy_wait(0.01)
+
+    worker_thread = threading.Thread(target=worker, name="worker")
+    worker_thread.start()
+
+    try:
+        with Profiler(all_threads=True, interval=0.001) as profiler:
+            busy_wait(0.4)
+    finally:
+        stop_event.set()
+        worker_thread.join()
+
+    session = profiler.last_session
+    assert session
+    half = session.duration / 2
+
+    # each thread has samples in both halves of the session
+    for sliced in [session.slice(end=half), session.slice(start=half)]:
+        root_frame = sliced.root_frame()
+        assert root_frame
+        assert len(root_frame.children) == 2
+        for thread_frame in root_frame.children:
+            assert thread_frame.time == pytest.approx(half, rel=0.3)
+
+    # the time range applies to the chosen thread's own samples
+    worker_slice = session.slice(start=half, threads=["worker"])
+    root_frame = worker_slice.root_frame()
+    assert root_frame
+    assert root_frame.time == pytest.approx(half, rel=0.3)
+
+
+def test_single_thread_slice_is_a_view():
+    with Profiler(interval=0.001) as profiler:
+        busy_wait(0.2)
+
+    session = profiler.last_session
+    assert session
+
+    sliced = session.slice(start=session.duration / 2)
+    assert isinstance(sliced.frame_records.stack_ids, memoryview)
+    assert isinstance(sliced.frame_records.times, memoryview)
+    assert 0 < sliced.sample_count <= session.sample_count
+
+
+@flaky_in_ci
+def test_thread_cputime():
+    with Profiler(use_thread_cputime=True) as profiler:
+        busy_wait(0.2)
+        time.sleep(0.2)
+
+    root_frame = profiler.last_session and profiler.last_session.root_frame()
+    assert root_frame
+
+    # only the busy wait used CPU time
+    assert root_frame.time == pytest.approx(0.2, rel=0.3)
+    busy_wait_frame = next(f for f in walk_frames(root_frame) if f.function == "busy_wait")
+    assert busy_wait_frame.time == pytest.approx(0.2, rel=0.3)
+
+
+def test_conflicting_timer_options():
+    with pytest.raises(ValueError, match="use_timing_thread"):
+        Profiler(timer_type="cputime_signal", use_timing_thread=True)
+    with pytest.raises(ValueError, match="use_thread_cputime"):
+        Profiler(timer_type="walltime", use_thread_cputime=True)
+    with pytest.raises(ValueError, match="timer_type must be one of"):
+        Profiler(timer_type="timer_func")
+
+
+def test_conflicting_sys_monitoring_options():
+    with pytest.raises(ValueError, match="async_mode"):
+        Profiler(use_sys_monitoring=True)
+    with pytest.raises(ValueError, match="native_recording"):
+        Profiler(use_sys_monitoring=True, async_mode="disabled", native_recording=True)
+    with pytest.raises(ValueError, match="cputime_thread"):
+        Profiler(use_sys_monitoring=True, async_mode="disabled", use_thread_cputime=True)
+
+
+def test_overhead_budget_records_interval_range():
+    with Profiler(interval=0.001, overhead_budget=0.5) as profiler:
+        busy_wait(0.2)
+
+    session = profiler.last_session
+    assert session
+    assert session.min_interval == 0.001
+    assert session.max_interval >= session.min_interval
+
+
+@flaky_in_ci
+def test_ring_buffer_snapshot():
+    def first_phase():
+        busy_wait(0.2)
+
+    def second_phase():
+        busy_wait(0.2)
+
+    profiler = Profiler(ring_buffer_duration=0.1)
+    profiler.start()
+    try:
+        first_phase()
+        second_phase()
+
+        # the snapshot only includes the last 0.1 seconds
+        snapshot = profiler.snapshot()
+        assert profiler.is_running
+    finally:
+        session = profiler.stop()
+
+    assert snapshot.duration == pytest.approx(0.1, rel=0.3)
+    root_frame = snapshot.root_frame()
+    assert root_frame
+    assert root_frame.time == pytest.approx(0.1, rel=0.3)
+    assert not any(f.function == "first_phase" for f in walk_frames(root_frame))
+    assert any(f.function == "second_phase" for f in walk_frames(root_frame))
+
+    assert session.duration == pytest.approx(0.1, rel=0.3)
+
+
+def test_snapshot_without_ring_buffer():
+    profiler = Profiler()
+
+    with pytest.raises(RuntimeError):
+        profiler.snapshot()
+
+    profiler.start()
+    busy_wait(0.1)
+    snapshot = profiler.snapshot()
+    busy_wait(0.1)
+    session = profiler.stop()
+
+    assert snapshot.sample_count < session.sample_count
+    assert profiler.last_session is session
+
+
+def test_repeated_samples_are_merged():
+    profiler = Profiler(interval=0.0001)
+    with profiler:
+        busy_wait(0.1)
+
+    session = profiler.last_session
+    assert session
+    counts = session.frame_records.counts
+    assert counts is not None
+    assert sum(counts) == session.sample_count
+    assert len(session.frame_records) < session.sample_count
+
+
+def test_take_frame_records():
+    active_session = ActiveProfilerSession(
+        start_time=0.0,
+        start_process_time=0.0,
+        start_call_stack=[],
+        target_description="",
+        interval=0.001,
+    )
+    frame_records = active_session.frame_records
+    assert isinstance(frame_records, FrameRecords)
+    active_session.record(["a\x00a.py\x001"], 1.0)
+    active_session.record(["a\x00a.py\x001"], 2.0)
+
+    taken = active_session.take_frame_records()
+
+    # a sample that started before the take doesn't change what was taken
+    frame_records.add_sample(["a\x00a.py\x001"], 4.0)
+    assert list(taken.times) == [3.0]
+    assert list(taken.counts or []) == [2]
+
+    # later samples go to a new object, which shares the stack trie
+    active_session.record(["a\x00a.py\x001"], 8.0)
+    new_records = active_session.frame_records
+    assert isinstance(new_records, FrameRecords)
+    assert new_records is not frame_records
+    assert new_records.stack_trie is taken.stack_trie
+    assert list(new_records.times) == [8.0]
+    assert list(new_records.counts or []) == [1]
+
+
+def test_record_timestamps():
+    profiler = Profiler(record_timestamps=True)
+    start = time.time()
+    with profiler:
+        busy_wait(0.1)
+        time.sleep(0.05)
+    end = time.time()
+
+    session = profiler.last_session
+    assert session
+    timestamps = session.frame_records.timestamps
+    assert timestamps is not None
+    assert len(timestamps) == session.sample_count
+    assert list(timestamps) == sorted(timestamps)
+    assert start <= timestamps[0] and timestamps[-1] <= end
+
+    # the timestamps survive saving and loading
+    loaded = Session.from_json(json.loads(json.dumps(session.to_json())))
+    assert loaded.frame_records.timestamps == timestamps
@@ -84,7 +84,8 @@ def test_sleep_trio():
 
 @flaky_in_ci
 @pytest.mark.parametrize("engine", ["asyncio", "trio"])
-def test_profiler_task_isolation(engine):
+@pytest.mark.parametrize("native_recording", [False, True])
+def test_profiler_task_isolation(engine, native_recording):
     profiler_session: Optional[Session] = None
 
     async def async_wait(sync_time, async_time, profile=False, engine="asyncio"):
@@ -92,7 +93,7 @@ def test_profiler_task_isolation(engine):
         profiler = None
 
         if profile:
-            profiler = Profiler()
+            profiler = Profiler(native_recording=native_recording)
             profiler.start()
 
         time.sleep(sync_time / 2)
@@ -9,6 +9,7 @@ from unittest.mock import patch
 import pytest
 
 from pyinstrument import renderers
+from pyinstrument.frame_records import FrameRecords
 from pyinstrument.profiler import Profiler
 from pyinstrument.session import Session
 
@@ -118,7 +119,9 @@ def test_html_renderer_resampling(capsys):
     )
 
     renderer = renderers.HTMLRenderer()
-    with patch("pyinstrument.session.Session._resample_frame_records") as mock_resample:
+    with patch(
+        "pyinstrument.session.Session._resample_frame_records", return_value=FrameRecords()
+    ) as mock_resample:
         renderer.render(session)
 
     captured = capsys.readouterr()
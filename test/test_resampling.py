@@ -0,0 +1,94 @@
+import random
+from array import array
+
+import pytest
+
+from pyinstrument import resampling
+from pyinstrument.frame_records import FrameRecords
+
+A = "a\x00a.py\x001"
+B = "b\x00b.py\x001"
+C = "c\x00c.py\x001"
+
+
+@pytest.fixture(params=["numpy", "python"])
+def implementation(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(resampling, "numpy", None)
+    return request.param
+
+
+def random_records(count=5000, timestamps=False):
+    rng = random.Random(1)
+    records = FrameRecords.from_list(
+        [(rng.choice([[A], [A, B], [A, C]]), rng.expovariate(1000)) for _ in range(count)],
+        timestamps=[float(i) for i in range(count)] if timestamps else None,
+    )
+    return records
+
+
+def reference_resample(records, interval):
+    result = []
+    total = 0.0
+    previous_multiple = 0
+    previous_total = 0.0
+    for stack, time in records:
+        total += time
+        multiple = int(total / interval)
+        if multiple != previous_multiple:
+            result.append((stack, total - previous_total))
+            previous_multiple = multiple
+            previous_total = total
+    return result
+
+
+def test_resample(implementation):
+    records = random_records()
+
+    resampled = resampling.resample(records, 0.005)
+
+    assert list(resampled) == reference_resample(records, 0.005)
+    assert resampled.stack_trie is records.stack_trie
+    assert sum(resampled.times) == pytest.approx(sum(records.times), abs=0.005)
+
+
+def test_resample_keeps_timestamps(implementation):
+    records = random_records(timestamps=True)
+
+    resampled = resampling.resample(records, 0.005)
+
+    assert resampled.timestamps is not None
+    assert len(resampled.timestamps) == len(resampled)
+    assert list(resampled.timestamps) == sorted(resampled.timestamps)
+
+
+def test_resample_keeps_counts(implementation):
+    records = random_records()
+    records.counts = array("I", [1] * len(records))
+
+    resampled = resampling.resample(records, 0.005)
+
+    # each record stands for the intervals it crossed
+    assert resampled.counts is not None
+    assert list(resampled) == reference_resample(records, 0.005)
+    assert resampled.sample_count == int(sum(records.times) / 0.005)
+
+
+def test_resample_empty(implementation):
+    assert len(resampling.resample(FrameRecords(), 0.001)) == 0
+    assert resampling.interval_for_count(FrameRecords(), 0.001, 10) == 0.001
+
+
+@pytest.mark.parametrize("max_count", [0, 10, 100, 1000, 10000])
+def test_interval_for_count(implementation, max_count):
+    records = random_records()
+
+    interval = resampling.interval_for_count(records, 0.0001, max_count)
+
+    if max_count > 0:
+        assert len(resampling.resample(records, interval)) <= max_count
+    if interval > 0.0001:
+        # it's the smallest interval that does
+        assert len(resampling.resample(records, interval / 2)) > max_count
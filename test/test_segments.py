@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from pyinstrument import Profiler
+from pyinstrument.segments import SegmentWriter, read_segments, segment_paths
+
+from .util import busy_wait, flaky_in_ci, walk_frames
+
+
+def first_phase():
+    busy_wait(0.1)
+
+
+def second_phase():
+    busy_wait(0.1)
+
+
+@flaky_in_ci
+def test_segments_round_trip(tmp_path):
+    profiler = Profiler()
+    profiler.start()
+    writer = SegmentWriter(profiler, tmp_path, flush_interval=1000)
+    writer.start()
+
+    first_phase()
+    assert writer.flush() is not None
+    second_phase()
+
+    writer.stop()
+    remainder = profiler.stop()
+
+    # everything was written to segments before the profiler stopped
+    assert remainder.sample_count < 5
+    assert len(segment_paths(tmp_path)) == 2
+
+    session = read_segments(tmp_path)
+    assert session.duration == pytest.approx(0.2, rel=0.3)
+
+    root_frame = session.root_frame()
+    assert root_frame
+    functions = {f.function for f in walk_frames(root_frame)}
+    assert {"first_phase", "second_phase"} <= functions
+
+
+def test_segment_retention(tmp_path):
+    profiler = Profiler()
+    profiler.start()
+    writer = SegmentWriter(profiler, tmp_path, max_total_bytes=0)
+
+    busy_wait(0.01)
+    writer.flush()
+    # the cap is strict, even for the newest segment
+    assert segment_paths(tmp_path) == []
+
+    writer.max_total_bytes = 10**9
+    for _ in range(3):
+        busy_wait(0.01)
+        writer.flush()
+
+    paths = segment_paths(tmp_path)
+    assert len(paths) == 3
+    sizes = [p.stat().st_size for p in paths]
+
+    writer.max_total_bytes = sizes[-1] + sizes[-2]
+    busy_wait(0.01)
+    newest = writer.flush()
+    profiler.stop()
+
+    # enough of the oldest segments are deleted to fit the new one
+    remaining = segment_paths(tmp_path)
+    assert newest in remaining
+    assert paths[0] not in remaining
+    assert sum(p.stat().st_size for p in remaining) <= writer.max_total_bytes
+
+
+def test_profiler_flush():
+    profiler = Profiler()
+
+    with pytest.raises(RuntimeError):
+        profiler.flush()
+
+    profiler.start()
+    busy_wait(0.1)
+    flushed = profiler.flush()
+    time.sleep(0.05)
+    rest = profiler.stop()
+
+    assert flushed.duration == pytest.approx(0.1, rel=0.3)
+    assert rest.start_time == pytest.approx(flushed.start_time + flushed.duration)
+    assert rest.duration == pytest.approx(0.05, rel=0.5)
+    assert flushed.sample_count > rest.sample_count
+
+
+def test_read_segments_empty_directory(tmp_path):
+    with pytest.raises(ValueError):
+        read_segments(tmp_path)
@@ -0,0 +1,177 @@
+import io
+import json
+import sys
+import types
+
+import pytest
+
+from pyinstrument import session_format
+from pyinstrument.frame_records import FrameRecords
+from pyinstrument.session import Session
+
+from .util import dummy_session
+
+A = "a\x00a.py\x001"
+B = "b\x00b.py\x001\x01l5"
+C = "cé\x00é/c.py\x0110"
+
+
+def session_with_records(**kwargs):
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(
+        [([A, B], 0.001), ([A, C], 0.25), ([A, B], 1e-9), ([A], 3.0)], **kwargs
+    )
+    session.sample_count = 4
+    return session
+
+
+def test_binary_round_trip(tmp_path):
+    session = session_with_records()
+    path = tmp_path / "session.pyisession"
+
+    session.save(path, format="binary")
+    assert path.read_bytes().startswith(session_format.MAGIC)
+
+    loaded = Session.load(path)
+    assert list(loaded.frame_records) == list(session.frame_records)
+    assert loaded.frame_records.timestamps is None
+    assert loaded.to_json() == session.to_json()
+
+
+def test_binary_round_trip_with_timestamps():
+    session = session_with_records(timestamps=[1.0, 2.0, 3.0, 4.0])
+
+    loaded = Session.from_binary(session.to_binary())
+
+    assert list(loaded.frame_records.timestamps or []) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_round_trip_with_counts():
+    session = session_with_records(counts=[1, 5, 1, 2])
+
+    loaded = Session.from_binary(session.to_binary())
+    assert list(loaded.frame_records.counts or []) == [1, 5, 1, 2]
+    assert loaded.frame_records.timestamps is None
+
+    loaded = Session.from_json(json.loads(json.dumps(session.to_json())))
+    assert list(loaded.frame_records.counts or []) == [1, 5, 1, 2]
+
+
+def test_json_sessions_still_load(tmp_path):
+    session = session_with_records()
+    path = tmp_path / "session.pyisession"
+
+    # JSON is the default, so existing callers get what they expect
+    session.save(path)
+    json.loads(path.read_text())
+
+    loaded = Session.load(path)
+    assert list(loaded.frame_records) == list(session.frame_records)
+
+
+def test_binary_is_smaller_than_json():
+    session = dummy_session()
+    session.frame_records = FrameRecords.from_list(
+        [([A, B, C], 0.001)] * 1000 + [([A, C, B], 0.001)] * 1000
+    )
+
+    assert len(session.to_binary()) * 5 < len(json.dumps(session.to_json()))
+
+
+def test_invalid_binary_data():
+    data = session_with_records().to_binary()
+
+    with pytest.raises(session_format.SessionFormatError):
+        Session.from_binary(data[:-10])
+
+    with pytest.raises(session_format.SessionFormatError, match="newer format"):
+        header = session_format._HEADER.pack(session_format.MAGIC, session_format.VERSION + 1, 0)
+        Session.from_binary(header + data[len(header) :])
+
+    with pytest.raises(session_format.SessionFormatError):
+        Session.from_binary(b"{}")
+
+
+def test_lazy_load(tmp_path):
+    session = session_with_records(timestamps=[1.0, 2.0, 3.0, 4.0])
+    path = tmp_path / "session.pyisession"
+    session.save(path, format="binary")
+
+    loaded = Session.load(path, lazy=True)
+
+    if sys.byteorder == "little":
+        # the records haven't been copied out of the file
+        assert isinstance(loaded.frame_records.stack_ids, memoryview)
+        assert isinstance(loaded.frame_records.times, memoryview)
+
+    assert list(loaded.frame_records) == list(session.frame_records)
+    assert list(loaded.frame_records.timestamps or []) == [1.0, 2.0, 3.0, 4.0]
+    assert loaded.to_json() == session.to_json()
+
+    root_frame = loaded.root_frame(trim_stem=False)
+    assert root_frame is not None
+    assert root_frame.time == pytest.approx(sum(session.frame_records.times))
+
+    resampled = Session._resample_frame_records(loaded.frame_records, 1.0)
+    assert len(resampled) < len(loaded.frame_records)
+
+    combined = Session.combine(loaded, session_with_records())
+    assert len(combined.frame_records) == 8
+
+
+def test_big_endian_round_trip_of_views(monkeypatch):
+    session = session_with_records(timestamps=[1.0, 2.0, 3.0, 4.0], counts=[1, 5, 1, 2])
+    # views have memoryview columns, like a lazily-loaded session
+    session.frame_records = session.frame_records.view(1, 4)
+    monkeypatch.setattr(session_format, "sys", types.SimpleNamespace(byteorder="big"))
+
+    data = session_format.encode({}, session.frame_records)
+    _, frame_records = session_format.decode(data)
+
+    assert list(frame_records) == list(session.frame_records)
+    assert list(frame_records.timestamps or []) == [2.0, 3.0, 4.0]
+    assert list(frame_records.counts or []) == [5, 1, 2]
+
+
+def test_lazy_load_json_falls_back(tmp_path):
+    session = session_with_records()
+    path = tmp_path / "session.pyisession"
+    session.save(path, format="json")
+
+    loaded = Session.load(path, lazy=True)
+
+    assert list(loaded.frame_records) == list(session.frame_records)
+
+
+@pytest.mark.parametrize("format", ["binary", "json"])
+@pytest.mark.parametrize("extension", [".pyisession.gz", ".pyisession.xz"])
+def test_compressed_round_trip(tmp_path, format, extension):
+    session = session_with_records(timestamps=[1.0, 2.0, 3.0, 4.0])
+    path = tmp_path / f"session{extension}"
+
+    session.save(path, format=format)
+    assert not path.read_bytes().startswith(session_format.MAGIC)
+
+    for lazy in [False, True]:
+        loaded = Session.load(path, lazy=lazy)
+        assert loaded.to_json() == session.to_json()
+
+
+def test_write_json_matches_to_json(monkeypatch):
+    monkeypatch.setattr("pyinstrument.session.JSON_WRITE_BATCH_SIZE", 3)
+    session = session_with_records(timestamps=[1.0, 2.0, 3.0, 4.0])
+
+    f = io.StringIO()
+    session.write_json(f)
+
+    assert f.getvalue() == json.dumps(session.to_json())
+
+
+def test_streamed_read_truncated():
+    data = session_with_records().to_binary()
+
+    with pytest.raises(session_format.SessionFormatError, match="Truncated"):
+        session_format.read(io.BytesIO(data[:-10]))
+
+    metadata, frame_records = session_format.read(io.BytesIO(data))
+    assert list(frame_records) == list(session_with_records().frame_records)
@@ -1,12 +1,14 @@
 import contextvars
+import signal
 import sys
 import time
 
 import pytest
 
 from pyinstrument import stack_sampler
+from pyinstrument.low_level.monitoring import monitoring_available
 
-from .util import do_nothing, flaky_in_ci, tidy_up_profiler_state_on_fail
+from .util import busy_wait, do_nothing, flaky_in_ci, tidy_up_profiler_state_on_fail
 
 
 class SampleCounter:
@@ -66,7 +68,7 @@ def test_multiple_samplers():
     assert counter_1.count > 0
     assert counter_2.count > 0
 
-    assert sys.getprofile() is not None
+    assert sys.getprofile() is not None or sampler.current_monitoring_profiler is not None
 
     sampler.unsubscribe(counter_1.sample)
     sampler.unsubscribe(counter_2.sample)
@@ -141,3 +143,230 @@ def test_same_callback_twice_error():
         sampler.subscribe(counter.sample, desired_interval=0.001, use_async_context=False)
 
     sampler.unsubscribe(counter.sample)
+
+
+class StackRecorder:
+    def __init__(self):
+        self.samples = []
+
+    def sample(self, stack, time, async_state):
+        self.samples.append((stack, time))
+
+
+def loop_without_calls(duration):
+    end_time = time.process_time() + duration
+    n = 0
+    while n < 10_000_000:
+        n += 1
+        if n % 1000 == 0 and time.process_time() > end_time:
+            break
+
+
+@flaky_in_ci
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="signal timer requires setitimer")
+@tidy_up_profiler_state_on_fail
+def test_signal_timer():
+    sampler = stack_sampler.get_stack_sampler()
+    recorder = StackRecorder()
+
+    sampler.subscribe(
+        recorder.sample,
+        desired_interval=0.001,
+        use_async_context=False,
+        timer_type="cputime_signal",
+    )
+    # no profile function is needed when async context isn't tracked
+    assert sys.getprofile() is None
+    assert signal.getsignal(signal.SIGPROF) == sampler._signal_handler
+
+    loop_without_calls(0.2)
+
+    sampler.unsubscribe(recorder.sample)
+    assert signal.getsignal(signal.SIGPROF) in (signal.SIG_DFL, None)
+    assert len(sampler.subscribers) == 0
+
+    assert len(recorder.samples) > 10
+    loop_samples = [
+        t for stack, t in recorder.samples if stack[-1].startswith("loop_without_calls\x00")
+    ]
+    # most samples land in the loop itself, not in a function it calls
+    assert len(loop_samples) > len(recorder.samples) / 2
+    assert sum(t for _, t in recorder.samples) == pytest.approx(0.2, rel=0.5)
+
+
+@flaky_in_ci
+@pytest.mark.skipif(not monitoring_available(), reason="sys.monitoring is not available")
+@tidy_up_profiler_state_on_fail
+def test_sys_monitoring_backend():
+    sampler = stack_sampler.get_stack_sampler()
+    recorder = StackRecorder()
+
+    sampler.subscribe(recorder.sample, desired_interval=0.01, use_async_context=False)
+    assert sampler.current_monitoring_profiler is not None
+    assert sys.getprofile() is None
+
+    busy_wait(0.2)
+
+    # shorter intervals, or tracking async context, switch back to setstatprofile
+    counter = SampleCounter()
+    sampler.subscribe(counter.sample, desired_interval=0.001, use_async_context=False)
+    assert sampler.current_monitoring_profiler is None
+    assert sys.getprofile() is not None
+    sampler.unsubscribe(counter.sample)
+    assert sampler.current_monitoring_profiler is not None
+
+    sampler.unsubscribe(recorder.sample)
+    assert sampler.current_monitoring_profiler is None
+    assert monitoring_available()
+
+    assert len(recorder.samples) > 5
+    busy_wait_samples = [
+        t for stack, t in recorder.samples if any(f.startswith("busy_wait\x00") for f in stack)
+    ]
+    assert len(busy_wait_samples) > len(recorder.samples) / 2
+
+
+@flaky_in_ci
+@pytest.mark.skipif(not monitoring_available(), reason="sys.monitoring is not available")
+@tidy_up_profiler_state_on_fail
+def test_sys_monitoring_can_be_requested():
+    sampler = stack_sampler.get_stack_sampler()
+    recorder = StackRecorder()
+
+    # intervals shorter than the switch interval only use sys.monitoring on request
+    sampler.subscribe(
+        recorder.sample,
+        desired_interval=0.001,
+        use_async_context=False,
+        use_sys_monitoring=True,
+    )
+    assert sampler.current_monitoring_profiler is not None
+
+    busy_wait(0.1)
+
+    # another subscriber can't ask for something sys.monitoring can't do
+    counter = SampleCounter()
+    with pytest.raises(ValueError, match="async contexts"):
+        sampler.subscribe(counter.sample, desired_interval=0.001, use_async_context=True)
+    assert len(sampler.subscribers) == 1
+    assert sampler.current_monitoring_profiler is not None
+
+    sampler.unsubscribe(recorder.sample)
+    assert sampler.current_monitoring_profiler is None
+    assert len(recorder.samples) > 5
+
+
+@tidy_up_profiler_state_on_fail
+def test_sys_monitoring_can_be_turned_off():
+    sampler = stack_sampler.get_stack_sampler()
+    counter = SampleCounter()
+
+    sampler.subscribe(
+        counter.sample,
+        desired_interval=0.01,
+        use_async_context=False,
+        use_sys_monitoring=False,
+    )
+    assert sampler.current_monitoring_profiler is None
+    sampler.unsubscribe(counter.sample)
+
+
+@pytest.mark.skipif(not hasattr(signal, "setitimer"), reason="signal timer requires setitimer")
+def test_timer_type_preferences_must_match():
+    sampler = stack_sampler.get_stack_sampler()
+    counter_1 = SampleCounter()
+    counter_2 = SampleCounter()
+
+    sampler.subscribe(
+        counter_1.sample,
+        desired_interval=0.001,
+        use_async_context=False,
+        timer_type="cputime_signal",
+    )
+    try:
+        with pytest.raises(ValueError, match="timer type"):
+            sampler.subscribe(
+                counter_2.sample,
+                desired_interval=0.001,
+                use_async_context=False,
+                timer_type="walltime",
+            )
+        # the subscriber that couldn't be added is removed again
+        assert [s.target for s in sampler.subscribers] == [counter_1.sample]
+        assert sampler.current_use_signal_timer
+    finally:
+        sampler.unsubscribe(counter_1.sample)
+
+    assert len(sampler.subscribers) == 0
+
+
+def test_resolve_timer_type():
+    resolve_timer_type = stack_sampler.resolve_timer_type
+
+    assert resolve_timer_type(None) is None
+    assert resolve_timer_type(None, use_timing_thread=False) is None
+    assert resolve_timer_type(None, use_timing_thread=True) == "walltime_thread"
+    assert resolve_timer_type("cputime_thread", use_thread_cputime=True) == "cputime_thread"
+    assert resolve_timer_type("cputime_signal", use_timing_thread=False) == "cputime_signal"
+
+    with pytest.raises(ValueError):
+        resolve_timer_type("cputime_signal", use_timing_thread=True)
+    with pytest.raises(ValueError):
+        resolve_timer_type("cputime_signal", use_thread_cputime=True)
+    with pytest.raises(ValueError):
+        resolve_timer_type(None, use_timing_thread=True, use_thread_cputime=True)
+    with pytest.raises(ValueError):
+        resolve_timer_type("walltime_thread", use_timing_thread=False)
+    with pytest.raises(ValueError):
+        resolve_timer_type("timer_func")
+
+
+class SlowSampleCounter:
+    count = 0
+
+    def sample(self, stack, time, async_state):
+        # pretend that taking each sample is expensive
+        busy_wait(0.0005)
+        self.count += 1
+
+
+@flaky_in_ci
+@tidy_up_profiler_state_on_fail
+def test_overhead_budget():
+    sampler = stack_sampler.get_stack_sampler()
+    counter = SlowSampleCounter()
+
+    sampler.subscribe(
+        counter.sample, desired_interval=0.001, use_async_context=False, overhead_budget=0.05
+    )
+    assert sampler.current_overhead_budget == 0.05
+
+    busy_wait(0.5)
+
+    # each sample takes about a third of the time at 1ms, so the interval is
+    # widened to stay within the budget
+    assert sampler.current_effective_interval is not None
+    assert sampler.current_effective_interval > 0.002
+
+    # a subscriber without a budget gets the interval it asked for
+    other_counter = SampleCounter()
+    sampler.subscribe(other_counter.sample, desired_interval=0.001, use_async_context=False)
+    assert sampler.current_overhead_budget is None
+    assert sampler.current_effective_interval == 0.001
+    sampler.unsubscribe(other_counter.sample)
+
+    subscriber = sampler.unsubscribe(counter.sample)
+    assert subscriber.min_interval == 0.001
+    assert subscriber.max_interval > 0.002
+
+
+def test_overhead_budget_must_be_a_fraction():
+    sampler = stack_sampler.get_stack_sampler()
+    counter = SampleCounter()
+
+    with pytest.raises(ValueError):
+        sampler.subscribe(
+            counter.sample, desired_interval=0.001, use_async_context=False, overhead_budget=2
+        )
+
+    assert len(sampler.subscribers) == 0